@@ -2,20 +2,30 @@
 # blender_ops.py
 
 import bpy
+import bmesh
 import os
+import re
+import json
+import hashlib
 import numpy as np
 import mathutils
 
 # Import config module to access global project settings
 import config
 import utils
+import texture_ops
+import shader_registry
+import uv_ops
 
 # --- Utility Functions ---
 
+CYCLES_DEVICES_READY = False # CUDA devices enumerated once per run (reset by reset_scene_state between service jobs)
+
 def setup_blender_environment():
     """
     Configura l'ambiente Blender, attivando la GPU (CUDA) se specificato nel config.
     """
+    global CYCLES_DEVICES_READY
     print("\n--- Setting up Blender Environment ---")
     bpy.context.scene.render.engine = 'CYCLES'
     prefs = bpy.context.preferences.addons["cycles"].preferences
@@ -26,17 +36,20 @@ def setup_blender_environment():
         bpy.context.scene.cycles.device = 'GPU'
         
         # Abilita tutti i dispositivi CUDA disponibili
-        prefs.get_devices()
-        for device in prefs.devices:
-            if device.type == 'CUDA':
-                device.use = True
-                print(f"  Enabled CUDA device: {device.name}")
+        if not CYCLES_DEVICES_READY:
+            prefs.get_devices()
+            for device in prefs.devices:
+                if device.type == 'CUDA':
+                    device.use = True
+                    print(f"  Enabled CUDA device: {device.name}")
+            CYCLES_DEVICES_READY = True
     else:
         # Ripiega sulla CPU se non e' richiesta la GPU
         prefs.compute_device_type = 'NONE'
         bpy.context.scene.cycles.device = 'CPU'
 
     print(f"  Blender render engine set to CYCLES and device to {bpy.context.scene.cycles.device}.")
+    apply_bake_profile(config.BAKE_PROFILE)
 
 def clear_blender_scene():
     """Clears all objects from the Blender scene."""
@@ -47,6 +60,63 @@ def clear_blender_scene():
     bpy.ops.object.delete()
     print("Blender scene cleared.")
 
+def apply_bake_profile(profile_name):
+    """
+    Sets the Cycles sampling of the scene from a bake profile of config.BAKE_PROFILES
+    (the bake margin of the profile is read by get_bake_args). Returns the profile.
+    """
+    profile = config.BAKE_PROFILES[profile_name.lower()]
+    cycles = bpy.context.scene.cycles
+    cycles.samples = profile['samples']
+    cycles.use_adaptive_sampling = profile['use_adaptive_sampling']
+    cycles.adaptive_threshold = profile['adaptive_threshold']
+    print(f"  Bake profile '{profile_name}': {profile['samples']} samples, adaptive sampling {profile['use_adaptive_sampling']}, margin {profile['margin']} px.")
+    return profile
+
+def reset_scene_state():
+    """
+    Resets the blend data between two jobs of the persistent service: removes every object, then purges the
+    orphan data (meshes, images, per-object materials, node groups). Template materials kept with a fake user
+    (preload_shader_library) survive, so the shader library is not reloaded for the next case.
+    Module state of the previous job is reset too: run counters, Cycles devices and the file hash caches
+    (a shader .blend may have changed on disk in the meantime).
+    """
+    global CYCLES_DEVICES_READY
+    print("\n--- Phase: Resetting Scene State ---")
+    if bpy.ops.object.mode_set.poll():
+        bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.data.batch_remove(list(bpy.data.objects))
+    purged_count = bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+    BAKE_CACHE_STATS.update(hits=0, misses=0) # run counters start again for the next job
+    IMAGE_MEMORY_STATS.update(peak_bytes=0, released_buffers=0)
+    CYCLES_DEVICES_READY = False
+    utils.hash_file_contents.cache_clear()
+    utils.BAKE_CACHE_SIZES.clear()
+    print(f"  Scene reset: {purged_count} orphan datablocks purged, {len(bpy.data.materials)} materials kept.")
+
+def preload_shader_library(blender_shader_registry):
+    """
+    Loads every template material of the registry once (see load_materials_from_libraries) and marks it with a fake
+    user, so it survives reset_scene_state. apply_materials_from_manifest skips materials already in bpy.data and
+    does not schedule them for cleanup. Returns the names of the materials available in the scene.
+    """
+    print("\n--- Phase: Preloading Shader Library ---")
+    materials_to_load = {}
+    for shader_data in (blender_shader_registry.get('shader_ref') or {}).values():
+        if shader_data and shader_data.get('blend_material') and shader_data.get('blend_file'):
+            materials_to_load[shader_data['blend_material']] = os.path.join(config.SHADERS_DIR, shader_data['blend_file'])
+    library_path = config.SHADER_LIBRARY_FILE if config.MATERIAL_LOADER.upper() == 'CONSOLIDATED' else None
+    load_materials_from_libraries(materials_to_load, library_path)
+
+    preloaded = []
+    for mat_name in materials_to_load:
+        material = bpy.data.materials.get(mat_name)
+        if material:
+            material.use_fake_user = True
+            preloaded.append(mat_name)
+    print(f"  {len(preloaded)} template materials kept in memory.")
+    return preloaded
+
 def get_all_mesh_objects():
     """Returns a list of all mesh objects in the current Blender scene."""
     return [obj for obj in bpy.context.scene.objects if obj.type == 'MESH']
@@ -81,8 +151,11 @@ def import_glb_file(filepath, new_name):
         return rename_imported_objects(list(bpy.context.selected_objects), new_name)
     return []
 
-def export_glb(filepath, root_object_to_export):
-    """Exports the specified root object and its children to GLB format."""
+def export_glb(filepath, root_object_to_export, export_options=None):
+    """
+    Exports the specified root object and its children to GLB format.
+    export_options are extra keyword arguments for the glTF exporter (e.g. the export_draco_* compression settings).
+    """
     bpy.ops.object.select_all(action='DESELECT') # Deselect all first
 
     if root_object_to_export:
@@ -97,7 +170,7 @@ def export_glb(filepath, root_object_to_export):
 
     selected_count = len(bpy.context.selected_objects)
     print(f"  Exporting {selected_count} objects to GLB: {filepath}")
-    bpy.ops.export_scene.gltf(filepath=filepath, export_extras=True, use_selection=True) # Always use selection if root is provided
+    bpy.ops.export_scene.gltf(filepath=filepath, export_extras=True, use_selection=True, **(export_options or {})) # Always use selection if root is provided
     print(f"Exported GLB: {filepath}")
     bpy.ops.object.select_all(action='DESELECT')
 
@@ -132,16 +205,104 @@ def export_fbx(filepath, objects_to_export):
     print(f"Exported FBX: {filepath}")
     bpy.ops.object.select_all(action='DESELECT')
 
-def save_blender_scene(output_dir, filename):
+def export_in_workers(export_tasks, task_dir):
+    """
+    Runs the final exports at the same time, one headless Blender worker per task (blender_worker.py --task export).
+    Every task is a dict with 'name', 'format' ('GLB'/'FBX'), 'blend_path' (the checkpoint the worker opens),
+    'filepath' and the optional export settings read by blender_worker.run_export_task.
+    Returns one result per task: {'name', 'format', 'filepath', 'exit_code', 'file_bytes'}.
+    """
+    import blender_worker
+
+    print(f"\n--- Phase: Parallel Export ({len(export_tasks)} workers) ---")
+    os.makedirs(task_dir, exist_ok=True)
+    task_files = []
+    for task in export_tasks:
+        task_file = os.path.join(task_dir, f"export_{task['name']}.json")
+        utils.write_json(task, task_file)
+        task_files.append(task_file)
+        print(f"  Export '{task['name']}' ({task['format']}) from '{os.path.basename(task['blend_path'])}' -> {task['filepath']}")
+
+    blender_executable = bpy.app.binary_path or config.BLENDER_EXECUTABLE
+    exit_codes = blender_worker.launch_workers(blender_executable, [task['blend_path'] for task in export_tasks], 'export', task_files, config.FILE_ENCODING)
+
+    results = []
+    for task, exit_code in zip(export_tasks, exit_codes):
+        file_bytes = os.path.getsize(task['filepath']) if exit_code == 0 and os.path.exists(task['filepath']) else None
+        results.append({'name': task['name'], 'format': task['format'], 'filepath': task['filepath'], 'exit_code': exit_code, 'file_bytes': file_bytes})
+        print(f"  Export '{task['name']}': exit code {exit_code}, {file_bytes if file_bytes is not None else '-'} bytes.")
+    return results
+
+def save_blender_scene(output_dir, filename, compress=False):
     """Saves the current Blender scene to a .blend file."""
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         print(f"  Created directory for blend file: {output_dir}")
 
     filepath = os.path.join(output_dir, filename)
-    bpy.ops.wm.save_as_mainfile(filepath=filepath)
+    bpy.ops.wm.save_as_mainfile(filepath=filepath, compress=compress)
     print(f"  Blender scene saved to: {filepath}")
 
+def get_checkpoint_path(checkpoint_name):
+    """Path of a named pipeline checkpoint (see config.CHECKPOINT_FILES)."""
+    return os.path.join(config.OUTPUT_DIR, f"{config.PROJECT_SESSION_ID}{config.CHECKPOINT_FILES[checkpoint_name]}.blend")
+
+def save_pipeline_checkpoint(checkpoint_name, policy, selected_checkpoints, required=False):
+    """
+    Saves a named checkpoint according to the save policy ('FULL', 'COMPRESSED', 'OFF') and the selected
+    checkpoint names. required=True saves it regardless (e.g. 'history' when bake workers reopen it).
+    Returns the saved path, or None if the checkpoint was skipped.
+    """
+    policy = policy.upper()
+    if not required and (policy == 'OFF' or checkpoint_name not in selected_checkpoints):
+        print(f"  Checkpoint '{checkpoint_name}' skipped (policy '{policy}').")
+        return None
+    filepath = get_checkpoint_path(checkpoint_name)
+    save_blender_scene(os.path.dirname(filepath), os.path.basename(filepath), compress=policy == 'COMPRESSED')
+    return filepath
+
+def open_pipeline_checkpoint(checkpoint_name):
+    """Reopens a named checkpoint in place of the current scene. Returns False if the file does not exist."""
+    filepath = get_checkpoint_path(checkpoint_name)
+    if not os.path.exists(filepath):
+        print(f"  ERROR: Checkpoint '{checkpoint_name}' not found at '{filepath}'.")
+        return False
+    bpy.ops.wm.open_mainfile(filepath=filepath)
+    print(f"  Reopened checkpoint '{checkpoint_name}': {filepath}")
+    return True
+
+def restore_pipeline_state_from_scene():
+    """
+    Rebuilds the pipeline state from a reopened checkpoint: the imported meshes are the meshes parented to the
+    scene root (LOD copies, lod_level > 0, are returned apart). Returns (imported_meshes, scene_root, lod_objects).
+    """
+    parented_meshes = sorted((obj for obj in bpy.data.objects if obj.type == 'MESH' and obj.parent), key=lambda obj: obj.name)
+    imported_meshes = [obj for obj in parented_meshes if obj.get('lod_level', 0) == 0]
+    lod_objects = [obj for obj in parented_meshes if obj.get('lod_level', 0) > 0]
+    scene_root = imported_meshes[0].parent if imported_meshes else None
+    print(f"  Restored {len(imported_meshes)} meshes and {len(lod_objects)} LOD objects under root '{scene_root.name if scene_root else None}'.")
+    return imported_meshes, scene_root, lod_objects
+
+def rebuild_cleanup_registry(mesh_objects):
+    """
+    Cleanup registry for a reopened checkpoint: re-registers, by their naming conventions, the template materials,
+    projectors and color override nodes still in the scene (see apply_materials_from_manifest).
+    """
+    cleanup_registry = new_cleanup_registry()
+    for mat_name in sorted({obj.get('material_to_assign') for obj in mesh_objects if obj.get('material_to_assign')}):
+        if mat_name in bpy.data.materials:
+            register_temp_material(cleanup_registry, mat_name, 'template')
+        projector_name = f"{mat_name.capitalize()}_projector"
+        if projector_name in bpy.data.objects:
+            register_temp_object(cleanup_registry, projector_name, 'template')
+    for obj in mesh_objects:
+        mat = obj.data.materials[0] if obj.data.materials else None
+        if mat and mat.use_nodes:
+            mix_node = mat.node_tree.nodes.get(f"{obj.name}_ColorOverrideMix")
+            if mix_node:
+                register_temp_node(cleanup_registry, mat, mix_node, 'color_override')
+    return cleanup_registry
+
 def rename_imported_objects(imported_objs, new_name):
     """Helper function to rename imported objects, handling single or multiple."""
     renamed_objects = []
@@ -191,6 +352,137 @@ def import_meshes_into_blender_scene(input_folder_path):
         print(f"  No .stl meshes found in '{input_folder_path}'.")
     return imported_objects
 
+# Layout di un record triangolo nel formato STL binario (normale, 3 vertici, attributo)
+STL_BINARY_TRIANGLE_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attribute', '<u2'),
+])
+
+def read_stl_as_arrays(filepath):
+    """
+    Parses a binary or ASCII STL file directly into NumPy arrays.
+    Coincident corners are welded, so the result matches the topology produced by the STL operator.
+    Returns (vertices, faces): float32 array (N, 3) and int32 array (M, 3).
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read()
+
+    triangle_count = int.from_bytes(data[80:84], 'little') if len(data) >= 84 else -1
+    if len(data) == 84 + triangle_count * STL_BINARY_TRIANGLE_DTYPE.itemsize:
+        records = np.frombuffer(data, dtype=STL_BINARY_TRIANGLE_DTYPE, count=triangle_count, offset=84)
+        corners = records['vertices'].reshape(-1, 3)
+    else:
+        # ASCII STL: only the 'vertex x y z' lines are needed
+        values = re.findall(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)', data)
+        corners = np.array(values, dtype=np.float32).reshape(-1, 3)
+
+    return weld_triangle_corners(corners)
+
+def weld_triangle_corners(corners):
+    """
+    Welds a (3*M, 3) array of triangle corners into indexed vertices/faces and drops
+    triangles that collapse after welding.
+    """
+    corners = np.ascontiguousarray(corners, dtype=np.float32) + np.float32(0.0) # -0.0 -> 0.0 per il confronto binario
+    corner_keys = corners.view(np.dtype((np.void, corners.dtype.itemsize * 3))).ravel()
+    _, first_index, inverse = np.unique(corner_keys, return_index=True, return_inverse=True)
+    vertices = corners[first_index]
+    faces = inverse.reshape(-1, 3).astype(np.int32)
+
+    valid = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    return vertices, faces[valid]
+
+def compute_area_weighted_vertex_normals(vertices, faces):
+    """Returns unit vertex normals (N, 3) as the area-weighted average of the adjacent face normals."""
+    v0 = vertices[faces[:, 0]]
+    face_normals = np.cross(vertices[faces[:, 1]] - v0, vertices[faces[:, 2]] - v0) # lunghezza = 2 * area
+    normals = np.zeros((len(vertices), 3), dtype=np.float64)
+    for axis in range(3):
+        weights = np.repeat(face_normals[:, axis], 3)
+        normals[:, axis] = np.bincount(faces.ravel(), weights=weights, minlength=len(vertices))
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    lengths[lengths == 0.0] = 1.0
+    return (normals / lengths).astype(np.float32)
+
+def create_mesh_object_from_arrays(name, vertices, faces, use_custom_normals=True):
+    """
+    Builds a mesh datablock from NumPy vertex/triangle arrays through the foreach_set data API
+    and wraps it in a new object. The object is NOT linked to any collection.
+    """
+    vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+    faces = np.ascontiguousarray(faces, dtype=np.int32)
+    face_count = len(faces)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set('co', vertices.ravel())
+    mesh.loops.add(face_count * 3)
+    mesh.loops.foreach_set('vertex_index', faces.ravel())
+    mesh.polygons.add(face_count)
+    mesh.polygons.foreach_set('loop_start', np.arange(0, face_count * 3, 3, dtype=np.int32))
+    mesh.update(calc_edges=True)
+    mesh.validate()
+
+    if use_custom_normals and face_count:
+        mesh.shade_smooth()
+        mesh.normals_split_custom_set_from_vertices(compute_area_weighted_vertex_normals(vertices, faces))
+
+    return bpy.data.objects.new(name, mesh)
+
+def link_mesh_arrays_into_blender_scene(mesh_arrays, use_custom_normals=True):
+    """
+    Creates one mesh object per entry of mesh_arrays ({name: (vertices, faces)}) and links
+    all of them to the scene collection in a single batch, with one view layer update at the end.
+    """
+    new_objects = []
+    for name, (vertices, faces) in mesh_arrays.items():
+        if len(faces) == 0:
+            print(f"  Mesh '{name}' has no valid faces. Skipping.")
+            continue
+        new_objects.append(create_mesh_object_from_arrays(name, vertices, faces, use_custom_normals))
+
+    scene_collection = bpy.context.scene.collection
+    for obj in new_objects:
+        scene_collection.objects.link(obj)
+    bpy.context.view_layer.update()
+    print(f"  Linked {len(new_objects)} mesh objects to the scene in one batch.")
+    return new_objects
+
+def import_meshes_into_blender_scene_bulk(input_folder_path, use_custom_normals=True):
+    """
+    Imports all .stl files found in the folder without the per-file import operator:
+    files are parsed in NumPy and the mesh datablocks are built directly via foreach_set.
+    """
+    print("\n--- Phase: Bulk NumPy File Import ---")
+
+    if not os.path.exists(input_folder_path):
+        print(f"  Input folder not found: {input_folder_path}. No meshes to import.")
+        return []
+
+    mesh_arrays = {}
+    for filename in sorted(os.listdir(input_folder_path)):
+        filepath = os.path.join(input_folder_path, filename)
+        name_without_ext, file_extension = os.path.splitext(filename)
+        if not os.path.isfile(filepath):
+            continue
+        if file_extension.lower() != '.stl':
+            print(f"  Unsupported file type for '{filename}': {file_extension}. Skipping (only .stl is supported).")
+            continue
+
+        try:
+            mesh_arrays[name_without_ext] = read_stl_as_arrays(filepath)
+        except (OSError, ValueError) as e:
+            print(f"  Failed to parse '{filename}': {e}")
+            continue
+        vertices, faces = mesh_arrays[name_without_ext]
+        print(f"  Parsed '{filename}': {len(vertices)} vertices, {len(faces)} faces.")
+
+    if not mesh_arrays:
+        print(f"  No .stl meshes found in '{input_folder_path}'.")
+        return []
+    return link_mesh_arrays_into_blender_scene(mesh_arrays, use_custom_normals)
+
 def apply_world_scale(mesh_objects, scale_factor):
     """
     Applies a uniform scale factor to all specified mesh objects and
@@ -276,55 +568,261 @@ def delete_small_features(mesh_objects, threshold):
         bpy.context.view_layer.update()
 
 def decimate_mesh_objects(mesh_objects, max_faces_limit, segment_manifest):
-    """Decimates mesh objects to reduce face count taking account of the export_as_individual_mesh in segmentMappings."""
+    """
+    Decimates mesh objects to reduce face count taking account of the export_as_individual_mesh in segmentMappings.
+    Objects flagged as individual keep their detail up to max_faces_limit*1000 faces (upper limit to prevent crash).
+    Returns (total faces before decimation, total faces removed).
+    """
 
     print(f"Performing 'Decimation' for mesh objects with limit: {max_faces_limit} / ({max_faces_limit*1000} on individual object) faces.")
+    polycount = 0
+    poly_removed = 0
     for obj in mesh_objects:
-        decimate = False
-        polycount = 0
-        poly_removed = 0
-
-        if obj.name in segment_manifest:
-            export_details = segment_manifest[obj.name].get('custom_parameters', {})
-            export = export_details.get('export_as_individual_mesh')
-            if not export or len(obj.data.polygons)>max_faces_limit*1000: # upper limit to prevent crash
-                decimate = True
-                current_faces = len(obj.data.polygons)
-                polycount += current_faces
-                print(f"'{obj.name}' is flagged Export as Individual, decimation skipped. Faces: '{current_faces}'.")
-
-        if obj.type == 'MESH' and decimate:
-            current_faces = len(obj.data.polygons)
-            polycount += current_faces
-            print(f"  Object '{obj.name}': {current_faces} faces.")
+        if obj.type != 'MESH':
+            continue
 
-            if current_faces > max_faces_limit:
-                ratio = max_faces_limit / current_faces
-                print(f"  Reduction needed for '{obj.name}'. Ratio: {ratio:.4f}")
+        current_faces = len(obj.data.polygons)
+        polycount += current_faces
+        print(f"  Object '{obj.name}': {current_faces} faces.")
 
-                mod = obj.modifiers.new(name="DecimateMod", type='DECIMATE')
-                mod.decimate_type = 'COLLAPSE'
-                mod.ratio = ratio
+        face_limit = max_faces_limit
+        custom_parameters = segment_manifest.get(obj.name, {}).get('custom_parameters', {})
+        if custom_parameters.get('export_as_individual_mesh'):
+            face_limit = max_faces_limit * 1000
+            print(f"  '{obj.name}' is flagged Export as Individual, face limit raised to {face_limit}.")
 
-                bpy.context.view_layer.objects.active = obj
-                bpy.ops.object.select_all(action='DESELECT')
-                obj.select_set(True)
-                
-                if bpy.ops.object.mode_set.poll():
-                    bpy.ops.object.mode_set(mode='OBJECT')
-                
-                bpy.ops.object.modifier_apply(modifier=mod.name)
-                obj.select_set(False)
-                
-                new_faces = len(obj.data.polygons)
-                poly_removed += new_faces
-                print(f"  Decimation on '{obj.name}' completed. New faces: {new_faces}.")
-            else:
-                print(f"  Decimation not needed for '{obj.name}'. Faces: {current_faces}.")
-                polycount += current_faces
+        if current_faces > face_limit:
+            ratio = face_limit / current_faces
+            print(f"  Reduction needed for '{obj.name}'. Ratio: {ratio:.4f}")
+
+            mod = obj.modifiers.new(name="DecimateMod", type='DECIMATE')
+            mod.decimate_type = 'COLLAPSE'
+            mod.ratio = ratio
+
+            bpy.context.view_layer.objects.active = obj
+            bpy.ops.object.select_all(action='DESELECT')
+            obj.select_set(True)
+            
+            if bpy.ops.object.mode_set.poll():
+                bpy.ops.object.mode_set(mode='OBJECT')
+            
+            bpy.ops.object.modifier_apply(modifier=mod.name)
+            obj.select_set(False)
+            
+            new_faces = len(obj.data.polygons)
+            poly_removed += current_faces - new_faces
+            print(f"  Decimation on '{obj.name}' completed. New faces: {new_faces}.")
+        else:
+            print(f"  Decimation not needed for '{obj.name}'. Faces: {current_faces}.")
     bpy.context.view_layer.update()
     return polycount, poly_removed
 
+def apply_decimation_ratios(object_ratios, modifier_name="BudgetDecimateMod"):
+    """
+    Decimates many objects at once: a COLLAPSE Decimate modifier is added to every object, the
+    depsgraph evaluates all of them in a single (multi-threaded) update, and each evaluated mesh
+    replaces the original data. Other modifiers are disabled during the evaluation so they are not baked in.
+    object_ratios: list of (object, ratio).
+    """
+    pending = []
+    for obj, ratio in object_ratios:
+        if obj.type != 'MESH' or ratio >= 1.0:
+            continue
+        hidden_modifiers = [m for m in obj.modifiers if m.show_viewport]
+        for m in hidden_modifiers:
+            m.show_viewport = False
+        mod = obj.modifiers.new(name=modifier_name, type='DECIMATE')
+        mod.decimate_type = 'COLLAPSE'
+        mod.ratio = max(ratio, 0.0)
+        pending.append((obj, mod, hidden_modifiers))
+
+    if not pending:
+        return
+
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    for obj, mod, hidden_modifiers in pending:
+        obj_eval = obj.evaluated_get(depsgraph)
+        new_mesh = bpy.data.meshes.new_from_object(obj_eval, preserve_all_data_layers=True, depsgraph=depsgraph)
+        old_mesh = obj.data
+        mesh_name = old_mesh.name
+        obj.modifiers.remove(mod)
+        for m in hidden_modifiers:
+            m.show_viewport = True
+        obj.data = new_mesh
+        if old_mesh.users == 0:
+            bpy.data.meshes.remove(old_mesh)
+        new_mesh.name = mesh_name
+    bpy.context.view_layer.update()
+
+def compute_decimation_weights(mesh_objects, segment_manifest, strategy='AREA', category_priority=None):
+    """
+    Returns {object_name: weight} used to share a triangle budget between objects.
+    'AREA': surface area; 'CURVATURE': area weighted by the deviation between face and vertex normals
+    (flat regions count ~0); 'PRIORITY': same weight for every object.
+    The biological_category priority (default 1.0) multiplies the weight in every strategy.
+    """
+    category_priority = category_priority or {}
+    weights = {}
+    for obj in mesh_objects:
+        if obj.type != 'MESH':
+            continue
+        vertices, triangles = get_mesh_triangle_arrays(obj.data)
+        if not len(triangles):
+            weights[obj.name] = 0.0
+            continue
+
+        corners = vertices[triangles].astype(np.float64)
+        cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        double_areas = np.linalg.norm(cross, axis=1)
+        areas = 0.5 * double_areas
+
+        if strategy == 'CURVATURE':
+            safe = np.where(double_areas > 0.0, double_areas, 1.0)
+            face_normals = cross / safe[:, None]
+            vertex_normals = compute_area_weighted_vertex_normals(vertices, triangles)[triangles] # (T, 3, 3)
+            deviation = 1.0 - np.einsum('ij,ikj->ik', face_normals, vertex_normals).mean(axis=1)
+            weight = float(np.sum(areas * np.clip(deviation, 0.0, 2.0)))
+        elif strategy == 'PRIORITY':
+            weight = 1.0
+        else:
+            weight = float(np.sum(areas))
+
+        category = segment_manifest.get(obj.name, {}).get('custom_parameters', {}).get('biological_category')
+        weights[obj.name] = weight * category_priority.get(category, 1.0)
+    return weights
+
+def allocate_triangle_budget(face_counts, weights, total_budget, min_faces):
+    """
+    Splits total_budget across objects proportionally to their weights (water-filling):
+    no object receives more than its current face count and every object keeps at least min_faces
+    (or its current count if smaller); what capped or raised objects leave over is redistributed to the others.
+    Shares are rounded with the largest-remainder method, so the targets add up to total_budget exactly
+    whenever it lies between the sum of those minimums and the total face count.
+    Returns {object_name: target_faces}.
+    """
+    targets = {}
+    active = {name for name, count in face_counts.items() if count > 0}
+    remaining = int(total_budget)
+
+    while active:
+        total_weight = sum(weights.get(name, 0.0) for name in active)
+        if total_weight <= 0.0:
+            shares = {name: remaining / len(active) for name in active}
+        else:
+            shares = {name: remaining * weights.get(name, 0.0) / total_weight for name in active}
+
+        # capped at the current count first, then raised to the minimum; the others share what is left
+        bounded = {name: face_counts[name] for name in active if shares[name] >= face_counts[name]}
+        if not bounded:
+            bounded = {name: min(min_faces, face_counts[name]) for name in active if shares[name] < min(min_faces, face_counts[name])}
+        if not bounded:
+            rounded = {name: int(shares[name]) for name in active}
+            leftover = remaining - sum(rounded.values())
+            for name in sorted(active, key=lambda name: (rounded[name] - shares[name], name))[:leftover]:
+                rounded[name] += 1
+            targets.update(rounded)
+            break
+        targets.update(bounded)
+        remaining = max(remaining - sum(bounded.values()), 0)
+        active -= set(bounded)
+
+    for name, count in face_counts.items():
+        targets.setdefault(name, count)
+    return targets
+
+def decimate_mesh_objects_to_budget(mesh_objects, total_budget, segment_manifest, strategy='AREA', min_faces=500, category_priority=None):
+    """
+    Scene-level decimation: distributes a total triangle budget (e.g. the AR device limit) across
+    objects by surface area, curvature or category priority, decimates all objects in one parallel
+    depsgraph evaluation and reports accurate per-object counts.
+    Returns {object_name: {'before': int, 'target': int, 'after': int}}.
+    """
+    print(f"\n--- Phase: Triangle Budget Decimation (budget: {total_budget}, strategy: {strategy}) ---")
+    mesh_objects = [obj for obj in mesh_objects if obj.type == 'MESH']
+    face_counts = {}
+    for obj in mesh_objects:
+        obj.data.calc_loop_triangles()
+        face_counts[obj.name] = len(obj.data.loop_triangles)
+
+    total_before = sum(face_counts.values())
+    if total_before <= total_budget:
+        print(f"  Scene has {total_before} triangles, already within budget. Decimation skipped.")
+        return {name: {'before': count, 'target': count, 'after': count} for name, count in face_counts.items()}
+
+    weights = compute_decimation_weights(mesh_objects, segment_manifest, strategy, category_priority)
+    targets = allocate_triangle_budget(face_counts, weights, total_budget, min_faces)
+    apply_decimation_ratios([
+        (obj, targets[obj.name] / face_counts[obj.name])
+        for obj in mesh_objects if face_counts[obj.name] > 0 and targets[obj.name] < face_counts[obj.name]
+    ])
+
+    report = {}
+    for obj in mesh_objects:
+        obj.data.calc_loop_triangles()
+        report[obj.name] = {'before': face_counts[obj.name], 'target': targets[obj.name], 'after': len(obj.data.loop_triangles)}
+        print(f"  '{obj.name}': {report[obj.name]['before']} -> {report[obj.name]['after']} triangles (target {report[obj.name]['target']}).")
+
+    total_after = sum(entry['after'] for entry in report.values())
+    print(f"  Scene triangles: {total_before} -> {total_after} (budget {total_budget}).")
+    return report
+
+def generate_lod_chains(mesh_objects, lod_ratios, lod_screen_coverage, enriched_manifest=None):
+    """
+    Builds a level-of-detail chain for every mesh: LOD1..LODn are decimated copies (ratios relative
+    to LOD0) that share the mesh materials, hence UVs layout and baked textures, of the original.
+    Node convention: copies are siblings named '{name}_LOD{n}' under the same parent, and every node
+    of the chain carries the custom properties (glTF extras) lod_group, lod_level, lod_screen_coverage.
+    glb_ops.apply_msft_lod_extension turns this convention into MSFT_lod after the GLB export.
+    The chain is recorded in the manifest under custom_parameters['lod_chain'].
+    Returns the list of created LOD objects.
+    """
+    print(f"\n--- Phase: Generating LOD Chains (ratios: {list(lod_ratios)}) ---")
+    if not 1 <= len(lod_ratios) <= 3:
+        print(f"  LOD chain needs 1 to 3 extra levels (2-4 in total), got {len(lod_ratios)}. Skipping LOD generation.")
+        return []
+    if len(lod_screen_coverage) < len(lod_ratios) + 1:
+        print(f"  LOD_SCREEN_COVERAGE needs {len(lod_ratios) + 1} values. Skipping LOD generation.")
+        return []
+
+    lod_objects = []
+    pending = []
+    lod_chains = {} # LOD0 name -> [(level, ratio, lod_obj)]: names may get a '.001' suffix, so keep the references
+    for obj in mesh_objects:
+        if obj.type != 'MESH':
+            continue
+        obj['lod_group'] = obj.name
+        obj['lod_level'] = 0
+        obj['lod_screen_coverage'] = lod_screen_coverage[0]
+
+        for level, ratio in enumerate(lod_ratios, start=1):
+            lod_obj = obj.copy() # keeps parent, parent inverse matrix and custom properties
+            lod_obj.data = obj.data.copy() # materials are shared, not duplicated
+            lod_obj.name = f"{obj.name}_LOD{level}"
+            lod_obj.data.name = lod_obj.name
+            for collection in obj.users_collection:
+                collection.objects.link(lod_obj)
+            lod_obj['lod_level'] = level
+            lod_obj['lod_screen_coverage'] = lod_screen_coverage[level]
+            pending.append((lod_obj, ratio))
+            lod_objects.append(lod_obj)
+            lod_chains.setdefault(obj.name, []).append((level, ratio, lod_obj))
+
+    apply_decimation_ratios(pending, modifier_name="LODDecimateMod")
+
+    for obj in mesh_objects:
+        if obj.type != 'MESH':
+            continue
+        chain = [{'level': 0, 'name': obj.name, 'ratio': 1.0, 'faces': len(obj.data.polygons), 'screen_coverage': lod_screen_coverage[0]}]
+        for level, ratio, lod_obj in lod_chains.get(obj.name, []):
+            chain.append({'level': level, 'name': lod_obj.name, 'ratio': ratio, 'faces': len(lod_obj.data.polygons), 'screen_coverage': lod_screen_coverage[level]})
+        print(f"  LOD chain for '{obj.name}': {[entry['faces'] for entry in chain]} faces.")
+        if enriched_manifest is not None and obj.name in enriched_manifest:
+            enriched_manifest[obj.name].setdefault('custom_parameters', {})['lod_chain'] = chain
+
+    bpy.context.view_layer.update()
+    print(f"  Created {len(lod_objects)} LOD objects.")
+    return lod_objects
+
 def OLD_decimate_mesh_objects(mesh_objects, max_faces_limit):
     """Decimates mesh objects to reduce face count."""
     print(f"Performing 'Decimation' for mesh objects with limit: {max_faces_limit} faces per object.")
@@ -397,6 +895,95 @@ def apply_smoothing_normals(mesh_objects, method='WEIGHTED', average_type='CORNE
         obj.select_set(False)
     bpy.context.view_layer.update()
 
+def get_mesh_triangle_arrays(mesh):
+    """
+    Reads vertex positions and loop triangles of a mesh datablock through foreach_get.
+    Returns (vertices, triangles): float32 array (N, 3) and int32 array (T, 3).
+    """
+    mesh.calc_loop_triangles()
+    vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', vertices)
+    triangles = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get('vertices', triangles)
+    return vertices.reshape(-1, 3), triangles.reshape(-1, 3)
+
+def compute_corner_angle_weighted_vertex_normals(vertices, faces):
+    """Returns unit vertex normals (N, 3) weighting each face normal by the corner angle at the vertex."""
+    corners = vertices[faces] # (M, 3, 3)
+    face_normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    face_lengths = np.linalg.norm(face_normals, axis=1, keepdims=True)
+    face_lengths[face_lengths == 0.0] = 1.0
+    face_normals = face_normals / face_lengths
+
+    normals = np.zeros((len(vertices), 3), dtype=np.float64)
+    for corner in range(3):
+        edge_a = corners[:, (corner + 1) % 3] - corners[:, corner]
+        edge_b = corners[:, (corner + 2) % 3] - corners[:, corner]
+        denom = np.linalg.norm(edge_a, axis=1) * np.linalg.norm(edge_b, axis=1)
+        denom[denom == 0.0] = 1.0
+        angles = np.arccos(np.clip(np.einsum('ij,ij->i', edge_a, edge_b) / denom, -1.0, 1.0))
+        for axis in range(3):
+            normals[:, axis] += np.bincount(faces[:, corner], weights=face_normals[:, axis] * angles, minlength=len(vertices))
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    lengths[lengths == 0.0] = 1.0
+    return (normals / lengths).astype(np.float32)
+
+def set_smooth_custom_normals(mesh, method='WEIGHTED'):
+    """
+    Data-API counterpart of apply_smoothing_normals for a single mesh: computes the vertex normals
+    in NumPy ('WEIGHTED' = face area, 'AVERAGE' = corner angle), stores them as custom normals
+    and shades the mesh smooth. Returns False if the method is not recognized.
+    """
+    if method == 'WEIGHTED':
+        compute_normals = compute_area_weighted_vertex_normals
+    elif method == 'AVERAGE':
+        compute_normals = compute_corner_angle_weighted_vertex_normals
+    else:
+        return False
+
+    vertices, triangles = get_mesh_triangle_arrays(mesh)
+    mesh.shade_smooth()
+    if len(triangles):
+        mesh.normals_split_custom_set_from_vertices(compute_normals(vertices, triangles))
+    return True
+
+def optimize_mesh_objects_bmesh(mesh_objects, merge_distance, dissolve_threshold, smoothing_method='WEIGHTED'):
+    """
+    Fused per-object geometry pass, drop-in replacement for the chain
+    merge_vertices_by_distance / fix_normal_orientation / delete_small_features / apply_smoothing_normals.
+    Weld, recalculate normals (outside), dissolve degenerate and smoothed normals all run through
+    bmesh and the data API: no selection changes and no edit-mode toggles per object.
+    Steps are skipped when merge_distance / dissolve_threshold are 0 or smoothing_method is None, so the pipeline
+    runs it twice around the decimation: weld and normals before, dissolve and smoothing after (historical order).
+    """
+    print(f"\n--- Phase: Fused bmesh Geometry Pass (merge: {merge_distance}, dissolve: {dissolve_threshold}, normals: {smoothing_method}) ---")
+    processed_count = 0
+    for obj in mesh_objects:
+        if obj.type != 'MESH':
+            print(f"  Skipping '{obj.name}': non e' un oggetto mesh.")
+            continue
+
+        mesh = obj.data
+        bm = bmesh.new()
+        try:
+            bm.from_mesh(mesh)
+            if merge_distance > 0:
+                bmesh.ops.remove_doubles(bm, verts=bm.verts, dist=merge_distance)
+            bmesh.ops.recalc_face_normals(bm, faces=bm.faces)
+            if dissolve_threshold > 0:
+                bmesh.ops.dissolve_degenerate(bm, dist=dissolve_threshold, edges=bm.edges)
+            bm.to_mesh(mesh)
+        finally:
+            bm.free()
+
+        if smoothing_method and not set_smooth_custom_normals(mesh, smoothing_method):
+            print(f"  Smoothing method '{smoothing_method}' not recognized. Skipping normals for '{obj.name}'.")
+        mesh.update()
+        processed_count += 1
+
+    bpy.context.view_layer.update()
+    print(f"  Fused geometry pass completed on {processed_count} mesh objects.")
+
 def apply_all_modifiers(mesh_objects):
     """Applies all modifiers on the given mesh objects."""
     print("\n--- Phase: Applying All Modifiers ---")
@@ -499,63 +1086,21 @@ def create_single_scene_root(mesh_objects, root_name_base):
 def match_materials_on_manifest(segments_manifest, blender_shader_registry):
     """
     Enriches the segment manifest with Blender-specific material data.
-    This function contains all the fallback logic for deciding which material to use.
+    The fallback chain (direct, token, SNOMED type, biological category, default) is resolved for the whole
+    manifest at once by shader_registry.resolve_shader_refs; the explanation of each match is stored in
+    custom_parameters['material_match'].
     """
     print("\n--- Matching Manifest with Material Data ---")
     shader_ref_map = blender_shader_registry.get('shader_ref', {})
-    category_shader_map = blender_shader_registry.get('biological_categories', {})
-    default_shader_ref = "default_shader"
-    direct_match_count = 0
-    partial_match_count = 0
-    snomed_match_count = 0
-    biological_category_match_count= 0
-    fallback_match_count = 0
-
+    matches = shader_registry.resolve_shader_refs(segments_manifest, blender_shader_registry)
 
+    rule_counts = {'direct': 0, 'token': 0, 'snomed_type': 0, 'biological_category': 0, 'default': 0}
     for seg_name, seg_data in segments_manifest.items():
-        shader_ref_to_use = None # Resettato per ogni segmento
-        biological_category_type = seg_data.get('custom_parameters', {}).get('biological_category')
-        snomed_type = seg_data.get('snomed_details', {}).get('type')
-
-        # 1. Direct Match Logic: Check for a shader named after the segment itself
-        potential_direct_match = f"{seg_name.lower()}_shader"
-        if potential_direct_match in shader_ref_map:
-            shader_ref_to_use = potential_direct_match
-            print(f"DEBUG: Segment '{seg_name}' -> Direct Match: '{shader_ref_to_use}'.")
-            direct_match_count += 1
-        
-        # 1.5 Partial Match Logic
-        if shader_ref_to_use is None:
-            partial_matches = [
-                shader_key for shader_key in shader_ref_map 
-                if any(part in shader_key.lower() for part in seg_name.lower().split('_'))
-            ]
-            if partial_matches:
-                shader_ref_to_use = partial_matches[0]
-                print(f"DEBUG: Segment '{seg_name}' -> Partial Match: '{shader_ref_to_use}'.")
-                partial_match_count += 1
-
-        # 2. SNOMED Type Match Logic (Medium-High Priority)
-        if shader_ref_to_use is None and snomed_type:
-            # potential_snomed_match = f"{snomed_type.capitalize()}"
-            potential_snomed_match = f"{snomed_type.lower()}_shader"
-            # potential_snomed_match = f"{snomed_type}_shader"
-            if potential_snomed_match in shader_ref_map:
-                shader_ref_to_use = potential_snomed_match
-                print(f"DEBUG: Segment '{seg_name}' -> SNOMED Type Match: '{potential_snomed_match}'.")
-                snomed_match_count += 1
-
-        # 3. Biological Category Match Logic
-        if shader_ref_to_use is None and biological_category_type:
-            if biological_category_type in category_shader_map:
-                shader_ref_to_use = category_shader_map[biological_category_type]
-                print(f"DEBUG: Segment '{seg_name}' -> Biological Category Match: '{shader_ref_to_use}'.")
-                biological_category_match_count += 1
-            
-        # 4. Fallback to Default
-        if shader_ref_to_use is None:
-            shader_ref_to_use = default_shader_ref
-            fallback_match_count += 1
+        match = matches[seg_name]
+        shader_ref_to_use = match['shader_ref']
+        rule_counts[match['rule']] += 1
+        if match['rule'] != 'default':
+            print(f"DEBUG: Segment '{seg_name}' -> {match['rule']} match: '{shader_ref_to_use}'.")
 
         # Get material details from the chosen shader_ref
         shader_details = shader_ref_map.get(shader_ref_to_use, {})
@@ -563,44 +1108,18 @@ def match_materials_on_manifest(segments_manifest, blender_shader_registry):
         seg_data['custom_parameters']['blend_file'] = shader_details.get('blend_file')
         seg_data['custom_parameters']['blend_material'] = shader_details.get('blend_material')
         seg_data['custom_parameters']['color_override'] = shader_details.get('color_override')
-        
-        # print(f"DEBUG: Segment '{seg_name}' -> Shader Ref '{shader_ref_to_use}' -> Material '{shader_details.get('blend_material')}' -> Color Override '{shader_details.get('color_override')}'.")
-    print(f"DEBUG: *** RECAP Match count. Direct: '{direct_match_count}', Partial: '{partial_match_count}, 'Snomed: '{snomed_match_count}', Biological Category: '{biological_category_match_count}', Fallback: '{fallback_match_count}'  ")
+        seg_data['custom_parameters']['material_match'] = match
+
+    print(f"DEBUG: *** RECAP Match count. Direct: '{rule_counts['direct']}', Token: '{rule_counts['token']}', Snomed: '{rule_counts['snomed_type']}', Biological Category: '{rule_counts['biological_category']}', Fallback: '{rule_counts['default']}'  ")
     return segments_manifest
 
-def apply_materials_from_manifest(imported_meshes, enriched_manifest):
+def append_materials_with_operator(materials_to_append, cleanup_registry=None):
     """
-    Applies materials to meshes based on the pre-enriched manifest.
-    This function is a simple executor, with no decision logic.
-    Returns a list of temporary items (nodes and objects) to be cleaned up later.
+    Historical loader: one bpy.ops.wm.append per material (each call opens its .blend and also brings in
+    the '{Material}_projector' objects). Returns the template materials and projectors to clean up,
+    which are also recorded in cleanup_registry with the 'template' tag.
     """
-    print("\n--- Applying Materials from Enriched Manifest ---")
-    materials_to_append = {}  # {mat_name: blend_file_path}
-    temp_items_for_cleanup = [] # List to track created override nodes AND projector objects
-
-    # First, determine which object corresponds to which entry in the manifest
-    # and gather all unique materials that need to be appended.
-    for obj in imported_meshes:
-        # The object name should match a key in the manifest.
-        # This includes individual segments and combined meshes.
-        obj_name_in_manifest = obj.name
-        
-        if obj_name_in_manifest in enriched_manifest:
-            mat_details = enriched_manifest[obj_name_in_manifest].get('custom_parameters', {})
-            mat_name = mat_details.get('blend_material')
-            blend_file = mat_details.get('blend_file')
-
-            if mat_name and blend_file:
-                if mat_name not in materials_to_append:
-                    materials_to_append[mat_name] = os.path.join(config.SHADERS_DIR, blend_file)
-                # Store the final material name directly on the object for the next step
-                obj['material_to_assign'] = mat_name
-            else:
-                print(f"  WARNING: Material details missing for '{obj_name_in_manifest}' in manifest.")
-        else:
-            print(f"  WARNING: Object '{obj.name}' not found in manifest. Cannot assign material.")
-
-    # --- Append all unique materials in one go ---
+    temp_items_for_cleanup = []
     for mat_name, blend_path in materials_to_append.items():
         if mat_name and mat_name not in bpy.data.materials:
             try:
@@ -613,6 +1132,7 @@ def apply_materials_from_manifest(imported_meshes, enriched_manifest):
 
                 # --- Add TEMPLATE MATERIALS to cleanup list ---
                 temp_items_for_cleanup.append(mat_name) #Material
+                register_temp_material(cleanup_registry, mat_name, 'template')
                 print(f"    -> found Template Material '{mat_name}', scheduled for cleanup.")
                 # # Ispeziona i nodi del materiale appena importato
                 # mat_nodes = bpy.data.materials.get(mat_name)
@@ -625,11 +1145,165 @@ def apply_materials_from_manifest(imported_meshes, enriched_manifest):
                 projector_name = f"{mat_name.capitalize()}_projector"
                 if projector_name in bpy.data.objects:
                     temp_items_for_cleanup.append(projector_name)
+                    register_temp_object(cleanup_registry, projector_name, 'template')
                     print(f"    -> Found Projector '{projector_name}', scheduled for cleanup.")
                 
 
             except Exception as e:
                 print(f"  ERROR appending material '{mat_name}': {e}")
+    return temp_items_for_cleanup
+
+def load_materials_from_libraries(materials_to_append, library_path=None):
+    """
+    Loads the template materials with bpy.data.libraries.load, opening each .blend once for all the
+    materials it provides and appending only the material datablocks (node trees, images and objects
+    they reference come in as dependencies, projectors are not linked to the scene).
+    If library_path points to a consolidated library (build_consolidated_shader_library), materials found
+    there are loaded from it in a single pass; the others fall back to their own file.
+    materials_to_append is {material_name: blend_file_path}. Returns the names of the loaded materials.
+    """
+    materials_by_file = {}
+    library_materials = set()
+    if library_path and os.path.exists(library_path):
+        with bpy.data.libraries.load(library_path) as (data_from, data_to):
+            library_materials = set(data_from.materials)
+    for mat_name, blend_path in materials_to_append.items():
+        if mat_name in bpy.data.materials:
+            continue
+        source_path = library_path if mat_name in library_materials else blend_path
+        materials_by_file.setdefault(source_path, []).append(mat_name)
+
+    loaded_names = []
+    for blend_path, mat_names in materials_by_file.items():
+        if not os.path.exists(blend_path):
+            print(f"  ERROR: Shader library '{blend_path}' not found. Cannot load {mat_names}.")
+            continue
+        with bpy.data.libraries.load(blend_path, link=False) as (data_from, data_to):
+            available = set(data_from.materials)
+            requested = [name for name in mat_names if name in available]
+            data_to.materials = list(requested)
+        for mat_name in mat_names:
+            if mat_name not in available:
+                print(f"  ERROR: Material '{mat_name}' not found in '{os.path.basename(blend_path)}'.")
+        for mat_name, material in zip(requested, data_to.materials):
+            if material is None:
+                print(f"  ERROR loading material '{mat_name}' from '{os.path.basename(blend_path)}'.")
+                continue
+            loaded_names.append(material.name)
+        print(f"  Loaded {len(requested)} materials from '{os.path.basename(blend_path)}' in one pass.")
+    return loaded_names
+
+def build_consolidated_shader_library(blender_shader_registry, shaders_dir, library_path):
+    """
+    Writes a single .blend containing every material referenced by the shader registry (with fake users),
+    so that material loading opens one file instead of one per shader. The library is rebuilt when missing,
+    older than the registry's .blend files, or built for a different set of registry materials (fingerprint
+    stored next to it in '{library_path}.json'). Materials whose name appears in more than one file
+    are left out (they keep loading from their own file). Returns True if the library is usable.
+    """
+    print("\n--- Phase: Consolidated Shader Library ---")
+    materials_by_file = {}
+    seen_materials = {}
+    for shader_ref, shader_data in (blender_shader_registry.get('shader_ref') or {}).items():
+        blend_file = (shader_data or {}).get('blend_file')
+        mat_name = (shader_data or {}).get('blend_material')
+        if not blend_file or not mat_name:
+            continue
+        blend_path = os.path.join(shaders_dir, blend_file)
+        if seen_materials.setdefault(mat_name, blend_path) != blend_path:
+            print(f"  WARNING: Material '{mat_name}' defined in more than one file. Not consolidated.")
+            continue
+        if os.path.exists(blend_path) and mat_name not in materials_by_file.get(blend_path, []):
+            materials_by_file.setdefault(blend_path, []).append(mat_name)
+
+    fingerprint = hashlib.sha256(json.dumps(sorted(materials_by_file.items()), sort_keys=True).encode('utf-8')).hexdigest()
+    fingerprint_path = f"{library_path}.json"
+    if os.path.exists(library_path) and os.path.exists(fingerprint_path):
+        library_mtime = os.path.getmtime(library_path)
+        if utils.read_json(fingerprint_path).get('fingerprint') == fingerprint and \
+                all(os.path.getmtime(path) <= library_mtime for path in materials_by_file):
+            print(f"  Consolidated library up to date: {library_path}")
+            return True
+
+    existing_ids = set(bpy.data.materials) | set(bpy.data.objects) | set(bpy.data.node_groups) | set(bpy.data.images)
+    consolidated = set()
+    renamed_session_materials = []
+    for blend_path, mat_names in materials_by_file.items():
+        with bpy.data.libraries.load(blend_path, link=False) as (data_from, data_to):
+            requested = [name for name in mat_names if name in data_from.materials]
+            data_to.materials = list(requested)
+        for mat_name, material in zip(requested, data_to.materials):
+            if not material:
+                continue
+            if material.name != mat_name:
+                # same name already in the session (e.g. templates preloaded by the service): the library
+                # must store the material under its registry name, not 'name.001'
+                session_material = bpy.data.materials[mat_name]
+                session_material.name = f"{mat_name}__session"
+                material.name = mat_name
+                renamed_session_materials.append((session_material, mat_name))
+            consolidated.add(material)
+
+    os.makedirs(os.path.dirname(library_path), exist_ok=True)
+    bpy.data.libraries.write(library_path, consolidated, fake_user=True, path_remap='ABSOLUTE')
+    utils.write_json({'fingerprint': fingerprint, 'materials': sorted(material.name for material in consolidated)}, fingerprint_path)
+    print(f"  Consolidated {len(consolidated)} materials from {len(materials_by_file)} files into {library_path}")
+
+    # The materials were only needed to write the library: leave the session as it was
+    loaded_ids = [id_data for collection in (bpy.data.materials, bpy.data.objects, bpy.data.node_groups, bpy.data.images)
+                  for id_data in collection if id_data not in existing_ids]
+    bpy.data.batch_remove(loaded_ids)
+    for session_material, mat_name in renamed_session_materials:
+        session_material.name = mat_name
+    return True
+
+def apply_materials_from_manifest(imported_meshes, enriched_manifest, cleanup_registry=None):
+    """
+    Applies materials to meshes based on the pre-enriched manifest.
+    This function is a simple executor, with no decision logic.
+    Template materials and projectors are recorded in cleanup_registry with the 'template' tag,
+    color override nodes with the 'color_override' tag.
+    Returns a list of temporary items (nodes and objects) to be cleaned up later.
+    """
+    print("\n--- Applying Materials from Enriched Manifest ---")
+    materials_to_append = {}  # {mat_name: blend_file_path}
+    temp_items_for_cleanup = [] # List to track created override nodes AND projector objects
+
+    # First, determine which object corresponds to which entry in the manifest
+    # and gather all unique materials that need to be appended.
+    for obj in imported_meshes:
+        # The object name should match a key in the manifest.
+        # This includes individual segments and combined meshes.
+        obj_name_in_manifest = obj.name
+        
+        if obj_name_in_manifest in enriched_manifest:
+            mat_details = enriched_manifest[obj_name_in_manifest].get('custom_parameters', {})
+            mat_name = mat_details.get('blend_material')
+            blend_file = mat_details.get('blend_file')
+
+            if mat_name and blend_file:
+                if mat_name not in materials_to_append:
+                    materials_to_append[mat_name] = os.path.join(config.SHADERS_DIR, blend_file)
+                # Store the final material name directly on the object for the next step
+                obj['material_to_assign'] = mat_name
+                obj['material_blend_file'] = os.path.join(config.SHADERS_DIR, blend_file) # bake cache key
+                if mat_details.get('color_override'):
+                    obj['color_override'] = mat_details['color_override']
+            else:
+                print(f"  WARNING: Material details missing for '{obj_name_in_manifest}' in manifest.")
+        else:
+            print(f"  WARNING: Object '{obj.name}' not found in manifest. Cannot assign material.")
+
+    # --- Load all unique materials ---
+    if config.MATERIAL_LOADER.upper() == 'APPEND':
+        temp_items_for_cleanup.extend(append_materials_with_operator(materials_to_append, cleanup_registry))
+    else:
+        library_path = config.SHADER_LIBRARY_FILE if config.MATERIAL_LOADER.upper() == 'CONSOLIDATED' else None
+        loaded_materials = load_materials_from_libraries(materials_to_append, library_path)
+        # Template materials are removed at cleanup; projectors are not linked to the scene, nothing else to clean
+        temp_items_for_cleanup.extend(loaded_materials)
+        for mat_name in loaded_materials:
+            register_temp_material(cleanup_registry, mat_name, 'template')
 
     # --- Apply the assigned material to each object ---
     for obj in imported_meshes:
@@ -655,7 +1329,7 @@ def apply_materials_from_manifest(imported_meshes, enriched_manifest):
 
                     if color_override_hex:
                         #print ("\n**** COLOR OVERRIDE ROUTINE ***\n")
-                        mix_node_name = apply_color_override_node(obj, new_mat, color_override_hex)
+                        mix_node_name = apply_color_override_node(obj, new_mat, color_override_hex, cleanup_registry)
                         if mix_node_name:
                             temp_items_for_cleanup.append(mix_node_name)
                 # --- End Color Override ---
@@ -664,9 +1338,10 @@ def apply_materials_from_manifest(imported_meshes, enriched_manifest):
     return temp_items_for_cleanup
 
 
-def apply_color_override_node(obj, material, color_override_hex):
+def apply_color_override_node(obj, material, color_override_hex, cleanup_registry=None):
     """
-    Applies a color override to the material of an object by adding a Mix node.
+    Applies a color override to the material of an object by adding a Mix node
+    (recorded in cleanup_registry with the 'color_override' tag).
     """
     print(f"  Applying color override '{color_override_hex}' to '{obj.name}'.")
     nodes = material.node_tree.nodes
@@ -704,6 +1379,7 @@ def apply_color_override_node(obj, material, color_override_hex):
                 links.remove(link)
             # OUTPUT 'Result'
             links.new(mix_node.outputs['Result'], base_color_input)
+            register_temp_node(cleanup_registry, material, mix_node, 'color_override')
             print(f"    Applied Mix node override for '{obj.name}'.")
             return mix_node.name
         else:
@@ -750,32 +1426,410 @@ def uv_map(mesh_objects, texture_size):
         print(f"  UV map for '{obj.name}' created/updated with Smart UV Project.")
     bpy.context.view_layer.update()
 
-def bake_channel(mesh_object, channel_type, textures_dir, texture_size, color_space):
-    """Generic function to bake a specific channel (Color, Normal, Roughness, etc.)."""
-    obj_name = mesh_object.name
-    print(f"Baking {channel_type.capitalize()} for '{obj_name}'...")
-    obj = mesh_object
-    
-    if not obj or obj.type != 'MESH' or not obj.data.materials:
-        print(f"Object '{obj_name}' not found, is not a mesh, or has no materials. Skipping bake.")
-        return False
-    
-    # Select the mesh
-    bpy.ops.object.select_all(action='DESELECT')
-    bpy.context.view_layer.objects.active = obj
-    obj.select_set(True)
-
-    # Get mesh material
-    mat = obj.data.materials[0] # Assumes material is at index 0
-    mat.use_nodes = True
-    nodes = mat.node_tree.nodes
-
+def uv_map_box_charts(mesh_objects, island_margin=0.02, max_workers=None):
+    """
+    Fast alternative to uv_map: box-projection chart growing and shelf packing (uv_ops.unwrap_box_charts)
+    run on NumPy arrays in a process pool, outside the Blender main thread and without edit mode.
+    Produces few, large charts (seams only where the dominant axis changes). UVs are written back with foreach_set
+    into a fresh 'UVMap' layer, as uv_map does.
+    """
+    print(f"\n--- Phase: UV Mapping (box charts, {len(mesh_objects)} objects) ---")
+    unwrap_objects = []
+    unwrap_args = []
+    for obj in mesh_objects:
+        if not obj or obj.type != 'MESH' or not obj.data.polygons:
+            print(f"Object '{obj.name}' not found, not a mesh or empty. Skipping UV Map.")
+            continue
+        mesh = obj.data
+        vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get('co', vertices)
+        loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get('vertex_index', loop_vertices)
+        loop_edges = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get('edge_index', loop_edges)
+        loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get('loop_total', loop_totals)
+        face_normals = np.empty(len(mesh.polygons) * 3, dtype=np.float32)
+        mesh.polygons.foreach_get('normal', face_normals)
+        unwrap_objects.append(obj)
+        unwrap_args.append((vertices, loop_vertices, loop_edges, loop_totals, face_normals, island_margin))
+
+    all_uvs = utils.map_in_process_pool(uv_ops.unwrap_box_charts, unwrap_args, max_workers)
+
+    for obj, uvs in zip(unwrap_objects, all_uvs):
+        while obj.data.uv_layers:
+            obj.data.uv_layers.remove(obj.data.uv_layers[0])
+        new_uv_layer = obj.data.uv_layers.new(name="UVMap")
+        new_uv_layer.active = True
+        new_uv_layer.active_render = True
+        new_uv_layer.data.foreach_set('uv', uvs.ravel())
+        print(f"  UV map for '{obj.name}' created with box charts.")
+    bpy.context.view_layer.update()
+
+def compute_texel_density_texture_sizes(mesh_objects, texels_per_mm, min_size, max_size, units_to_mm, enriched_manifest=None):
+    """
+    Chooses a per-object bake resolution from a target texel density, after uv_map.
+    For a surface of A mm² whose UV islands cover a fraction c of the UV square, a texture of side
+    N = texels_per_mm * sqrt(A / c) gives the target density; N is rounded to the nearest power of two
+    and clamped to [min_size, max_size].
+    The size is stored in obj['texture_size'] (used by the bake functions) and in the manifest
+    (custom_parameters['texture_size']). Returns {object_name: texture_size}.
+    """
+    print(f"\n--- Phase: Texel Density Texture Sizes (target {texels_per_mm} texels/mm, {min_size}-{max_size} px) ---")
+    texture_sizes = {}
+    for obj in mesh_objects:
+        if obj.type != 'MESH':
+            continue
+        mesh = obj.data
+        vertices, triangles = get_mesh_triangle_arrays(mesh)
+        if not len(triangles):
+            continue
+
+        # World-space surface area in mm²
+        matrix = np.array(obj.matrix_world, dtype=np.float64)
+        world_vertices = vertices @ matrix[:3, :3].T + matrix[:3, 3]
+        corners = world_vertices[triangles] * units_to_mm
+        surface_mm2 = 0.5 * np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1).sum()
+
+        # UV coverage (fraction of the 0-1 square used by the islands)
+        uv_coverage = 1.0
+        uv_layer = mesh.uv_layers.active
+        if uv_layer:
+            uvs = np.empty(len(uv_layer.data) * 2, dtype=np.float32)
+            uv_layer.data.foreach_get('uv', uvs)
+            triangle_loops = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+            mesh.loop_triangles.foreach_get('loops', triangle_loops)
+            uv_corners = uvs.reshape(-1, 2)[triangle_loops.reshape(-1, 3)].astype(np.float64)
+            edge_a = uv_corners[:, 1] - uv_corners[:, 0]
+            edge_b = uv_corners[:, 2] - uv_corners[:, 0]
+            uv_coverage = min(1.0, max(1e-4, 0.5 * np.abs(edge_a[:, 0] * edge_b[:, 1] - edge_a[:, 1] * edge_b[:, 0]).sum()))
+
+        ideal_size = texels_per_mm * np.sqrt(surface_mm2 / uv_coverage)
+        texture_size = int(2 ** round(np.log2(max(ideal_size, 1.0))))
+        texture_size = max(min_size, min(max_size, texture_size))
+
+        obj['texture_size'] = texture_size
+        texture_sizes[obj.name] = texture_size
+        if enriched_manifest is not None and obj.name in enriched_manifest:
+            enriched_manifest[obj.name].setdefault('custom_parameters', {})['texture_size'] = texture_size
+        print(f"  '{obj.name}': {surface_mm2:.0f} mm², UV coverage {uv_coverage:.2f} -> {texture_size}x{texture_size} (ideal {ideal_size:.0f}).")
+
+    if texture_sizes:
+        texel_count = sum(size * size for size in texture_sizes.values())
+        print(f"  {len(texture_sizes)} objects, {texel_count / 1e6:.1f} Mtexels per channel in total.")
+    return texture_sizes
+
+def build_texture_atlases(mesh_objects, max_objects_per_atlas, island_margin):
+    """
+    Groups the meshes by assigned shader (obj['material_to_assign']) in chunks of max_objects_per_atlas and
+    packs the UV islands of every group into one shared 0-1 space (multi-object edit mode), after equalizing
+    the island scale so texel density is uniform across the objects of an atlas.
+    Each object gets obj['bake_target'] = atlas name, which the bake and texture functions use instead of obj.name.
+    Returns {atlas_name: [objects]}.
+    """
+    print(f"\n--- Phase: Packing UV Atlases (max {max_objects_per_atlas} objects per atlas) ---")
+    objects_by_material = {}
+    for obj in mesh_objects:
+        if obj.type != 'MESH':
+            continue
+        objects_by_material.setdefault(obj.get('material_to_assign', 'no_material'), []).append(obj)
+
+    atlas_groups = {}
+    for mat_name, objects in objects_by_material.items():
+        for start in range(0, len(objects), max_objects_per_atlas):
+            atlas_name = f"atlas_{mat_name}_{start // max_objects_per_atlas:02d}"
+            atlas_groups[atlas_name] = objects[start:start + max_objects_per_atlas]
+
+    for atlas_name, atlas_objects in atlas_groups.items():
+        bpy.ops.object.select_all(action='DESELECT')
+        for obj in atlas_objects:
+            obj.select_set(True)
+            obj['bake_target'] = atlas_name
+        bpy.context.view_layer.objects.active = atlas_objects[0]
+
+        bpy.ops.object.mode_set(mode='EDIT') # enters edit mode on all selected meshes
+        bpy.ops.mesh.select_all(action='SELECT')
+        bpy.ops.uv.select_all(action='SELECT')
+        bpy.ops.uv.average_islands_scale()
+        bpy.ops.uv.pack_islands(rotate=True, margin=island_margin)
+        bpy.ops.object.mode_set(mode='OBJECT')
+        print(f"  Packed UV islands of {len(atlas_objects)} objects into atlas '{atlas_name}'.")
+
+    bpy.ops.object.select_all(action='DESELECT')
+    bpy.context.view_layer.update()
+    return atlas_groups
+
+BAKE_CACHE_STATS = {'hits': 0, 'misses': 0}
+
+def compute_bake_cache_key(mesh_objects, channel_type, texture_size, bake_args):
+    """
+    Content hash identifying a bake result: geometry, corner (custom split) normals, active UVs and world matrix
+    of every object, source material (blend file hash, material name, color_override), channel, texture size,
+    bake operator arguments, normal smoothing settings, Cycles samples and Blender version.
+    """
+    digest = hashlib.sha256()
+    settings = {
+        'channel': channel_type.lower(),
+        'texture_size': texture_size,
+        'bake_args': {key: sorted(value) if isinstance(value, set) else value for key, value in bake_args.items()},
+        'samples': bpy.context.scene.cycles.samples,
+        'normal_smoothing': config.NORMAL_SMOOTHING_METHOD,
+        'custom_normals': config.MESH_IMPORT_CUSTOM_NORMALS,
+        'blender': bpy.app.version_string,
+    }
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+
+    for obj in mesh_objects:
+        mesh = obj.data
+        for collection, attribute, dtype, width in (
+            (mesh.vertices, 'co', np.float32, 3),
+            (mesh.loops, 'vertex_index', np.int32, 1),
+            (mesh.polygons, 'loop_start', np.int32, 1),
+            (mesh.corner_normals, 'vector', np.float32, 3), # the tangent-space normal bake depends on them
+        ):
+            buffer = np.empty(len(collection) * width, dtype=dtype)
+            collection.foreach_get(attribute, buffer)
+            digest.update(buffer.tobytes())
+        uv_layer = mesh.uv_layers.active
+        if uv_layer:
+            uvs = np.empty(len(uv_layer.data) * 2, dtype=np.float32)
+            uv_layer.data.foreach_get('uv', uvs)
+            digest.update(uvs.tobytes())
+        digest.update(np.array(obj.matrix_world, dtype=np.float32).tobytes())
+        material_source = {
+            'material': obj.get('material_to_assign'),
+            'blend_file_hash': utils.file_sha256(obj.get('material_blend_file')),
+            'color_override': obj.get('color_override'),
+        }
+        digest.update(json.dumps(material_source, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+def fetch_baked_image_from_cache(cache_key, image_name, output_path, color_space):
+    """
+    On a bake cache hit copies the cached PNG to output_path and loads it as image_name. The image goes through
+    release_image_buffers like a fresh bake, so cache hits count towards the IMAGE_MEMORY_CAP_MB accounting.
+    Returns the image, or None on a miss (or when the cache is disabled).
+    """
+    if not config.BAKE_CACHE_ENABLED:
+        return None
+    if not utils.bake_cache_fetch(config.BAKE_CACHE_DIR, cache_key, output_path):
+        BAKE_CACHE_STATS['misses'] += 1
+        return None
+    BAKE_CACHE_STATS['hits'] += 1
+    if image_name in bpy.data.images:
+        bpy.data.images.remove(bpy.data.images[image_name], do_unlink=True)
+    image = bpy.data.images.load(output_path, check_existing=False)
+    image.name = image_name
+    image.colorspace_settings.name = color_space
+    print(f"  Bake cache hit: '{image_name}' copied from cache ({cache_key[:12]}).")
+    release_image_buffers(image)
+    return image
+
+def store_baked_image_in_cache(cache_key, output_path):
+    """Adds a freshly baked PNG to the bake cache (size bounded by BAKE_CACHE_MAX_BYTES, LRU eviction)."""
+    if config.BAKE_CACHE_ENABLED:
+        utils.bake_cache_store(config.BAKE_CACHE_DIR, cache_key, output_path, config.BAKE_CACHE_MAX_BYTES)
+
+def report_bake_cache_stats():
+    """Prints the bake cache hit/miss counters of this run."""
+    if not config.BAKE_CACHE_ENABLED:
+        return
+    total = BAKE_CACHE_STATS['hits'] + BAKE_CACHE_STATS['misses']
+    hit_rate = BAKE_CACHE_STATS['hits'] / total * 100 if total else 0.0
+    print(f"RECAP BAKE CACHE: hits: {BAKE_CACHE_STATS['hits']}, misses: {BAKE_CACHE_STATS['misses']} ({hit_rate:.0f}% hit rate).")
+
+IMAGE_MEMORY_STATS = {'peak_bytes': 0, 'released_buffers': 0}
+
+def get_image_bytes(image):
+    """Approximate size of the pixel buffers of an image, 0 when they are not loaded."""
+    if not image.has_data:
+        return 0
+    return image.size[0] * image.size[1] * image.channels * (4 if image.is_float else 1)
+
+def track_image_memory():
+    """
+    Samples the pixel memory of the resident images (peak reported by report_image_memory_stats) and enforces
+    config.IMAGE_MEMORY_CAP_MB: above the cap the buffers of saved, unmodified images are freed, largest first
+    (Blender reloads them from disk when they are used again). Returns the resident bytes.
+    """
+    resident_bytes = sum(get_image_bytes(image) for image in bpy.data.images)
+    IMAGE_MEMORY_STATS['peak_bytes'] = max(IMAGE_MEMORY_STATS['peak_bytes'], resident_bytes)
+    if not config.IMAGE_MEMORY_CAP_MB or resident_bytes <= config.IMAGE_MEMORY_CAP_MB * 1024 * 1024:
+        return resident_bytes
+
+    releasable = [image for image in bpy.data.images
+                  if image.has_data and image.source == 'FILE' and image.filepath_raw and not image.is_dirty]
+    for image in sorted(releasable, key=get_image_bytes, reverse=True):
+        if resident_bytes <= config.IMAGE_MEMORY_CAP_MB * 1024 * 1024:
+            break
+        resident_bytes -= get_image_bytes(image)
+        image.buffers_free()
+        IMAGE_MEMORY_STATS['released_buffers'] += 1
+    if resident_bytes > config.IMAGE_MEMORY_CAP_MB * 1024 * 1024:
+        print(f"  WARNING: {resident_bytes / (1024 * 1024):.0f} MB of unsaved images resident, above the {config.IMAGE_MEMORY_CAP_MB} MB cap.")
+    return resident_bytes
+
+def release_image_buffers(image):
+    """
+    Called right after image.save() (or a bake cache load): the image becomes file-backed (reloaded lazily from filepath_raw by
+    Blender or the exporters) and its pixel buffers are freed. The peak is sampled while they are still resident.
+    """
+    track_image_memory()
+    image.source = 'FILE'
+    image.buffers_free()
+    IMAGE_MEMORY_STATS['released_buffers'] += 1
+
+def split_by_image_memory(items, item_bytes):
+    """
+    Splits items, in order, into chunks whose summed item_bytes stay within config.IMAGE_MEMORY_CAP_MB,
+    so a chunk of new images can be allocated, baked and saved before the next one is created
+    (an item larger than the cap gets a chunk of its own). A single chunk when there is no cap.
+    """
+    if not config.IMAGE_MEMORY_CAP_MB:
+        return [list(items)] if items else []
+    cap_bytes = config.IMAGE_MEMORY_CAP_MB * 1024 * 1024
+    chunks = []
+    chunk_bytes = 0
+    for item, size in zip(items, item_bytes):
+        if not chunks or chunk_bytes + size > cap_bytes:
+            chunks.append([])
+            chunk_bytes = 0
+        chunks[-1].append(item)
+        chunk_bytes += size
+    return chunks
+
+def report_image_memory_stats():
+    """Prints the peak resident image memory of this run. Returns the figures for the run report."""
+    track_image_memory()
+    stats = {
+        'peak_mb': round(IMAGE_MEMORY_STATS['peak_bytes'] / (1024 * 1024), 1),
+        'cap_mb': config.IMAGE_MEMORY_CAP_MB,
+        'released_buffers': IMAGE_MEMORY_STATS['released_buffers'],
+    }
+    print(f"RECAP IMAGE MEMORY: peak {stats['peak_mb']} MB (cap: {stats['cap_mb'] or 'none'} MB), {stats['released_buffers']} pixel buffers released.")
+    return stats
+
+CONSTANT_CHANNEL_INPUTS = {'diffuse': 'Base Color', 'normal': 'Normal', 'roughness': 'Roughness'} # Principled BSDF input per baked channel
+
+def get_constant_input_value(socket):
+    """
+    Value of a shader input that does not depend on the surface: the socket default when unlinked, or an
+    RGB / Value node (through reroutes). Colors are returned as RGBA lists, scalars as floats (colors feeding
+    a scalar input are converted to luminance, as Cycles does). Returns None for any other source.
+    """
+    source = socket
+    while source.links:
+        from_node = source.links[0].from_node
+        if from_node.type == 'REROUTE':
+            source = from_node.inputs[0]
+        elif from_node.type in ('RGB', 'VALUE'):
+            value = from_node.outputs[0].default_value
+            break
+        else:
+            return None
+    else:
+        value = source.default_value
+
+    if isinstance(value, float):
+        return [value, value, value, 1.0] if socket.type == 'RGBA' else value
+    value = [float(component) for component in value]
+    if socket.type == 'RGBA':
+        return value
+    return 0.2126 * value[0] + 0.7152 * value[1] + 0.0722 * value[2]
+
+def detect_constant_channels(mesh_objects, enriched_manifest):
+    """
+    Node-graph analysis before the bake. For every bake target (the object, or its atlas) finds the channels
+    whose Principled BSDF input is constant (get_constant_input_value); the normal channel is constant
+    ('flat') when the Normal input is unlinked. Only a Principled BSDF feeding the material output directly
+    (get_surface_principled_bsdf) is analysed: with any other surface shader every channel is baked and the
+    node tree is left untouched. In an atlas a channel is constant only if all its objects share the value. Constant values are written on the Principled BSDF inputs, so exporters emit them as
+    material factors, and stored in obj['constant_channels'] and custom_parameters['constant_channels'] of the
+    manifest; the bake, texture loading, linking and metalness steps skip those channels.
+    Returns {bake_name: {channel: value}}.
+    """
+    print("\n--- Phase: Detecting Constant Material Channels ---")
+    values_by_target = {}
+    for obj in mesh_objects:
+        if obj.type != 'MESH':
+            continue
+        mat = obj.data.materials[0] if obj.data.materials else None
+        principled_bsdf = get_surface_principled_bsdf(mat)
+        values = {}
+        for channel_type, input_name in CONSTANT_CHANNEL_INPUTS.items():
+            if not principled_bsdf or input_name not in principled_bsdf.inputs:
+                continue
+            socket = principled_bsdf.inputs[input_name]
+            value = ('flat' if not socket.links else None) if channel_type == 'normal' else get_constant_input_value(socket)
+            if value is not None:
+                values[channel_type] = value
+        values_by_target.setdefault(obj.get('bake_target', obj.name), []).append((obj, principled_bsdf, values))
+
+    constant_channels = {}
+    for bake_name, entries in values_by_target.items():
+        shared = dict(entries[0][2])
+        for _, _, values in entries[1:]:
+            shared = {channel_type: value for channel_type, value in shared.items() if values.get(channel_type) == value}
+        constant_channels[bake_name] = shared
+
+        for obj, principled_bsdf, _ in entries:
+            obj['constant_channels'] = shared
+            if obj.name in enriched_manifest:
+                enriched_manifest[obj.name].setdefault('custom_parameters', {})['constant_channels'] = shared
+            for channel_type, value in shared.items():
+                if channel_type == 'normal':
+                    continue
+                socket = principled_bsdf.inputs[CONSTANT_CHANNEL_INPUTS[channel_type]]
+                for link in list(socket.links):
+                    obj.data.materials[0].node_tree.links.remove(link)
+                socket.default_value = value
+        if shared:
+            print(f"  '{bake_name}': constant {sorted(shared)}, exported as material factors.")
+
+    skipped_count = sum(len(channels) for channels in constant_channels.values())
+    print(f"  {skipped_count} of {len(constant_channels) * len(CONSTANT_CHANNEL_INPUTS)} channel bakes skipped.")
+    return constant_channels
+
+def bake_channel(mesh_object, channel_type, textures_dir, texture_size, color_space, cleanup_registry=None):
+    """
+    Generic function to bake a specific channel (Color, Normal, Roughness, etc.).
+    The image node is recorded in cleanup_registry with the 'bake' tag.
+    """
+    obj_name = mesh_object.name
+    print(f"Baking {channel_type.capitalize()} for '{obj_name}'...")
+    obj = mesh_object
+    
+    if not obj or obj.type != 'MESH' or not obj.data.materials:
+        print(f"Object '{obj_name}' not found, is not a mesh, or has no materials. Skipping bake.")
+        return False
+    
+    # Select the mesh
+    bpy.ops.object.select_all(action='DESELECT')
+    bpy.context.view_layer.objects.active = obj
+    obj.select_set(True)
+
+    # Get mesh material
+    mat = obj.data.materials[0] # Assumes material is at index 0
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+
     # Create texture node for the bake
     image_name = f"{obj_name}_{channel_type.lower()}"
     tex_node = nodes.new("ShaderNodeTexImage")
     tex_node.name = image_name # Assegna un nome specifico basato sull'oggetto e sul canale
+    register_temp_node(cleanup_registry, mat, tex_node, 'bake')
     print(f"DEBUG:  Created Image Texture Node '{tex_node.name}' for bake.")
 
+    # Bake cache: on a hit the cached PNG replaces the Cycles bake
+    output_path = os.path.join(textures_dir, f"{obj_name}_{channel_type.lower()}.png")
+    use_emission = can_use_emission_bake([mat], channel_type)
+    cache_key = compute_bake_cache_key([obj], channel_type, texture_size, get_bake_args(channel_type, texture_size, use_emission))
+    cached_image = fetch_baked_image_from_cache(cache_key, image_name, output_path, color_space)
+    if cached_image:
+        tex_node.image = cached_image
+        obj.select_set(False)
+        return tex_node.name
+
     # Determine if the image should have an alpha channel (Diffuse channel use alpha as transparency)
     create_alpha = False
     if channel_type.lower() == 'diffuse':
@@ -804,80 +1858,598 @@ def bake_channel(mesh_object, channel_type, textures_dir, texture_size, color_sp
     if bpy.ops.object.mode_set.poll():
         bpy.ops.object.mode_set(mode='OBJECT')
     
-    bake_args = {
-        'type': channel_type.upper(),
-        'target': 'IMAGE_TEXTURES',
-        'width': texture_size,
-        'height': texture_size,
-        'margin': 8, # Margine dilazione
-    }
-
-    # Adjust bake arguments for each bake type
-    if channel_type.upper() == 'NORMAL':
-        bake_args['normal_space'] = 'TANGENT'
-        bake_args['normal_r'] = 'POS_X'
-        bake_args['normal_g'] = 'POS_Y'
-        bake_args['normal_b'] = 'POS_Z'
-    elif channel_type.upper() == 'DIFFUSE':
-        bake_args['pass_filter'] = {'COLOR'}
-
-
     print(f"  Performing {channel_type.lower()} bake for '{obj_name}'...")
-    bpy.ops.object.bake(**bake_args) 
+    run_bake_operator([mat], channel_type, texture_size, use_emission=use_emission)
     
     # Save the image with the correct path
-    image.filepath_raw = os.path.join(textures_dir, f"{obj_name}_{channel_type.lower()}.png")
+    image.filepath_raw = output_path
     image.file_format = 'PNG'
     image.save()
     print(f"  Baked {channel_type.capitalize()} saved to {image.filepath_raw}")
+    store_baked_image_in_cache(cache_key, output_path)
+    release_image_buffers(image)
     
     # Deselect the image node for subsequent bakes
     obj.select_set(False)
     tex_node.select = False
     return tex_node.name
 
-def bake_textures(imported_meshes, textures_dir, texture_size, blender_device):
+def bake_textures(imported_meshes, textures_dir, texture_size, blender_device, cleanup_registry=None):
     """Orchestrates baking of Color, Normal, and Roughness textures for all meshes."""
     created_bake_nodes = []
 
     for obj in imported_meshes:
         if obj.type != 'MESH':
             continue # Skip non-mesh objects
+        object_texture_size = obj.get('texture_size', texture_size) # texel density mode: per-object size
+        constant_channels = obj.get('constant_channels', {}) # exported as material factors, see detect_constant_channels
 
         # Bake Albedo (Diffuse)
-        node= bake_channel(obj, 'diffuse', textures_dir, texture_size, 'sRGB') # 'diffuse' for albedo
-        if node:
-            created_bake_nodes.append(node)
+        if 'diffuse' not in constant_channels:
+            node= bake_channel(obj, 'diffuse', textures_dir, object_texture_size, 'sRGB', cleanup_registry) # 'diffuse' for albedo
+            if node:
+                created_bake_nodes.append(node)
 
         # Bake Normal
-        node= bake_channel(obj, 'normal', textures_dir, texture_size, 'Non-Color')
-        if node: 
-            created_bake_nodes.append(node)
+        if 'normal' not in constant_channels:
+            node= bake_channel(obj, 'normal', textures_dir, object_texture_size, 'Non-Color', cleanup_registry)
+            if node: 
+                created_bake_nodes.append(node)
         # Bake Roughness
-        node= bake_channel(obj, 'roughness', textures_dir, texture_size, 'Non-Color')
-        if node:
-            created_bake_nodes.append(node)
+        if 'roughness' not in constant_channels:
+            node= bake_channel(obj, 'roughness', textures_dir, object_texture_size, 'Non-Color', cleanup_registry)
+            if node:
+                created_bake_nodes.append(node)
     return created_bake_nodes
 
-def TO_DO_NEW_remove_bake_temp_items(cleanup_registry):
-    print("\n--- Phase: Structured Cleanup ---")
+def get_bake_args(channel_type, texture_size, use_emission=None):
+    """
+    bpy.ops.object.bake arguments for a channel, with the margin of the current bake profile.
+    Channels of config.BAKE_EMISSION_CHANNELS are baked as EMIT (see run_bake_operator) unless use_emission is False.
+    """
+    if use_emission is None:
+        use_emission = channel_type.lower() in config.BAKE_EMISSION_CHANNELS
+    bake_args = {
+        'type': 'EMIT' if use_emission else channel_type.upper(),
+        'target': 'IMAGE_TEXTURES',
+        'width': texture_size,
+        'height': texture_size,
+        'margin': config.BAKE_PROFILES[config.BAKE_PROFILE.lower()]['margin'], # Margine dilazione
+    }
+    if use_emission:
+        return bake_args
+    if channel_type.upper() == 'NORMAL':
+        bake_args['normal_space'] = 'TANGENT'
+        bake_args['normal_r'] = 'POS_X'
+        bake_args['normal_g'] = 'POS_Y'
+        bake_args['normal_b'] = 'POS_Z'
+    elif channel_type.upper() == 'DIFFUSE':
+        bake_args['pass_filter'] = {'COLOR'}
+    return bake_args
+
+EMISSION_BAKE_INPUTS = {'diffuse': 'Base Color', 'roughness': 'Roughness'} # Principled BSDF input per channel
+
+def get_active_material_output(material):
+    """Active Material Output node of the material (the first one if none is flagged active), or None."""
+    nodes = material.node_tree.nodes
+    return next((n for n in nodes if n.type == 'OUTPUT_MATERIAL' and n.is_active_output), None) \
+        or next((n for n in nodes if n.type == 'OUTPUT_MATERIAL'), None)
+
+def get_surface_principled_bsdf(material):
+    """
+    Principled BSDF linked directly (reroutes aside) to the Surface input of the active Material Output, or None.
+    When the surface shader is anything else (Mix Shader, node group, ...) the inputs of a Principled BSDF found
+    in the tree are not what the surface renders, so they cannot stand for the baked channels.
+    """
+    if not material or not material.use_nodes:
+        return None
+    material_output = get_active_material_output(material)
+    source = material_output.inputs['Surface'] if material_output else None
+    while source is not None and source.links:
+        from_node = source.links[0].from_node
+        if from_node.type == 'BSDF_PRINCIPLED':
+            return from_node
+        source = from_node.inputs[0] if from_node.type == 'REROUTE' else None
+    return None
+
+def can_use_emission_bake(materials, channel_type):
+    """
+    True when the channel is in BAKE_EMISSION_CHANNELS and every material has a surface Principled BSDF
+    (get_surface_principled_bsdf) with the channel input, i.e. when run_bake_operator can take the EMIT path.
+    """
+    input_name = EMISSION_BAKE_INPUTS.get(channel_type.lower())
+    if channel_type.lower() not in config.BAKE_EMISSION_CHANNELS or not input_name:
+        return False
+    for material in materials:
+        principled_bsdf = get_surface_principled_bsdf(material)
+        if not principled_bsdf or input_name not in principled_bsdf.inputs:
+            print(f"  '{material.name}': no Principled BSDF feeding the surface with '{input_name}', regular {channel_type.lower()} bake.")
+            return False
+    return True
+
+def wire_emission_bake(material, channel_type):
+    """
+    Temporarily routes the Principled BSDF input of the channel (linked node or default value) through an
+    Emission shader into the material output, so an EMIT bake returns the pure shader evaluation.
+    Returns the state for restore_emission_bake, or None if the material has no surface Principled BSDF
+    (get_surface_principled_bsdf) with that input.
+    """
+    nodes = material.node_tree.nodes
+    links = material.node_tree.links
+    principled_bsdf = get_surface_principled_bsdf(material)
+    material_output = get_active_material_output(material)
+    input_name = EMISSION_BAKE_INPUTS.get(channel_type.lower())
+    if not principled_bsdf or input_name not in principled_bsdf.inputs:
+        return None
+
+    source_input = principled_bsdf.inputs[input_name]
+    emission_node = nodes.new("ShaderNodeEmission")
+    emission_node.name = f"{material.name}_emission_bake"
+    emission_node.inputs['Strength'].default_value = 1.0
+    if source_input.links:
+        links.new(source_input.links[0].from_socket, emission_node.inputs['Color'])
+    elif source_input.type == 'RGBA':
+        emission_node.inputs['Color'].default_value = tuple(source_input.default_value)
+    else:
+        value = source_input.default_value
+        emission_node.inputs['Color'].default_value = (value, value, value, 1.0)
+
+    surface_input = material_output.inputs['Surface']
+    original_surface = surface_input.links[0].from_socket if surface_input.links else None
+    links.new(emission_node.outputs['Emission'], surface_input)
+    return (material, emission_node.name, material_output.name, original_surface)
+
+def restore_emission_bake(state):
+    """Reconnects the original surface shader and removes the Emission node added by wire_emission_bake."""
+    material, emission_node_name, output_node_name, original_surface = state
+    nodes = material.node_tree.nodes
+    if original_surface is not None:
+        material.node_tree.links.new(original_surface, nodes[output_node_name].inputs['Surface'])
+    nodes.remove(nodes[emission_node_name])
+
+def run_bake_operator(materials, channel_type, texture_size, target='IMAGE_TEXTURES', use_emission=None):
+    """
+    Runs bpy.ops.object.bake for the selected objects with get_bake_args. With use_emission (default:
+    can_use_emission_bake) every material is wired through wire_emission_bake and the bake runs at 1 sample,
+    otherwise the regular pass runs; callers that key the bake cache pass the value used for the key.
+    Node trees and samples are restored afterwards.
+    target 'VERTEX_COLORS' bakes to the active color attribute of each mesh instead of the active image node.
+    """
+    if use_emission is None:
+        use_emission = can_use_emission_bake(materials, channel_type)
+    emission_states = []
+    if use_emission:
+        emission_states = [wire_emission_bake(material, channel_type) for material in materials]
+
+    cycles = bpy.context.scene.cycles
+    profile_samples = cycles.samples
+    if use_emission:
+        cycles.samples = 1 # a shader evaluation is noise-free
+    bake_args = get_bake_args(channel_type, texture_size, use_emission)
+    bake_args['target'] = target
+    try:
+        bpy.ops.object.bake(**bake_args)
+    finally:
+        cycles.samples = profile_samples
+        for state in emission_states:
+            restore_emission_bake(state)
+
+VERTEX_COLOR_ATTRIBUTE_NAME = "base_color" # color attribute written by bake_vertex_colors
+
+def bake_vertex_colors(mesh_objects, default_roughness, metallic):
+    """
+    Vertex colour fast path (BLENDER_PIPELINE_MODE = 'VERTEX_COLOR'): evaluates the Base Color of each material,
+    color override included, into a per-vertex color attribute and rewires the material to it, so the GLB carries
+    COLOR_0 and no textures. Constant base colors (get_constant_input_value) are written directly; the others are
+    baked to the vertices by Cycles in a single pass (emission fast path, no UVs needed). Roughness keeps the
+    material value when constant, default_roughness otherwise; metallic is constant and the normal input is unlinked.
+    Returns the number of objects with vertex colors.
+    """
+    print("\n--- Phase: Baking Base Color to Vertex Colors ---")
+    if bpy.ops.object.mode_set.poll():
+        bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.ops.object.select_all(action='DESELECT')
+
+    colored_objects = []
+    baked_objects = []
+    for obj in mesh_objects:
+        mat = obj.data.materials[0] if obj.type == 'MESH' and obj.data.materials else None
+        principled_bsdf = get_surface_principled_bsdf(mat)
+        if not principled_bsdf or 'Base Color' not in principled_bsdf.inputs:
+            print(f"  No Principled BSDF 'Base Color' feeding the surface of '{obj.name}'. Skipping vertex colors.")
+            continue
+        mesh = obj.data
+        attribute = mesh.color_attributes.get(VERTEX_COLOR_ATTRIBUTE_NAME) or mesh.color_attributes.new(VERTEX_COLOR_ATTRIBUTE_NAME, 'BYTE_COLOR', 'POINT')
+        mesh.color_attributes.active_color = attribute
+        colored_objects.append((obj, principled_bsdf))
+
+        base_color = get_constant_input_value(principled_bsdf.inputs['Base Color'])
+        if base_color is not None:
+            attribute.data.foreach_set('color', np.tile(np.array(base_color, dtype=np.float32), len(attribute.data)))
+        else:
+            obj.select_set(True)
+            baked_objects.append(obj)
+
+    if baked_objects:
+        print(f"  Baking procedural base colors of {len(baked_objects)} objects to vertices...")
+        bpy.context.view_layer.objects.active = baked_objects[0]
+        run_bake_operator([obj.data.materials[0] for obj in baked_objects], 'diffuse', config.TEXTURE_SIZE, target='VERTEX_COLORS')
+        bpy.ops.object.select_all(action='DESELECT')
+
+    for obj, principled_bsdf in colored_objects:
+        nodes = obj.data.materials[0].node_tree.nodes
+        links = obj.data.materials[0].node_tree.links
+        color_node = nodes.get(f"{obj.name}_VertexColor") or nodes.new('ShaderNodeVertexColor')
+        color_node.name = f"{obj.name}_VertexColor"
+        color_node.layer_name = VERTEX_COLOR_ATTRIBUTE_NAME
+        color_node.location = principled_bsdf.location + mathutils.Vector((-300, 0))
+
+        roughness = get_constant_input_value(principled_bsdf.inputs['Roughness']) if 'Roughness' in principled_bsdf.inputs else None
+        for input_name, value in (('Base Color', None), ('Roughness', default_roughness if roughness is None else roughness), ('Metallic', metallic), ('Normal', None)):
+            if input_name not in principled_bsdf.inputs:
+                continue
+            for link in list(principled_bsdf.inputs[input_name].links):
+                links.remove(link)
+            if value is not None:
+                principled_bsdf.inputs[input_name].default_value = value
+        links.new(color_node.outputs['Color'], principled_bsdf.inputs['Base Color'])
+    print(f"  Vertex colors for {len(colored_objects)} objects ({len(colored_objects) - len(baked_objects)} constant, {len(baked_objects)} baked).")
+    return len(colored_objects)
+
+def bake_channel_batched(mesh_objects, channel_type, textures_dir, texture_size, color_space, cleanup_registry=None):
+    """
+    Bakes one channel for all the given meshes with a single bake operator call.
+    Every object gets its own '{obj_name}_{channel}' image node set as active in its material (same node,
+    image and PNG naming as bake_channel), then all of them are selected and baked together, so Cycles
+    syncs the scene and builds the BVH once per channel instead of once per object.
+    Images use obj['texture_size'] when set (texel density mode), texture_size otherwise.
+    With config.IMAGE_MEMORY_CAP_MB the objects are split into chunks whose new images (8-bit RGBA) fit the cap
+    (split_by_image_memory): each chunk is allocated, baked, saved and released before the next, at the cost of
+    one bake call per chunk. Image nodes are recorded in cleanup_registry with the 'bake' tag.
+    Returns the names of the created image nodes.
+    """
+    print(f"Baking {channel_type.capitalize()} for {len(mesh_objects)} objects in one pass...")
+    if bpy.ops.object.mode_set.poll():
+        bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.ops.object.select_all(action='DESELECT')
+
+    # EMIT or regular pass is decided for the whole batch, so the cache keys match the bake that runs
+    use_emission = can_use_emission_bake([obj.data.materials[0] for obj in mesh_objects
+                                          if obj and obj.type == 'MESH' and obj.data.materials
+                                          and channel_type.lower() not in obj.get('constant_channels', {})], channel_type)
+    pending_bakes = []
+    cached_nodes = []
+    for obj in mesh_objects:
+        if not obj or obj.type != 'MESH' or not obj.data.materials:
+            print(f"Object '{obj.name}' is not a mesh or has no materials. Skipping bake.")
+            continue
+        if channel_type.lower() in obj.get('constant_channels', {}):
+            continue # exported as a material factor
+        mat = obj.data.materials[0] # Assumes material is at index 0
+        mat.use_nodes = True
+        nodes = mat.node_tree.nodes
+
+        image_name = f"{obj.name}_{channel_type.lower()}"
+        tex_node = nodes.get(image_name) or nodes.new("ShaderNodeTexImage")
+        tex_node.name = image_name
+        register_temp_node(cleanup_registry, mat, tex_node, 'bake')
+
+        # Bake cache: cached objects are left out of the bake selection
+        object_texture_size = obj.get('texture_size', texture_size) # texel density mode: per-object size
+        cache_key = compute_bake_cache_key([obj], channel_type, object_texture_size, get_bake_args(channel_type, object_texture_size, use_emission))
+        cached_image = fetch_baked_image_from_cache(cache_key, image_name, os.path.join(textures_dir, f"{image_name}.png"), color_space)
+        if cached_image:
+            tex_node.image = cached_image
+            cached_nodes.append(image_name)
+            continue
+        pending_bakes.append((obj, tex_node, object_texture_size, cache_key))
+
+    # Images are created chunk by chunk, so the pixels allocated for one bake call stay within the memory cap
+    chunks = split_by_image_memory(pending_bakes, [size * size * 4 for _, _, size, _ in pending_bakes])
+    if len(chunks) > 1:
+        print(f"  {len(pending_bakes)} images split into {len(chunks)} bake calls (cap: {config.IMAGE_MEMORY_CAP_MB} MB).")
+    baked_images = []
+    for chunk in chunks:
+        chunk_images = []
+        for obj, tex_node, object_texture_size, cache_key in chunk:
+            image_name = tex_node.name
+            image = bpy.data.images.get(image_name)
+            if not image:
+                image = bpy.data.images.new(name=image_name, width=object_texture_size, height=object_texture_size, alpha=channel_type.lower() == 'diffuse')
+            elif image.size[0] != object_texture_size or image.size[1] != object_texture_size:
+                image.scale(object_texture_size, object_texture_size)
+            image.colorspace_settings.name = color_space
+            tex_node.image = image
+            obj.data.materials[0].node_tree.nodes.active = tex_node
+            obj.select_set(True)
+            chunk_images.append((obj, image, cache_key))
+        bpy.context.view_layer.objects.active = chunk_images[0][0]
+
+        run_bake_operator([obj.data.materials[0] for obj, _, _ in chunk_images], channel_type, texture_size, use_emission=use_emission)
+
+        for obj, image, cache_key in chunk_images:
+            image.filepath_raw = os.path.join(textures_dir, f"{obj.name}_{channel_type.lower()}.png")
+            image.file_format = 'PNG'
+            image.save()
+            store_baked_image_in_cache(cache_key, image.filepath_raw)
+            release_image_buffers(image)
+        bpy.ops.object.select_all(action='DESELECT')
+        baked_images.extend(chunk_images)
+
+    if baked_images:
+        print(f"  Baked {channel_type.capitalize()} saved for {len(baked_images)} objects in {textures_dir}")
+    return cached_nodes + [image.name for _, image, _ in baked_images]
+
+def bake_textures_batched(imported_meshes, textures_dir, texture_size, blender_device, cleanup_registry=None):
+    """
+    Batched counterpart of bake_textures: one bake call per channel for all meshes, with persistent
+    render data enabled so Cycles reuses the synced scene between the three channel bakes.
+    """
+    created_bake_nodes = []
+    scene = bpy.context.scene
+    previous_persistent_data = scene.render.use_persistent_data
+    scene.render.use_persistent_data = True
+    try:
+        for channel_type, color_space in (('diffuse', 'sRGB'), ('normal', 'Non-Color'), ('roughness', 'Non-Color')):
+            created_bake_nodes.extend(bake_channel_batched(imported_meshes, channel_type, textures_dir, texture_size, color_space, cleanup_registry))
+    finally:
+        scene.render.use_persistent_data = previous_persistent_data
+    return created_bake_nodes
+
+def split_objects_into_shards(mesh_objects, shard_count):
+    """
+    Splits the meshes into shard_count lists of names balanced by face count
+    (largest first, each object to the currently lightest shard). Empty shards are dropped.
+    """
+    shards = [[] for _ in range(max(1, shard_count))]
+    loads = [0] * len(shards)
+    for obj in sorted(mesh_objects, key=lambda o: len(o.data.polygons), reverse=True):
+        lightest = loads.index(min(loads))
+        shards[lightest].append(obj.name)
+        loads[lightest] += len(obj.data.polygons)
+    return [shard for shard in shards if shard]
+
+def load_baked_textures(mesh_objects, textures_dir, channels=(('diffuse', 'sRGB'), ('normal', 'Non-Color'), ('roughness', 'Non-Color')), cleanup_registry=None):
+    """
+    Recreates, from the PNGs in textures_dir, the '{obj_name}_{channel}' image nodes and images that bake_channel
+    leaves in each material, so link_baked_textures works on textures baked by another process.
+    Image nodes are recorded in cleanup_registry with the 'bake' tag.
+    Returns the objects whose textures could not all be found.
+    """
+    print("\n--- Phase: Loading Baked Textures from Disk ---")
+    incomplete_objects = []
+    for obj in mesh_objects:
+        if obj.type != 'MESH' or not obj.data.materials:
+            continue
+        mat = obj.data.materials[0] # Assumes material is at index 0
+        mat.use_nodes = True
+        nodes = mat.node_tree.nodes
+        for channel_type, color_space in channels:
+            if channel_type in obj.get('constant_channels', {}):
+                continue # not baked, exported as a material factor
+            image_name = f"{obj.name}_{channel_type}"
+            image_path = os.path.join(textures_dir, f"{image_name}.png")
+            if not os.path.exists(image_path):
+                print(f"  Baked {channel_type} missing for '{obj.name}' at {image_path}.")
+                incomplete_objects.append(obj)
+                break
+            if image_name in bpy.data.images:
+                bpy.data.images.remove(bpy.data.images[image_name], do_unlink=True)
+            image = bpy.data.images.load(image_path, check_existing=False)
+            image.name = image_name
+            image.colorspace_settings.name = color_space
+            tex_node = nodes.get(image_name) or nodes.new("ShaderNodeTexImage")
+            tex_node.name = image_name
+            tex_node.image = image
+            register_temp_node(cleanup_registry, mat, tex_node, 'bake')
+    print(f"  Loaded baked textures for {len(mesh_objects) - len(incomplete_objects)} objects.")
+    return incomplete_objects
+
+def bake_textures_sharded(imported_meshes, history_blend_path, textures_dir, texture_size, shard_count, threads_per_worker, bake_mode, task_dir, cleanup_registry=None):
+    """
+    Bakes the textures in shard_count parallel headless Blender workers (blender_worker.py --task bake).
+    Every worker reopens the pre-bake scene (history_blend_path), applies the modifiers of its shard and writes
+    the usual per-object PNGs to textures_dir; the images are then loaded back into the material nodes here.
+    Objects of failed shards are baked in this process as a fallback.
+    """
+    import blender_worker
+
+    print(f"\n--- Phase: Sharded Bake ({shard_count} workers, {threads_per_worker or 'auto'} threads each) ---")
+    mesh_objects = [obj for obj in imported_meshes if obj.type == 'MESH']
+    shards = split_objects_into_shards(mesh_objects, shard_count)
+    if threads_per_worker is None or threads_per_worker <= 0:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // len(shards))
+
+    os.makedirs(task_dir, exist_ok=True)
+    task_files = []
+    for index, shard in enumerate(shards):
+        task_file = os.path.join(task_dir, f"bake_shard_{index:02d}.json")
+        utils.write_json({
+            'objects': shard,
+            'textures_dir': textures_dir,
+            'texture_size': texture_size,
+            'bake_mode': bake_mode,
+            'threads': threads_per_worker,
+        }, task_file)
+        task_files.append(task_file)
+        print(f"  Shard {index}: {len(shard)} objects.")
+
+    blender_executable = bpy.app.binary_path or config.BLENDER_EXECUTABLE
+    exit_codes = blender_worker.launch_workers(blender_executable, history_blend_path, 'bake', task_files, config.FILE_ENCODING)
+
+    failed_names = {name for shard, exit_code in zip(shards, exit_codes) if exit_code != 0 for name in shard}
+    loaded_objects = [obj for obj in mesh_objects if obj.name not in failed_names]
+    fallback_objects = [obj for obj in mesh_objects if obj.name in failed_names]
+    fallback_objects.extend(load_baked_textures(loaded_objects, textures_dir, cleanup_registry=cleanup_registry))
+
+    if fallback_objects:
+        print(f"  WARNING: {len(fallback_objects)} objects not baked by the workers. Baking them in this process.")
+        if bake_mode.upper() == 'BATCHED':
+            bake_textures_batched(fallback_objects, textures_dir, texture_size, config.BLENDER_DEVICE, cleanup_registry)
+        else:
+            bake_textures(fallback_objects, textures_dir, texture_size, config.BLENDER_DEVICE, cleanup_registry)
+    return [obj.name for obj in fallback_objects]
+
+def bake_atlas_channel(atlas_name, atlas_objects, channel_type, textures_dir, texture_size, color_space, cleanup_registry=None):
+    """
+    Bakes one channel of a shared atlas with a single bake operator: every object of the atlas gets an
+    active image node pointing at the same '{atlas_name}_{channel}' image and all of them are selected,
+    so Cycles writes each object into its packed UV region. Image nodes are recorded in cleanup_registry ('bake').
+    Only one image is allocated per call, so config.IMAGE_MEMORY_CAP_MB does not split atlas bakes.
+    """
+    print(f"Baking {channel_type.capitalize()} for atlas '{atlas_name}' ({len(atlas_objects)} objects)...")
+    image_name = f"{atlas_name}_{channel_type.lower()}"
+    output_path = os.path.join(textures_dir, f"{image_name}.png")
+    use_emission = can_use_emission_bake([obj.data.materials[0] for obj in atlas_objects if obj.type == 'MESH' and obj.data.materials], channel_type)
+    bake_args = get_bake_args(channel_type, texture_size, use_emission)
+    cache_key = compute_bake_cache_key([obj for obj in atlas_objects if obj.type == 'MESH'], channel_type, texture_size, bake_args)
+    image = fetch_baked_image_from_cache(cache_key, image_name, output_path, color_space)
+    if image:
+        for obj in atlas_objects:
+            if obj.type == 'MESH' and obj.data.materials:
+                nodes = obj.data.materials[0].node_tree.nodes
+                tex_node = nodes.get(image_name) or nodes.new("ShaderNodeTexImage")
+                tex_node.name = image_name
+                tex_node.image = image
+                register_temp_node(cleanup_registry, obj.data.materials[0], tex_node, 'bake')
+        return image_name
+
+    image = bpy.data.images.get(image_name)
+    if not image:
+        image = bpy.data.images.new(name=image_name, width=texture_size, height=texture_size, alpha=channel_type.lower() == 'diffuse')
+    elif image.size[0] != texture_size or image.size[1] != texture_size:
+        image.scale(texture_size, texture_size)
+    image.colorspace_settings.name = color_space
+
+    if bpy.ops.object.mode_set.poll():
+        bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.ops.object.select_all(action='DESELECT')
+
+    bake_objects = []
+    for obj in atlas_objects:
+        if obj.type != 'MESH' or not obj.data.materials:
+            print(f"  Object '{obj.name}' is not a mesh or has no materials. Skipping it in atlas '{atlas_name}'.")
+            continue
+        mat = obj.data.materials[0] # Assumes material is at index 0
+        mat.use_nodes = True
+        nodes = mat.node_tree.nodes
+        tex_node = nodes.get(image_name) or nodes.new("ShaderNodeTexImage")
+        tex_node.name = image_name
+        tex_node.image = image
+        register_temp_node(cleanup_registry, mat, tex_node, 'bake')
+        nodes.active = tex_node
+        obj.select_set(True)
+        bake_objects.append(obj)
+
+    if not bake_objects:
+        return False
+    bpy.context.view_layer.objects.active = bake_objects[0]
+
+    run_bake_operator([obj.data.materials[0] for obj in bake_objects], channel_type, texture_size, use_emission=use_emission)
+
+    image.filepath_raw = output_path
+    image.file_format = 'PNG'
+    image.save()
+    print(f"  Baked {channel_type.capitalize()} atlas saved to {image.filepath_raw}")
+    store_baked_image_in_cache(cache_key, output_path)
+    release_image_buffers(image)
+    bpy.ops.object.select_all(action='DESELECT')
+    return image_name
+
+def bake_textures_atlas(atlas_groups, textures_dir, texture_size, blender_device, cleanup_registry=None):
+    """Atlas counterpart of bake_textures: one bake per channel and per atlas instead of per object."""
+    created_bake_nodes = []
+    for atlas_name, atlas_objects in atlas_groups.items():
+        for channel_type, color_space in (('diffuse', 'sRGB'), ('normal', 'Non-Color'), ('roughness', 'Non-Color')):
+            if channel_type in atlas_objects[0].get('constant_channels', {}):
+                continue # constant for the whole atlas, exported as a material factor
+            node = bake_atlas_channel(atlas_name, atlas_objects, channel_type, textures_dir, texture_size, color_space, cleanup_registry)
+            if node:
+                created_bake_nodes.append(node)
+    return created_bake_nodes
+
+def batch_atlas_materials(atlas_groups):
+    """
+    After the atlas bake the per-object material copies only differ in what has been baked away,
+    so every atlas keeps a single material ('{atlas_name}_mat', from its first object) shared by all
+    its objects: one draw call per atlas. The other copies are removed.
+    """
+    print("\n--- Phase: Batching Atlas Materials ---")
+    removed_count = 0
+    for atlas_name, atlas_objects in atlas_groups.items():
+        mesh_objects = [obj for obj in atlas_objects if obj.type == 'MESH' and obj.data.materials]
+        if not mesh_objects:
+            continue
+        batch_material = mesh_objects[0].data.materials[0]
+        batch_material.name = f"{atlas_name}_mat"
+        for obj in mesh_objects[1:]:
+            old_material = obj.data.materials[0]
+            obj.data.materials[0] = batch_material
+            if old_material and old_material != batch_material and old_material.users == 0:
+                bpy.data.materials.remove(old_material)
+                removed_count += 1
+        print(f"  Material '{batch_material.name}' shared by {len(mesh_objects)} objects.")
+    print(f"  Removed {removed_count} per-object materials.")
+
+def new_cleanup_registry():
+    """
+    Empty registry of the temporary items created by the pipeline, filled by the functions that create them.
+    Nodes are stored as (material, node_name, tag), scoped to the material that owns them (a datablock
+    reference, so renames such as batch_atlas_materials do not break it); objects and materials as (name, tag).
+    Tags: 'template', 'color_override', 'bake', 'pbr', 'urp'.
+    """
+    return {"nodes": [], "objects": [], "materials": []}
+
+def register_temp_node(cleanup_registry, material, node, tag):
+    """Records a temporary node of material; no-op when cleanup_registry is None."""
+    if cleanup_registry is not None:
+        cleanup_registry["nodes"].append((material, node.name, tag))
+
+def register_temp_object(cleanup_registry, obj_name, tag):
+    """Records a temporary object by name; no-op when cleanup_registry is None."""
+    if cleanup_registry is not None:
+        cleanup_registry["objects"].append((obj_name, tag))
+
+def register_temp_material(cleanup_registry, mat_name, tag):
+    """Records a temporary material by name; no-op when cleanup_registry is None."""
+    if cleanup_registry is not None:
+        cleanup_registry["materials"].append((mat_name, tag))
+
+def remove_bake_temp_items(cleanup_registry, tags=None):
+    """
+    Removes the registered temporary items whose tag is in tags (all of them when tags is None), and drops
+    them from the registry. Every entry is resolved directly (its own material's node tree, or a name lookup
+    in bpy.data), so the cost is linear in the number of registered items, not materials x items.
+    """
+    print("\n--- Phase: Structured Cleanup of Temporary Items ---")
     count = 0
 
     # NODES
-    for mat_name, node_name in cleanup_registry.get("nodes", []):
-        mat = bpy.data.materials.get(mat_name)
-        if mat and mat.use_nodes:
-            node = mat.node_tree.nodes.get(node_name)
-            if node:
-                try:
-                    mat.node_tree.nodes.remove(node)
-                    print(f"  Removed node '{node_name}' from material '{mat_name}'.")
-                    count += 1
-                except Exception as e:
-                    print(f"  Error removing node '{node_name}' from '{mat_name}': {e}")
+    kept_nodes = []
+    for mat, node_name, tag in cleanup_registry["nodes"]:
+        if tags is not None and tag not in tags:
+            kept_nodes.append((mat, node_name, tag))
+            continue
+        try:
+            mat_name = mat.name
+        except ReferenceError:
+            continue # material already removed (e.g. merged into an atlas material)
+        node = mat.node_tree.nodes.get(node_name) if mat.use_nodes else None
+        if node:
+            try:
+                mat.node_tree.nodes.remove(node)
+                print(f"  Removed node '{node_name}' from material '{mat_name}'.")
+                count += 1
+            except Exception as e:
+                print(f"  Error removing node '{node_name}' from '{mat_name}': {e}")
+    cleanup_registry["nodes"] = kept_nodes
 
     # OBJECTS
-    for obj_name in cleanup_registry.get("objects", []):
+    kept_objects = []
+    for obj_name, tag in cleanup_registry["objects"]:
+        if tags is not None and tag not in tags:
+            kept_objects.append((obj_name, tag))
+            continue
         obj = bpy.data.objects.get(obj_name)
         if obj:
             try:
@@ -886,9 +2458,14 @@ def TO_DO_NEW_remove_bake_temp_items(cleanup_registry):
                 count += 1
             except Exception as e:
                 print(f"  Error removing object '{obj_name}': {e}")
+    cleanup_registry["objects"] = kept_objects
 
     # MATERIALS
-    for mat_name in cleanup_registry.get("materials", []):
+    kept_materials = []
+    for mat_name, tag in cleanup_registry["materials"]:
+        if tags is not None and tag not in tags:
+            kept_materials.append((mat_name, tag))
+            continue
         mat = bpy.data.materials.get(mat_name)
         if mat:
             try:
@@ -897,83 +2474,33 @@ def TO_DO_NEW_remove_bake_temp_items(cleanup_registry):
                 count += 1
             except Exception as e:
                 print(f"  Error removing material '{mat_name}': {e}")
+    cleanup_registry["materials"] = kept_materials
 
     print(f"  Total {count} temporary items removed.")
-
-def remove_bake_temp_nodes(item_names_to_remove):
-    """
-    Removes temporary items (shader nodes AND scene objects) from the scene
-    based on a list of their names. The name is kept for documentation consistency.
-    This version is hardened against iteration errors.
-    """
-    print("\n--- Phase: Cleaning Up Temporary Items (Nodes and Objects) ---")
-    if not item_names_to_remove:
-        print("  No temporary items to clean up.")
-        return
-
-    items_removed_count = 0
-    
-    # Create set of names to avoid redundant checks
-    node_targets = []     # list of (material_name, node_name)
-    names_to_remove_set = set(item_names_to_remove)
-
-    # 1. Clean up Shader Nodes from all materials
-    for mat in bpy.data.materials:
-        if mat.use_nodes:
-            nodes = mat.node_tree.nodes
-            # Iterate over a copy of the node names to safely remove them
-            for node_name in list(names_to_remove_set):
-                if node_name in nodes:
-                    try:
-                        node_to_remove = nodes[node_name]
-                        nodes.remove(node_to_remove)
-                        print(f"  Removed temporary node '{node_name}' from material '{mat.name}'.")
-                        items_removed_count += 1
-                    except Exception as e:
-                        print(f"  Error removing node '{node_name}' from material '{mat.name}': {e}")
-
-    # 2. Clean up Scene Objects
-    # Iterate over a copy of the object names to safely remove them
-    for obj_name in list(names_to_remove_set):
-        if obj_name in bpy.data.objects:
-            try:
-                object_to_remove = bpy.data.objects[obj_name]
-                bpy.data.objects.remove(object_to_remove, do_unlink=True)
-                print(f"  Removed temporary object: '{obj_name}'")
-                items_removed_count += 1
-            except Exception as e:
-                print(f"  Error removing object '{obj_name}': {e}")
-
-    # 3. Clean up Materials
-    for mat_name in list(names_to_remove_set):
-        if mat_name in bpy.data.materials:
-            try:
-                material_to_remove = bpy.data.materials[mat_name]
-                bpy.data.materials.remove(material_to_remove, do_unlink=True)
-                print(f"  Removed temporary material: '{mat_name}'")
-                items_removed_count += 1
-            except Exception as e:
-                print(f"  Error removing material '{mat_name}': {e}")
-
-    print(f"  Total {items_removed_count} temporary items removed.")
     bpy.context.view_layer.update()
 
 
-def link_baked_textures(imported_meshes, textures_dir):
-    """Links baked textures to the Principled BSDF node in the material of each mesh."""
+def link_baked_textures(imported_meshes, textures_dir, cleanup_registry=None):
+    """
+    Links baked textures to the Principled BSDF node in the material of each mesh.
+    Normal Map nodes are recorded in cleanup_registry with the 'pbr' tag.
+    """
     print("\n--- Phase: Linking Baked Texture Nodes (PBR Standard for GLB/General) ---")
     
     # Lista per raccogliere i nodi temporanei creati da questa funzione
     # (es. Normal Map Node) che dovranno essere puliti alla fine.
     nodes_created_by_linking = [] 
+    linked_materials = set() # atlas mode: materials are shared, link them once
 
     for obj in imported_meshes:
         if not obj or not obj.data.materials:
             continue
         
         mat = obj.data.materials[0] # Assumes material is at index 0
-        if not mat or not mat.use_nodes:
+        if not mat or not mat.use_nodes or mat.name in linked_materials:
             continue
+        linked_materials.add(mat.name)
+        bake_name = obj.get('bake_target', obj.name) # baked textures are named after the atlas in atlas mode
             
         nodes = mat.node_tree.nodes
         links = mat.node_tree.links
@@ -987,7 +2514,7 @@ def link_baked_textures(imported_meshes, textures_dir):
 
         # 1. Albedo (Diffuse)
         # Search for the node created during bake_channel
-        albedo_image_node = nodes.get(f"{obj.name}_diffuse") 
+        albedo_image_node = nodes.get(f"{bake_name}_diffuse") 
         if albedo_image_node and albedo_image_node.image: # Ensure node exists and has an image
             # No need to load image again, it's already assigned during bake
             albedo_image_node.label = "Baked Albedo"
@@ -1005,7 +2532,7 @@ def link_baked_textures(imported_meshes, textures_dir):
             print(f"  Baked Albedo node/image not found for '{obj.name}'. Skipping Albedo linking.")
 
         # 2. Normal
-        normal_image_node = nodes.get(f"{obj.name}_normal")
+        normal_image_node = nodes.get(f"{bake_name}_normal")
         if normal_image_node and normal_image_node.image:
             normal_image_node.label = "Baked Normal"
             normal_image_node.location = (-800, 0)
@@ -1014,9 +2541,10 @@ def link_baked_textures(imported_meshes, textures_dir):
             
             normal_map_node = nodes.new('ShaderNodeNormalMap') # This is a new node, needs to be tracked
             normal_map_node.label = "Normal Map"
-            normal_map_node.name = f"{obj.name}_NormalMapNode"
+            normal_map_node.name = f"{bake_name}_NormalMapNode"
             normal_map_node.location = (-600, 0)
             nodes_created_by_linking.append(normal_map_node.name) # Track this node for later removal
+            register_temp_node(cleanup_registry, mat, normal_map_node, 'pbr')
             
             links.new(normal_image_node.outputs['Color'], normal_map_node.inputs['Color'])
             if 'Normal' in principled_bsdf.inputs:
@@ -1029,7 +2557,7 @@ def link_baked_textures(imported_meshes, textures_dir):
             print(f"  Baked Normal node/image not found for '{obj.name}'. Skipping Normal linking.")
 
         # 3. Roughness
-        roughness_image_node = nodes.get(f"{obj.name}_roughness")
+        roughness_image_node = nodes.get(f"{bake_name}_roughness")
         if roughness_image_node and roughness_image_node.image:
             roughness_image_node.label = "Baked Roughness"
             roughness_image_node.location = (-800, -300)
@@ -1045,9 +2573,9 @@ def link_baked_textures(imported_meshes, textures_dir):
         else:
             print(f"  Baked Roughness node/image not found for '{obj.name}'. Skipping Roughness linking.")
 
-        # 4. Metallic (for PBR Adobe workflow, from create_base_metalness_map)
-        # Assuming create_base_metalness_map creates a new image and names it obj.name_metallic
-        metallic_image_node = nodes.get(f"{obj.name}_metallic") 
+        # 4. Metallic (for PBR Adobe workflow, from create_metalness_maps)
+        # Assuming create_metalness_maps creates a new image and names it obj.name_metallic
+        metallic_image_node = nodes.get(f"{bake_name}_metallic") 
         if metallic_image_node and metallic_image_node.image:
             metallic_image_node.label = "Baked Metallic"
             metallic_image_node.location = (-800, -600)
@@ -1060,160 +2588,172 @@ def link_baked_textures(imported_meshes, textures_dir):
                 print(f"  Linked Metallic map to Principled BSDF for '{obj.name}'.")
             else:
                 print(f"  Warning: Principled BSDF has no 'Metallic' input for '{obj.name}'.")
+        elif 'roughness' in obj.get('constant_channels', {}) and 'Metallic' in principled_bsdf.inputs:
+            # constant roughness: metallic factor = roughness, as in the packed metallic map (pack_metalness_channels)
+            for link in principled_bsdf.inputs['Metallic'].links: links.remove(link)
+            principled_bsdf.inputs['Metallic'].default_value = principled_bsdf.inputs['Roughness'].default_value
+            print(f"  Constant Roughness/Metallic factors for '{obj.name}', no maps to link.")
         else:
             print(f"  Baked Metallic node/image not found for '{obj.name}'. Skipping Metallic linking.")
 
     bpy.context.view_layer.update()
     return nodes_created_by_linking # Return any new nodes created by this function
 
-def create_base_metalness_map(mesh_objects, textures_dir, texture_size):
+def create_metalness_maps(mesh_objects, textures_dir, engine='NUMPY', max_workers=None):
     """
-    Creates a base Metalness map (metallic.png) for PBR Adobe workflow
-    from the green channel of the baked Roughness map.
-    The green channel of the roughness map is replicated across R, G, B channels.
+    Channel-packing engine: reads every baked roughness map once and writes both the PBR metallic map
+    ({name}_metallic.png) and the URP MetallicSmoothness map ({name}_MetallicSmoothness.png) in one pass.
+    Layout: metallic = roughness G on R, G, B; MetallicSmoothness R = metalness, A = smoothness (texture_ops).
+    'NUMPY': pixels moved with foreach_get/foreach_set as float32 buffers, packed by texture_ops.pack_metalness_channels.
+    'POOL': PNG files processed with Pillow outside Blender, one task per map across a process pool.
+    Returns the number of processed roughness maps.
     """
-    print("\n--- Phase: Creating Base Metalness Map (for PBR Adobe workflow) ---")
+    print(f"\n--- Phase: Creating Metalness and MetallicSmoothness Maps (engine: {engine}) ---")
+    jobs = []
     for obj in mesh_objects:
-        obj_name = obj.name
-        roughness_path = os.path.join(textures_dir, f"{obj_name}_roughness.png")
-        metallic_output_path = os.path.join(textures_dir, f"{obj_name}_metallic.png")
-
+        bake_name = obj.get('bake_target', obj.name) # atlas mode: one map per atlas
+        if any(job[0] == bake_name for job in jobs) or 'roughness' in obj.get('constant_channels', {}):
+            continue # constant roughness: metallic and smoothness are material factors (link_baked_textures)
+        roughness_path = os.path.join(textures_dir, f"{bake_name}_roughness.png")
         if not os.path.exists(roughness_path):
-            print(f"  Roughness texture missing for {obj_name} at {roughness_path}. Skipping base metalness creation.")
-            continue
-
-        metallic_name = f"{obj_name}_metallic"
-        if metallic_name in bpy.data.images:
-            bpy.data.images.remove(bpy.data.images[metallic_name], do_unlink=True)
-            print(f"  Removed existing base metalness image '{metallic_name}'.")
-
-        roughness_img = bpy.data.images.load(roughness_path)
-        
-        metallic_img = bpy.data.images.new(
-            name=metallic_name,
-            width=texture_size,
-            height=texture_size,
-            alpha=False # Metalness is typically RGB, no alpha
-        )
-        metallic_img.colorspace_settings.name = 'Non-Color' # Important for data
-
-        print(f"  Processing base metalness texture for {obj_name}...")
-        
-        if len(roughness_img.pixels) != texture_size * texture_size * 4:
-            print(f"  Error: Unexpected pixel count for roughness image {obj_name}. Expected {texture_size * texture_size * 4}, got {len(roughness_img.pixels)}. Cannot create base metalness map.")
-            bpy.data.images.remove(roughness_img) # Clean up
+            print(f"  Roughness texture missing for {bake_name} at {roughness_path}. Skipping metalness maps.")
             continue
-
-        #Initialize with 4 channels (RGBA) and explicitly set alpha to 1.0
-        base_metalness_pixels = np.zeros((texture_size, texture_size, 4)) 
-        pixels_from_roughness = np.array(list(roughness_img.pixels)).reshape((texture_size, texture_size, 4)) # Reshape to (H, W, RGBA)
-        
-        # Replicate green channel of roughness to R, G, B of metalness
-        base_metalness_pixels[:,:,0] = pixels_from_roughness[:,:,1] # Red from Roughness Green
-        base_metalness_pixels[:,:,1] = pixels_from_roughness[:,:,1] # Green from Roughness Green
-        base_metalness_pixels[:,:,2] = pixels_from_roughness[:,:,1] # Blue from Roughness Green
-        base_metalness_pixels[:,:,3] = 1.0 # Set Alpha to 1.0 (fully opaque)
-
-        metallic_img.pixels = base_metalness_pixels.ravel().tolist()
-        
-        metallic_img.filepath_raw = metallic_output_path
-        metallic_img.file_format = 'PNG'
-        metallic_img.save()
-        
-        # Clean up the loaded roughness image from Blender's memory if no longer needed
+        jobs.append((
+            bake_name,
+            roughness_path,
+            os.path.join(textures_dir, f"{bake_name}_metallic.png"),
+            os.path.join(textures_dir, f"{bake_name}_MetallicSmoothness.png"),
+        ))
+
+    if engine.upper() == 'POOL':
+        sizes = utils.map_in_process_pool(texture_ops.pack_metalness_files, [job[1:] for job in jobs], max_workers)
+        for job, size in zip(jobs, sizes):
+            print(f"  Created metalness maps for {job[0]} ({size[0]}x{size[1]}): {job[2]}, {job[3]}")
+        return len(jobs)
+
+    for bake_name, roughness_path, metallic_path, metallic_smoothness_path in jobs:
+        roughness_img = bpy.data.images.load(roughness_path, check_existing=False)
+        width, height = roughness_img.size
+        roughness_pixels = np.empty(width * height * 4, dtype=np.float32)
+        roughness_img.pixels.foreach_get(roughness_pixels)
+        track_image_memory()
         bpy.data.images.remove(roughness_img, do_unlink=True)
-        print(f"  Created base metalness texture for {obj_name} at {metallic_output_path}")
 
-def create_metallic_smoothness_map(mesh_objects, textures_dir, texture_size):
+        metallic_pixels, metallic_smoothness_pixels = texture_ops.pack_metalness_channels(roughness_pixels.reshape((height, width, 4)))
+
+        for image_name, output_path, pixels, use_alpha in (
+            (f"{bake_name}_metallic", metallic_path, metallic_pixels, False),
+            (f"{bake_name}_MetallicSmoothness", metallic_smoothness_path, metallic_smoothness_pixels, True),
+        ):
+            if image_name in bpy.data.images:
+                bpy.data.images.remove(bpy.data.images[image_name], do_unlink=True)
+            image = bpy.data.images.new(name=image_name, width=width, height=height, alpha=use_alpha)
+            image.colorspace_settings.name = 'Non-Color'
+            image.pixels.foreach_set(pixels.ravel())
+            image.filepath_raw = output_path
+            image.file_format = 'PNG'
+            image.save()
+            release_image_buffers(image)
+        print(f"  Created metalness maps for {bake_name} ({width}x{height}): {metallic_path}, {metallic_smoothness_path}")
+    return len(jobs)
+
+def convert_image_for_export(image, output_dir, name_suffix, max_size, color_format='PNG', quality=90):
     """
-    Creates a combined MetallicSmoothness map for Unity (Universal Render Pipeline - URP)
-    from the baked Roughness map.
-    Unity URP MetallicSmoothness Map:
-    - R channel: Metalness (from G of original Roughness)
-    - G channel: Occlusion (set to 0.0 or from separate AO bake)
-    - B channel: Detail Mask (set to 0.0)
-    - A channel: Smoothness (1 - Roughness, from G of original Roughness)
+    Writes a platform copy of a baked image: downscaled so that its longest side is at most max_size and
+    re-encoded in color_format if it is a color (sRGB) map. Data maps (Non-Color) always stay lossless PNG.
+    Returns the new image datablock.
     """
-    print("\n--- Phase: Creating MetallicSmoothness Map for Unity ---")
-    for obj in mesh_objects:
-        obj_name = obj.name
-        roughness_path = os.path.join(textures_dir, f"{obj_name}_roughness.png")
-        metallic_smoothness_output_path = os.path.join(textures_dir, f"{obj_name}_MetallicSmoothness.png")
-
-        if not os.path.exists(roughness_path):
-            print(f"  Roughness texture missing for {obj_name} at {roughness_path}. Skipping MetallicSmoothness creation.")
-            continue
-
-        metallic_smoothness_name = f"{obj_name}_MetallicSmoothness"
-        if metallic_smoothness_name in bpy.data.images:
-            bpy.data.images.remove(bpy.data.images[metallic_smoothness_name], do_unlink=True)
-            print(f"  Removed existing MetallicSmoothness image '{metallic_smoothness_name}'.")
+    is_color_map = image.colorspace_settings.name == 'sRGB'
+    file_format = color_format.upper() if is_color_map else 'PNG'
+    width, height = image.size
+    scale = min(1.0, max_size / max(width, height)) if max_size else 1.0
+
+    export_image = image.copy()
+    export_image.name = f"{image.name}_{name_suffix}"
+    if scale < 1.0:
+        export_image.scale(max(1, int(width * scale)), max(1, int(height * scale)))
+    export_image.filepath_raw = os.path.join(output_dir, f"{export_image.name}.{IMAGE_FORMAT_EXTENSIONS.get(file_format, 'png')}")
+    export_image.file_format = file_format
+    export_image.save(quality=quality)
+    release_image_buffers(export_image)
+    print(f"  '{image.name}' -> {file_format} {export_image.size[0]}x{export_image.size[1]}: {export_image.filepath_raw}")
+    return export_image
+
+def prepare_texture_export_profile(mesh_objects, textures_dir, profile_name, profile):
+    """
+    Swaps every image texture node of the given meshes to a platform copy made by convert_image_for_export
+    (one copy per image, shared by all nodes using it). Files go to '{textures_dir}/{profile_name}'.
+    Returns (image_swaps, profile_images) to be passed to restore_texture_export_profile after the export.
+    """
+    print(f"\n--- Phase: Preparing Texture Export Profile '{profile_name}' ---")
+    output_dir = os.path.join(textures_dir, profile_name)
+    os.makedirs(output_dir, exist_ok=True)
 
-        roughness_img = bpy.data.images.load(roughness_path)
-        
-        metallic_smoothness_img = bpy.data.images.new(
-            name=metallic_smoothness_name,
-            width=texture_size,
-            height=texture_size,
-            alpha=True # Required for alpha channel
-        )
-        metallic_smoothness_img.colorspace_settings.name = 'Non-Color'
-
-        print(f"  Processing MetallicSmoothness texture for {obj_name}...")
-        
-        # Ensure roughness_img.pixels is flat before reshaping
-        # Check the number of channels (RGBA = 4)
-        if len(roughness_img.pixels) != texture_size * texture_size * 4:
-            print(f"  Error: Unexpected pixel count for roughness image {obj_name}. Expected {texture_size * texture_size * 4}, got {len(roughness_img.pixels)}. Cannot create MetallicSmoothness map.")
-            bpy.data.images.remove(roughness_img) # Clean up
+    converted_images = {}
+    image_swaps = []
+    for obj in mesh_objects:
+        if obj.type != 'MESH':
             continue
+        for mat in obj.data.materials:
+            if not mat or not mat.use_nodes:
+                continue
+            for node in mat.node_tree.nodes:
+                if node.type != 'TEX_IMAGE' or not node.image:
+                    continue
+                original_image = node.image
+                if original_image.name not in converted_images:
+                    converted_images[original_image.name] = convert_image_for_export(
+                        original_image, output_dir, profile_name,
+                        profile.get('max_size'), profile.get('color_format', 'PNG'), profile.get('quality', 90)
+                    )
+                    track_image_memory() # the copy loaded the source pixels
+                node.image = converted_images[original_image.name]
+                image_swaps.append((node, original_image))
+
+    print(f"  {len(converted_images)} images converted, {len(image_swaps)} texture nodes swapped.")
+    return image_swaps, list(converted_images.values())
+
+def restore_texture_export_profile(image_swaps, profile_images):
+    """Puts the original images back on the texture nodes and removes the platform copies from the blend data."""
+    for node, original_image in image_swaps:
+        node.image = original_image
+    for image in profile_images:
+        bpy.data.images.remove(image, do_unlink=True)
+
+def get_texture_profile_export_options(profile):
+    """
+    glTF exporter options for a texture profile. 'AUTO' keeps each image in its own file format,
+    so color maps are embedded as JPEG/WebP (EXT_texture_webp) and data maps as PNG.
+    """
+    return {
+        'export_image_format': 'AUTO',
+        'export_image_quality': profile.get('quality', 90),
+        'export_image_webp_fallback': profile.get('webp_fallback', False),
+    }
 
-        pixels = np.array(list(roughness_img.pixels)).reshape((texture_size, texture_size, 4)) # Reshape to (H, W, RGBA)
-        
-        metallic_smoothness_pixels = np.zeros_like(pixels) # Initialize with zeros, preserving shape
-        
-        # R (Metallic): From Green channel of original Roughness map (assuming it contains metalness)
-        # For biological models, metalness is often 0.0. Adjust as per your material definition.
-        metallic_smoothness_pixels[:,:,0] = pixels[:,:,1] # Copy Green channel to Red
-
-        # G (Occlusion): Set to 0.0 (or from separate AO bake if available)
-        metallic_smoothness_pixels[:,:,1] = 0.0 
-        
-        # B (Detail Mask): Set to 0.0
-        metallic_smoothness_pixels[:,:,2] = 0.0 
-        
-        # A (Smoothness): 1 - (Green channel of original Roughness)
-        metallic_smoothness_pixels[:,:,3] = 1.0 - pixels[:,:,1] 
-
-        # Flatten the array back to a 1D list for Blender
-        metallic_smoothness_img.pixels = metallic_smoothness_pixels.ravel().tolist()
-        
-        metallic_smoothness_img.filepath_raw = metallic_smoothness_output_path
-        metallic_smoothness_img.file_format = 'PNG'
-        metallic_smoothness_img.save()
-        
-        # Clean up the loaded roughness image from Blender's memory if no longer needed
-        bpy.data.images.remove(roughness_img, do_unlink=True)
-        print(f"  Created MetallicSmoothness texture for {obj_name} at {metallic_smoothness_output_path}")
-
-def update_shader_nodes_for_unity_export(imported_meshes, textures_dir):
+def update_shader_nodes_for_unity_export(imported_meshes, textures_dir, cleanup_registry=None):
     """
     Updates material nodes to use the combined MetallicSmoothness texture for Unity export consistency.
-    This function should be called AFTER create_metallic_smoothness_map.
-    Returns a list of all *new* nodes created by this function (MetallicSmoothness, Invert).
+    This function should be called AFTER create_metalness_maps.
+    Returns a list of all *new* nodes created by this function (MetallicSmoothness, Invert),
+    also recorded in cleanup_registry with the 'urp' tag.
     """
     print("\n--- Phase: Updating Shader Nodes for Unity (Metallic/Smoothness) ---")
     
     # Lista per raccogliere i nodi temporanei creati da questa funzione
     nodes_created_by_unity_export_setup = []
+    updated_materials = set() # atlas mode: materials are shared, update them once
 
     for obj in imported_meshes:
-        obj_name = obj.name
+        obj_name = obj.get('bake_target', obj.name) # baked textures are named after the atlas in atlas mode
         if not obj or not obj.data.materials:
-            print(f"Object '{obj_name}' not found or has no materials. Skipping shader update.")
+            print(f"Object '{obj.name}' not found or has no materials. Skipping shader update.")
             continue
             
         mat = obj.data.materials[0] # Assumes material is at index 0
+        if mat.name in updated_materials:
+            continue
+        updated_materials.add(mat.name)
         nodes = mat.node_tree.nodes
         links = mat.node_tree.links
 
@@ -1222,6 +2762,9 @@ def update_shader_nodes_for_unity_export(imported_meshes, textures_dir):
         if not principled_bsdf:
             print(f"  Principled BSDF node not found in material of '{obj.name}'. Cannot link MetallicSmoothness.")
             continue
+        if 'roughness' in obj.get('constant_channels', {}):
+            print(f"  Constant Roughness for '{obj.name}': Metallic/Smoothness kept as material factors.")
+            continue
 
         # Remove old Roughness and Metallic links if present
         if 'Roughness' in principled_bsdf.inputs:
@@ -1234,7 +2777,7 @@ def update_shader_nodes_for_unity_export(imported_meshes, textures_dir):
         # # Remove the old roughness and metallic image nodes if present
         # # This is good. It cleans up nodes that link_baked_textures might have set up.
         # roughness_node_name = f"{obj_name}_roughness" # This is the name used by bake_channel
-        # metallic_node_name = f"{obj_name}_metallic" # This is the name used by create_base_metalness_map
+        # metallic_node_name = f"{obj_name}_metallic" # This is the name used by create_metalness_maps
         
         # if roughness_node_name in nodes:
         #     nodes.remove(nodes[roughness_node_name])
@@ -1249,7 +2792,7 @@ def update_shader_nodes_for_unity_export(imported_meshes, textures_dir):
             print(f"  MetallicSmoothness texture missing for {obj_name} at {metallic_smoothness_path}. Skipping linking.")
             continue
 
-        metallic_smoothness_img = bpy.data.images.load(metallic_smoothness_path)
+        metallic_smoothness_img = bpy.data.images.load(metallic_smoothness_path, check_existing=True) # same datablock as the channel packing, no second copy
         metallic_smoothness_img.colorspace_settings.name = 'Non-Color' 
         
         metallic_smoothness_node_name = f"{obj_name}_MetallicSmoothness_map" # Descriptive name
@@ -1266,6 +2809,7 @@ def update_shader_nodes_for_unity_export(imported_meshes, textures_dir):
             print(f"  MetallicSmoothness node '{metallic_smoothness_node_name}' already exists for '{obj.name}'.")
         
         nodes_created_by_unity_export_setup.append(metallic_smoothness_node.name) # Track this node
+        register_temp_node(cleanup_registry, mat, metallic_smoothness_node, 'urp')
 
         # Link Color output (R channel for Metalness) to Principled BSDF Metallic input
         if 'Metallic' in principled_bsdf.inputs:
@@ -1281,6 +2825,7 @@ def update_shader_nodes_for_unity_export(imported_meshes, textures_dir):
             invert_node = nodes.new('ShaderNodeInvert') # This is a new node, needs to be tracked
             invert_node.location = metallic_smoothness_node.location + mathutils.Vector((200, -100))
             nodes_created_by_unity_export_setup.append(invert_node.name) # Track this node
+            register_temp_node(cleanup_registry, mat, invert_node, 'urp')
             
             links.new(metallic_smoothness_node.outputs['Alpha'], invert_node.inputs['Color'])
             links.new(invert_node.outputs['Color'], principled_bsdf.inputs['Roughness'])
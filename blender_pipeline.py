@@ -2,19 +2,26 @@
 # blender_pipeline.py
 import os
 import sys
+import argparse
 import subprocess
 
-def execute_blender_pipeline():
+def execute_blender_pipeline(segments_manifest=None, blender_shader_registry=None, mesh_arrays=None, resume_from=None):
     """
     Orchestra l'intera pipeline di elaborazione 3D all'interno di Blender.
+    Se manifest, registro shader e mesh (array NumPy) vengono passati direttamente
+    (orchestratore single-process), i file intermedi su disco non vengono letti.
+    Con resume_from (una chiave di config.RESUME_PHASES) riapre il checkpoint corrispondente
+    e salta le fasi gia' completate.
+    Restituisce True se la pipeline arriva in fondo.
     """
     # Importa i moduli custom e di configurazione
     try:
-        print("DEBUG: Tentativo di importare i moduli: bpy, config, utils, blender_ops...")
+        print("DEBUG: Tentativo di importare i moduli: bpy, config, utils, blender_ops, glb_ops...")
         import bpy
         import config
         import utils
         import blender_ops
+        import glb_ops
         print("DEBUG: Moduli importati con successo.")
     except ImportError as e:
         print(f"ERRORE CRITICO: Impossibile importare un modulo fondamentale. Controlla che le librerie necessarie (es. PyYAML) siano installate nell'ambiente Python di Blender. Dettagli: {e}")
@@ -31,136 +38,363 @@ def execute_blender_pipeline():
     print(f"  Output directory ensured: {config.OUTPUT_DIR}")
     print(f"  Textures directory ensured: {config.TEXTURES_DIR}")
 
-    # --- 1. Setup Iniziale ---
-    print("\n--- Fase 1: Setup Ambiente e Scena ---")
-    blender_ops.setup_blender_environment()
-    blender_ops.clear_blender_scene()
-    all_nodes_to_clean_up = [] # tutti i nodi e oggetti temporanei da pulire (nomi)
-
-    # --- 2. Caricamento Shader Registry e Manifest ---
-    print("\n--- Fase 2: Caricamento delle Regole dallo Shader Registry e del Manifest dei Segmenti ---")
-    try:
-
-        blender_shader_registry = utils.read_json(config.BLENDER_SHADER_REGISTRY_TMP)
-        print(f"  Registro degli asset (da JSON) caricato da: {config.BLENDER_SHADER_REGISTRY_TMP}")
-        segments_manifest = utils.read_json(config.SEGMENTS_DATA_MANIFEST_FILE)
-        print(f"  Manifest dei segmenti caricato da: {config.SEGMENTS_DATA_MANIFEST_FILE}")
-
-    except FileNotFoundError as e:
-        print(f"ERRORE: File fondamentale non trovato: {e}. Assicurati che la pipeline di segmentazione sia stata eseguita correttamente.")
-        return
-    except Exception as e:
-        print(f"ERRORE: Impossibile caricare i file di configurazione. Dettagli: {e}")
-        return
-
-    # --- 3. Matcha i materiali dal manifest ---
-    print("\n--- Fase 3: Match dei materiali in bse alle regole del Manifest ---")
-    enriched_manifest = blender_ops.match_materials_on_manifest(segments_manifest, blender_shader_registry)
-    # Salva il manifest arricchito per il debug
     enriched_manifest_path = os.path.join(config.OUTPUT_DIR, "enriched_manifest.json")
-    utils.write_json(enriched_manifest, enriched_manifest_path)
-    print(f"  Manifest arricchito e salvato per debug in: {enriched_manifest_path}")
-
-
-    # --- 4. Importazione delle Mesh ---
-    print(f"\n--- Fase 4: Importazione dei Mesh da '{config.INPUT_MESH_DIR}' ---")
-    if not os.path.exists(config.INPUT_MESH_DIR) or not os.listdir(config.INPUT_MESH_DIR):
-        print(f"ERRORE: La directory di input '{config.INPUT_MESH_DIR}' non esiste o e' vuota. Nessun mesh da processare.")
+    vertex_color_mode = config.BLENDER_PIPELINE_MODE.upper() == 'VERTEX_COLOR' # niente UV, bake e FBX: solo GLB con colori per vertice
+    if vertex_color_mode and resume_from == 'export_fbx':
+        print("ERRORE: In modalita' VERTEX_COLOR non viene prodotto l'FBX: ripresa da 'export_fbx' non disponibile.")
         return
-        
-    imported_meshes = blender_ops.import_meshes_into_blender_scene(config.INPUT_MESH_DIR)
-    if not imported_meshes:
-        print("ERRORE: Nessun mesh e' stato importato. Interruzione della pipeline.")
-        return
-    print(f"  Importate {len(imported_meshes)} mesh.")
-
-    # --- 5. Applicazione Scala Globale ---
-    print(f"\n--- Fase 5: Applicazione unita' in scala reale, fattore di conversione: '{config.WORLD_SCALE_FACTOR}' ---")
-    blender_ops.apply_world_scale(imported_meshes, config.WORLD_SCALE_FACTOR)
-
-    # --- 6. Centratura e Gerarchia ---
-    print("\n--- Fase 6: Centratura e Creazione Gerarchia ---")
-    # Create a single root for all imported meshes
-    scene_root = blender_ops.create_single_scene_root(imported_meshes, config.ROOT_NAME_BASE)
-    if not scene_root:
-        print("ERRORE: Impossibile creare l'oggetto Root della scena. Interruzione della pipeline.")
-        return
-    print(f"  Geometrie parentate sotto unico Root: '{scene_root.name}'.")
-
-    # --- 7. Ottimizzazione dei Mesh ---
-    print("\n--- Fase 7: Ottimizzazione dei Mesh ---")
-    blender_ops.fix_normal_orientation(imported_meshes) # all normals out
-    blender_ops.merge_vertices_by_distance(imported_meshes, config.MERGE_DISTANCE) # disconnected faces
-    polycount, poly_removed = blender_ops.decimate_mesh_objects(imported_meshes, config.MAX_FACES_PER_MESH, segments_manifest) # decimation
-    print (f"RECAP DECIMATION: Total: '{polycount}', Removed: '{poly_removed}'")
-    blender_ops.delete_small_features(imported_meshes, config.MERGE_DISTANCE) # dissolve_degenerate to fix potential decimation leftovers
-    blender_ops.apply_smoothing_normals(imported_meshes, config.NORMAL_SMOOTHING_METHOD) # smoth
-
-    # --- 8. Creata le mappe UV
-    print("\n--- Fase 8: UV Mapping  ---")
-    blender_ops.uv_map(imported_meshes, config.TEXTURE_SIZE)
-
-    # --- 9. Applicazione dei Materiali ---
-    print("\n--- Fase 9: Applicazione dei Materiali ---")
-    template_nodes = blender_ops.apply_materials_from_manifest(imported_meshes, enriched_manifest)
-    # blender_ops.apply_materials_from_manifest(imported_meshes, enriched_manifest)
-    all_nodes_to_clean_up.extend(template_nodes) # Template materials and projectors
-
-    # --- 10 SALVA LA SCENA PRIMA DEL BAKE --- (per interventi sul materiale)
-    print("\n--- Fase 10: Salvataggio scena con history  ---")
-    blender_ops.save_blender_scene(config.OUTPUT_DIR, f"{config.PROJECT_SESSION_ID}_01_history.blend")
-
-    # --- 11 Applica i modificatori alle mesh (freeze history)
-    print("\n--- Fase 11: Baking dei modificatori e deformatori ---")
-    blender_ops.apply_all_modifiers(imported_meshes)
-
-    # --- 12 Baking delle Texture ---
-    print("\n--- Fase 12: Baking delle Texture ---")
-    blender_ops.bake_textures(imported_meshes, config.TEXTURES_DIR, config.TEXTURE_SIZE, config.BLENDER_DEVICE)
-
-    # --- 13 Crea la mappa metalness per lo standard Adobe PBR
-    print("\n--- Fase 13: Creazione Mappa di Metalness in standard PBR ---")
-    blender_ops.create_base_metalness_map(imported_meshes, config.TEXTURES_DIR, config.TEXTURE_SIZE)
-
-    # --- 14 Collega le texture al materiale (Metallic/Roughness Adobe PBR Standard)
-    print("\n--- Fase 14: Collegamento nodi texture in standard PBR")
-    blender_ops.link_baked_textures(imported_meshes, config.TEXTURES_DIR)
-    # all_nodes_to_clean_up.extend(temp_pbr_nodes_created)
-
-    # --- 15 Pulizia Nodi ---
-    print("\n--- Fase 15: Pulizia Nodi ---")
-    blender_ops.remove_bake_temp_nodes(all_nodes_to_clean_up) # FOLLIA QUI ?
-
-    # --- 16 SALVA LA SCENA DOPO DEL BAKE --- (per debug PBR)
-    print("\n--- Fase 16: Salvataggio scena con i bake PBR applicati ---")
-    blender_ops.save_blender_scene(config.OUTPUT_DIR, f"{config.PROJECT_SESSION_ID}_02_baked_PBR.blend")
-
-    # --- 17 Esportazione GLB (PBR Standard) ---
-    print("\n--- Fase 17: Esportazione in formato GLB (PBR) ---")
-    blender_ops.export_glb(os.path.join(config.OUTPUT_DIR, config.PBR_FILENAME), scene_root)
-
-    # --- 18 Crea la metalic_smoothnes ---
-    print("\n--- Fase 18: Creazione Mappa di Metalness in standard URP ---")
-    blender_ops.create_metallic_smoothness_map(imported_meshes, config.TEXTURES_DIR, config.TEXTURE_SIZE)
+    resume_checkpoint = None
+    if resume_from:
+        resume_checkpoint = config.RESUME_PHASES.get(resume_from)
+        if resume_checkpoint is None:
+            print(f"ERRORE: Fase di ripresa '{resume_from}' non valida. Valori ammessi: {sorted(config.RESUME_PHASES)}.")
+            return
+
+    if resume_checkpoint:
+        # --- Ripresa da checkpoint: le fasi precedenti sono gia' salvate nel file .blend ---
+        print(f"\n--- Ripresa dalla fase '{resume_from}' (checkpoint '{resume_checkpoint}') ---")
+        checkpoint_path = blender_ops.get_checkpoint_path(resume_checkpoint)
+        if not os.path.exists(checkpoint_path):
+            if config.CHECKPOINT_POLICY.upper() == 'OFF' or resume_checkpoint not in config.CHECKPOINT_NAMES:
+                print(f"ERRORE: Checkpoint '{resume_checkpoint}' non salvato (CHECKPOINT_POLICY = '{config.CHECKPOINT_POLICY}', "
+                      f"CHECKPOINT_NAMES = {config.CHECKPOINT_NAMES}): ripresa da '{resume_from}' non disponibile.")
+            else:
+                print(f"ERRORE: Checkpoint '{resume_checkpoint}' non trovato in {checkpoint_path}: ripresa da '{resume_from}' non disponibile.")
+            return
+        if not os.path.exists(enriched_manifest_path):
+            print(f"ERRORE: Manifest arricchito non trovato in {enriched_manifest_path}: ripresa da '{resume_from}' non disponibile.")
+            return
+        if not blender_ops.open_pipeline_checkpoint(resume_checkpoint):
+            return
+        blender_ops.setup_blender_environment()
+        imported_meshes, scene_root, lod_objects = blender_ops.restore_pipeline_state_from_scene()
+        if not imported_meshes or not scene_root:
+            print("ERRORE: Nessun mesh sotto un Root nel checkpoint. Interruzione della pipeline.")
+            return
+        enriched_manifest = utils.read_json(enriched_manifest_path)
+        cleanup_registry = blender_ops.rebuild_cleanup_registry(imported_meshes)
+        atlas_groups = {}
+        if config.TEXTURE_ATLAS_MODE.upper() == 'ATLAS':
+            for obj in imported_meshes:
+                atlas_groups.setdefault(obj.get('bake_target', obj.name), []).append(obj)
+    else:
+        # --- 1. Setup Iniziale ---
+        print("\n--- Fase 1: Setup Ambiente e Scena ---")
+        blender_ops.setup_blender_environment()
+        blender_ops.clear_blender_scene()
+        cleanup_registry = blender_ops.new_cleanup_registry() # nodi (per materiale), oggetti e materiali temporanei da pulire
+
+        # --- 2. Caricamento Shader Registry e Manifest ---
+        print("\n--- Fase 2: Caricamento delle Regole dallo Shader Registry e del Manifest dei Segmenti ---")
+        try:
+            if blender_shader_registry is None:
+                blender_shader_registry = utils.read_json(config.SHADER_REGISTRY_INDEX_FILE)['registry']
+                print(f"  Registro degli asset (indice compilato) caricato da: {config.SHADER_REGISTRY_INDEX_FILE}")
+            else:
+                print("  Registro degli asset ricevuto in memoria.")
+            if segments_manifest is None:
+                segments_manifest = utils.read_json(config.SEGMENTS_DATA_MANIFEST_FILE)
+                print(f"  Manifest dei segmenti caricato da: {config.SEGMENTS_DATA_MANIFEST_FILE}")
+            else:
+                print("  Manifest dei segmenti ricevuto in memoria.")
+
+        except FileNotFoundError as e:
+            print(f"ERRORE: File fondamentale non trovato: {e}. Assicurati che la pipeline di segmentazione sia stata eseguita correttamente.")
+            return
+        except Exception as e:
+            print(f"ERRORE: Impossibile caricare i file di configurazione. Dettagli: {e}")
+            return
+
+        # --- 3. Matcha i materiali dal manifest ---
+        print("\n--- Fase 3: Match dei materiali in bse alle regole del Manifest ---")
+        enriched_manifest = blender_ops.match_materials_on_manifest(segments_manifest, blender_shader_registry)
+        # Salva il manifest arricchito per il debug
+        utils.write_json(enriched_manifest, enriched_manifest_path)
+        print(f"  Manifest arricchito e salvato per debug in: {enriched_manifest_path}")
+
+
+        # --- 4. Importazione delle Mesh ---
+        if mesh_arrays is not None:
+            print(f"\n--- Fase 4: Creazione dei Mesh da {len(mesh_arrays)} array in memoria ---")
+            imported_meshes = blender_ops.link_mesh_arrays_into_blender_scene(mesh_arrays, config.MESH_IMPORT_CUSTOM_NORMALS)
+        else:
+            print(f"\n--- Fase 4: Importazione dei Mesh da '{config.INPUT_MESH_DIR}' ---")
+            if not os.path.exists(config.INPUT_MESH_DIR) or not os.listdir(config.INPUT_MESH_DIR):
+                print(f"ERRORE: La directory di input '{config.INPUT_MESH_DIR}' non esiste o e' vuota. Nessun mesh da processare.")
+                return
+            if config.MESH_IMPORT_MODE.upper() == 'BULK':
+                imported_meshes = blender_ops.import_meshes_into_blender_scene_bulk(config.INPUT_MESH_DIR, config.MESH_IMPORT_CUSTOM_NORMALS)
+            else:
+                imported_meshes = blender_ops.import_meshes_into_blender_scene(config.INPUT_MESH_DIR)
+        if not imported_meshes:
+            print("ERRORE: Nessun mesh e' stato importato. Interruzione della pipeline.")
+            return
+        print(f"  Importate {len(imported_meshes)} mesh.")
+
+        # --- 5. Applicazione Scala Globale ---
+        print(f"\n--- Fase 5: Applicazione unita' in scala reale, fattore di conversione: '{config.WORLD_SCALE_FACTOR}' ---")
+        blender_ops.apply_world_scale(imported_meshes, config.WORLD_SCALE_FACTOR)
+
+        # --- 6. Centratura e Gerarchia ---
+        print("\n--- Fase 6: Centratura e Creazione Gerarchia ---")
+        # Create a single root for all imported meshes
+        scene_root = blender_ops.create_single_scene_root(imported_meshes, config.ROOT_NAME_BASE)
+        if not scene_root:
+            print("ERRORE: Impossibile creare l'oggetto Root della scena. Interruzione della pipeline.")
+            return
+        print(f"  Geometrie parentate sotto unico Root: '{scene_root.name}'.")
+
+        # --- 7. Ottimizzazione dei Mesh ---
+        print("\n--- Fase 7: Ottimizzazione dei Mesh ---")
+        use_bmesh_pass = config.GEOMETRY_PASS_MODE.upper() == 'BMESH'
+        if use_bmesh_pass:
+            # weld e normali verso l'esterno prima della decimazione, come nella catena di operatori
+            blender_ops.optimize_mesh_objects_bmesh(imported_meshes, config.MERGE_DISTANCE, 0, None)
+        else:
+            blender_ops.fix_normal_orientation(imported_meshes) # all normals out
+            blender_ops.merge_vertices_by_distance(imported_meshes, config.MERGE_DISTANCE) # disconnected faces
+
+        if config.TRIANGLE_BUDGET_TOTAL:
+            # budget globale di scena distribuito tra gli oggetti
+            decimation_report = blender_ops.decimate_mesh_objects_to_budget(
+                imported_meshes,
+                config.TRIANGLE_BUDGET_TOTAL,
+                segments_manifest,
+                config.TRIANGLE_BUDGET_STRATEGY,
+                config.TRIANGLE_BUDGET_MIN_FACES,
+                config.TRIANGLE_BUDGET_CATEGORY_PRIORITY
+            )
+            polycount = sum(entry['before'] for entry in decimation_report.values())
+            poly_removed = polycount - sum(entry['after'] for entry in decimation_report.values())
+        else:
+            polycount, poly_removed = blender_ops.decimate_mesh_objects(imported_meshes, config.MAX_FACES_PER_MESH, segments_manifest) # decimation
+        print (f"RECAP DECIMATION: Total: '{polycount}', Removed: '{poly_removed}'")
+
+        if use_bmesh_pass:
+            # dissolve_degenerate e smoothing dopo la decimazione in un unico passaggio bmesh per oggetto
+            blender_ops.optimize_mesh_objects_bmesh(imported_meshes, 0, config.DISSOLVE_DEGENERATE_THRESHOLD, config.NORMAL_SMOOTHING_METHOD)
+        else:
+            blender_ops.delete_small_features(imported_meshes, config.MERGE_DISTANCE) # dissolve_degenerate to fix potential decimation leftovers
+            blender_ops.apply_smoothing_normals(imported_meshes, config.NORMAL_SMOOTHING_METHOD) # smoth
+
+        if vertex_color_mode:
+            print("\n--- Fase 8: UV Mapping saltato (modalita' VERTEX_COLOR) ---")
+        else:
+            # --- 8. Creata le mappe UV
+            print("\n--- Fase 8: UV Mapping  ---")
+            if config.UV_UNWRAP_ENGINE.upper() == 'BOX_CHARTS':
+                # unwrap su array NumPy in un pool di processi, senza edit mode
+                blender_ops.uv_map_box_charts(imported_meshes, config.UV_ISLAND_MARGIN, config.UV_UNWRAP_WORKERS)
+            else:
+                blender_ops.uv_map(imported_meshes, config.TEXTURE_SIZE)
+
+            # --- 8.5 Risoluzione delle texture per densita' di texel ---
+            if config.TEXTURE_SIZE_MODE.upper() == 'TEXEL_DENSITY':
+                print("\n--- Fase 8.5: Risoluzione texture per densita' di texel ---")
+                blender_ops.compute_texel_density_texture_sizes(
+                    imported_meshes,
+                    config.TEXEL_DENSITY_TEXELS_PER_MM,
+                    config.TEXEL_DENSITY_MIN_SIZE,
+                    config.TEXEL_DENSITY_MAX_SIZE,
+                    1.0 / config.WORLD_SCALE_FACTOR, # unita' di Blender -> mm
+                    enriched_manifest
+                )
+                utils.write_json(enriched_manifest, enriched_manifest_path)
+
+        # --- 9. Applicazione dei Materiali ---
+        print("\n--- Fase 9: Applicazione dei Materiali ---")
+        if config.MATERIAL_LOADER.upper() == 'CONSOLIDATED':
+            blender_ops.build_consolidated_shader_library(blender_shader_registry, config.SHADERS_DIR, config.SHADER_LIBRARY_FILE)
+        blender_ops.apply_materials_from_manifest(imported_meshes, enriched_manifest, cleanup_registry) # registra materiali template, proiettori e nodi di color override
+
+        atlas_groups = {}
+        if not vertex_color_mode:
+            # --- 9.5 Atlanti UV condivisi tra oggetti con lo stesso shader ---
+            if config.TEXTURE_ATLAS_MODE.upper() == 'ATLAS':
+                print("\n--- Fase 9.5: Packing degli atlanti UV ---")
+                atlas_groups = blender_ops.build_texture_atlases(imported_meshes, config.ATLAS_MAX_OBJECTS, config.ATLAS_ISLAND_MARGIN)
+                print(f"  {len(imported_meshes)} oggetti raggruppati in {len(atlas_groups)} atlanti.")
+
+            # --- 9.6 Canali costanti: niente bake, esportati come fattori del materiale ---
+            if config.BAKE_SKIP_CONSTANT_CHANNELS:
+                print("\n--- Fase 9.6: Analisi dei canali costanti dei materiali ---")
+                blender_ops.detect_constant_channels(imported_meshes, enriched_manifest)
+                utils.write_json(enriched_manifest, enriched_manifest_path)
+
+        # --- 10 SALVA LA SCENA PRIMA DEL BAKE --- (per interventi sul materiale)
+        print("\n--- Fase 10: Salvataggio scena con history  ---")
+        # i worker del bake (BAKE_SHARDS > 1) riaprono questo checkpoint: salvato anche con CHECKPOINT_POLICY = 'OFF'
+        blender_ops.save_pipeline_checkpoint('history', config.CHECKPOINT_POLICY, config.CHECKPOINT_NAMES, required=config.BAKE_SHARDS > 1)
+
+    parallel_export = config.EXPORT_MODE.upper() == 'PARALLEL' and not vertex_color_mode # un solo GLB: nulla da parallelizzare
+    compression_profile = config.GLB_COMPRESSION_PROFILES.get(config.GLB_COMPRESSION_PROFILE, {})
+    export_results = [] # esiti e dimensioni degli export, salvati nel report della run
+
+    if resume_from in (None, 'bake'):
+        # --- 11 Applica i modificatori alle mesh (freeze history)
+        print("\n--- Fase 11: Baking dei modificatori e deformatori ---")
+        blender_ops.apply_all_modifiers(imported_meshes)
+
+        if vertex_color_mode:
+            # --- 12 Colori per vertice al posto di bake, metalness e collegamento texture (Fasi 12-14) ---
+            print("\n--- Fase 12: Base Color dei materiali nei colori per vertice (modalita' VERTEX_COLOR, Fasi 13-14 saltate) ---")
+            blender_ops.bake_vertex_colors(imported_meshes, config.VERTEX_COLOR_ROUGHNESS, config.VERTEX_COLOR_METALLIC)
+        else:
+            # --- 12 Baking delle Texture ---
+            print("\n--- Fase 12: Baking delle Texture ---")
+            if atlas_groups:
+                # un bake per canale e per atlante, poi un solo materiale per atlante
+                blender_ops.bake_textures_atlas(atlas_groups, config.TEXTURES_DIR, config.ATLAS_TEXTURE_SIZE, config.BLENDER_DEVICE, cleanup_registry)
+                blender_ops.batch_atlas_materials(atlas_groups)
+            elif config.BAKE_SHARDS > 1:
+                # worker Blender in parallelo sulla scena pre-bake salvata nella Fase 10
+                blender_ops.bake_textures_sharded(
+                    imported_meshes,
+                    blender_ops.get_checkpoint_path('history'),
+                    config.TEXTURES_DIR,
+                    config.TEXTURE_SIZE,
+                    config.BAKE_SHARDS,
+                    config.BAKE_WORKER_THREADS,
+                    config.BAKE_MODE,
+                    os.path.join(config.TMP_DIR, config.CLIENT_ID, config.PROJECT_SESSION_ID, "bake_shards"),
+                    cleanup_registry
+                )
+            elif config.BAKE_MODE.upper() == 'BATCHED':
+                # un bake per canale per tutti gli oggetti, dati di render persistenti
+                blender_ops.bake_textures_batched(imported_meshes, config.TEXTURES_DIR, config.TEXTURE_SIZE, config.BLENDER_DEVICE, cleanup_registry)
+            else:
+                blender_ops.bake_textures(imported_meshes, config.TEXTURES_DIR, config.TEXTURE_SIZE, config.BLENDER_DEVICE, cleanup_registry)
+            blender_ops.report_bake_cache_stats() # con BAKE_SHARDS > 1 le statistiche dei worker sono nei rispettivi log
+
+            # --- 13 Crea la mappa metalness per lo standard Adobe PBR
+            print("\n--- Fase 13: Creazione Mappa di Metalness in standard PBR ---")
+            # una sola lettura della roughness per oggetto: genera anche la MetallicSmoothness URP (Fase 18)
+            blender_ops.create_metalness_maps(imported_meshes, config.TEXTURES_DIR, config.CHANNEL_PACKING_ENGINE, config.CHANNEL_PACKING_WORKERS)
+
+            # --- 14 Collega le texture al materiale (Metallic/Roughness Adobe PBR Standard)
+            print("\n--- Fase 14: Collegamento nodi texture in standard PBR")
+            blender_ops.link_baked_textures(imported_meshes, config.TEXTURES_DIR, cleanup_registry)
+
+        # --- 14.5 Genera le catene di LOD (condividono UV e texture del LOD0)
+        lod_objects = []
+        if config.LOD_RATIOS:
+            print("\n--- Fase 14.5: Generazione delle catene di LOD ---")
+            lod_objects = blender_ops.generate_lod_chains(imported_meshes, config.LOD_RATIOS, config.LOD_SCREEN_COVERAGE, enriched_manifest)
+            utils.write_json(enriched_manifest, enriched_manifest_path)
+            print(f"  Catene di LOD registrate nel manifest arricchito: {enriched_manifest_path}")
+
+        # --- 15 Pulizia Nodi ---
+        print("\n--- Fase 15: Pulizia Nodi ---")
+        # materiali template, proiettori e mix di color override (il diffuse e' gia' bakato); i nodi dei bake servono all'export
+        blender_ops.remove_bake_temp_items(cleanup_registry, ('template', 'color_override'))
+
+        # --- 16 SALVA LA SCENA DOPO DEL BAKE --- (per debug PBR)
+        print("\n--- Fase 16: Salvataggio scena con i bake PBR applicati ---")
+        # con EXPORT_MODE = 'PARALLEL' i worker dei GLB riaprono questo checkpoint
+        blender_ops.save_pipeline_checkpoint('baked_pbr', config.CHECKPOINT_POLICY, config.CHECKPOINT_NAMES, required=parallel_export)
+
+    if resume_from != 'export_fbx':
+        # --- 17 Esportazione GLB (PBR Standard) ---
+        glb_path = os.path.join(config.OUTPUT_DIR, config.PBR_FILENAME)
+        if parallel_export:
+            print("\n--- Fase 17: Esportazione GLB rimandata alla Fase 22 (worker paralleli) ---")
+        else:
+            print("\n--- Fase 17: Esportazione in formato GLB (PBR) ---")
+            print(f"  Profilo di compressione GLB: '{config.GLB_COMPRESSION_PROFILE}'.")
+            blender_ops.export_glb(glb_path, scene_root, compression_profile.get('exporter'))
+            glb_report = glb_ops.postprocess_glb(glb_path, compression_profile, config.GLTFPACK_EXECUTABLE, bool(lod_objects), config.GLB_DECODE_THROUGHPUT_MB_S)
+            print(f"  RECAP GLB: {glb_report['file_bytes'] / (1024 * 1024):.2f} MB (BIN {glb_report['bin_bytes'] / (1024 * 1024):.2f} MB), "
+                  f"{glb_report['triangles']} triangoli, estensioni: {glb_report['extensions_used']}, "
+                  f"decodifica stimata: {'n/a' if glb_report['estimated_decode_ms'] is None else str(glb_report['estimated_decode_ms']) + ' ms'}.")
+            export_results.append({'name': 'glb', 'format': 'GLB', 'filepath': glb_path, 'exit_code': None, **glb_report})
+
+        # --- 17.5 Esportazione GLB per piattaforma (stesso bake, texture ricodificate e ridimensionate) ---
+        texture_export_profile_names = config.TEXTURE_EXPORT_PROFILE_NAMES if not (parallel_export or vertex_color_mode) else [] # VERTEX_COLOR: nessuna texture
+        if texture_export_profile_names:
+            print("\n--- Fase 17.5: Esportazione GLB per profili di piattaforma ---")
+        for profile_name in texture_export_profile_names:
+            texture_profile = config.TEXTURE_EXPORT_PROFILES.get(profile_name)
+            if not texture_profile:
+                print(f"  ATTENZIONE: Profilo texture '{profile_name}' non definito in TEXTURE_EXPORT_PROFILES. Salto.")
+                continue
+            profile_glb_path = os.path.join(config.OUTPUT_DIR, f"{config.PROJECT_SESSION_ID}{config.OUTPUT_SUFFIX}_{profile_name}.{config.EXTENSION_PBR}")
+            image_swaps, profile_images = blender_ops.prepare_texture_export_profile(imported_meshes, config.TEXTURES_DIR, profile_name, texture_profile)
+            try:
+                export_options = dict(compression_profile.get('exporter') or {})
+                export_options.update(blender_ops.get_texture_profile_export_options(texture_profile))
+                blender_ops.export_glb(profile_glb_path, scene_root, export_options)
+            finally:
+                blender_ops.restore_texture_export_profile(image_swaps, profile_images)
+            glb_report = glb_ops.postprocess_glb(profile_glb_path, compression_profile, config.GLTFPACK_EXECUTABLE, bool(lod_objects), config.GLB_DECODE_THROUGHPUT_MB_S)
+            print(f"  RECAP GLB '{profile_name}': {glb_report['file_bytes'] / (1024 * 1024):.2f} MB, "
+                  f"{glb_report['triangles']} triangoli, estensioni: {glb_report['extensions_used']}.")
+            export_results.append({'name': f"glb_{profile_name}", 'format': 'GLB', 'filepath': profile_glb_path, 'exit_code': None, **glb_report})
+
+    if resume_from != 'export_fbx' and not vertex_color_mode:
+        # --- 18 Crea la metalic_smoothnes ---
+        print("\n--- Fase 18: Creazione Mappa di Metalness in standard URP ---")
+        print("  MetallicSmoothness gia' generata dal channel packing della Fase 13.")
     
-    # --- 19 Collega le texture al materiale (Unity URP Standard)
-    print("\n--- Fase 19: Collegamento nodi texture in standard URP")
-    urp_nodes_created = blender_ops.update_shader_nodes_for_unity_export(imported_meshes, config.TEXTURES_DIR)
-    all_nodes_to_clean_up.extend(urp_nodes_created)
+        # --- 19 Collega le texture al materiale (Unity URP Standard)
+        print("\n--- Fase 19: Collegamento nodi texture in standard URP")
+        blender_ops.update_shader_nodes_for_unity_export(imported_meshes, config.TEXTURES_DIR, cleanup_registry)
 
-    # --- 20. Pulizia Finale ---
-    print("\n--- Fase 20: Pulizia Finale ---")
-    blender_ops.remove_bake_temp_nodes(all_nodes_to_clean_up)
+        # --- 20. Pulizia Finale ---
+        print("\n--- Fase 20: Pulizia Finale ---")
+        blender_ops.remove_bake_temp_items(cleanup_registry, ('urp',))
 
-    # --- 21 SALVA LA SCENA DOPO DEL BAKE --- (per debug URP)
-    print("\n--- Fase 21: Salvataggio scena con i bake URP applicati ---")
-    blender_ops.save_blender_scene(config.OUTPUT_DIR, f"{config.PROJECT_SESSION_ID}_02_baked_URP.blend")
+        # --- 21 SALVA LA SCENA DOPO DEL BAKE --- (per debug URP)
+        print("\n--- Fase 21: Salvataggio scena con i bake URP applicati ---")
+        blender_ops.save_pipeline_checkpoint('baked_urp', config.CHECKPOINT_POLICY, config.CHECKPOINT_NAMES, required=parallel_export)
 
     # --- 22 # Esporta la geometria in Fbx
-    print("\n--- Fase 22: Esportazione in formato FBX (URP) ---")
-    blender_ops.export_fbx(os.path.join(config.OUTPUT_DIR, config.URP_FILENAME), [scene_root])
+    fbx_path = os.path.join(config.OUTPUT_DIR, config.URP_FILENAME)
+    if vertex_color_mode:
+        print("\n--- Fase 22: Esportazione FBX saltata (modalita' VERTEX_COLOR) ---")
+    elif parallel_export:
+        # GLB, GLB per profilo e FBX in worker Blender headless contemporanei, ognuno dal proprio checkpoint
+        print("\n--- Fase 22: Esportazione parallela GLB (PBR) e FBX (URP) ---")
+        export_tasks = []
+        if resume_from != 'export_fbx':
+            pbr_blend_path = blender_ops.get_checkpoint_path('baked_pbr')
+            export_tasks.append({'name': 'glb', 'format': 'GLB', 'blend_path': pbr_blend_path, 'filepath': glb_path,
+                                 'export_options': compression_profile.get('exporter')})
+            for profile_name in config.TEXTURE_EXPORT_PROFILE_NAMES:
+                texture_profile = config.TEXTURE_EXPORT_PROFILES.get(profile_name)
+                if not texture_profile:
+                    print(f"  ATTENZIONE: Profilo texture '{profile_name}' non definito in TEXTURE_EXPORT_PROFILES. Salto.")
+                    continue
+                export_tasks.append({
+                    'name': f"glb_{profile_name}", 'format': 'GLB', 'blend_path': pbr_blend_path,
+                    'filepath': os.path.join(config.OUTPUT_DIR, f"{config.PROJECT_SESSION_ID}{config.OUTPUT_SUFFIX}_{profile_name}.{config.EXTENSION_PBR}"),
+                    'export_options': compression_profile.get('exporter'),
+                    'profile_name': profile_name, 'texture_profile': texture_profile, 'textures_dir': config.TEXTURES_DIR,
+                })
+        export_tasks.append({'name': 'fbx', 'format': 'FBX', 'blend_path': blender_ops.get_checkpoint_path('baked_urp'), 'filepath': fbx_path})
+
+        for result in blender_ops.export_in_workers(export_tasks, os.path.join(config.TMP_DIR, config.CLIENT_ID, config.PROJECT_SESSION_ID, "export_tasks")):
+            if result['format'] == 'GLB' and result['exit_code'] == 0:
+                glb_report = glb_ops.postprocess_glb(result['filepath'], compression_profile, config.GLTFPACK_EXECUTABLE, bool(lod_objects), config.GLB_DECODE_THROUGHPUT_MB_S)
+                print(f"  RECAP GLB '{result['name']}': {glb_report['file_bytes'] / (1024 * 1024):.2f} MB, "
+                      f"{glb_report['triangles']} triangoli, estensioni: {glb_report['extensions_used']}.")
+                result.update(glb_report)
+            export_results.append(result)
+    else:
+        print("\n--- Fase 22: Esportazione in formato FBX (URP) ---")
+        blender_ops.export_fbx(fbx_path, [scene_root])
+        export_results.append({'name': 'fbx', 'format': 'FBX', 'filepath': fbx_path, 'exit_code': None,
+                               'file_bytes': os.path.getsize(fbx_path) if os.path.exists(fbx_path) else None})
+
+    utils.update_run_report(config.RUN_REPORT_FILE, 'exports', export_results)
+    utils.update_run_report(config.RUN_REPORT_FILE, 'image_memory', blender_ops.report_image_memory_stats())
+    print(f"  Report degli export salvato in: {config.RUN_REPORT_FILE}")
+    failed_exports = [result['name'] for result in export_results if result['exit_code'] not in (None, 0)]
+    if failed_exports:
+        print(f"ERRORE: Export non riusciti: {failed_exports}.")
+        return
 
     print("\n*** PIPELINE BLENDER COMPLETATA CON SUCCESSO ***")
+    return True
 
 if __name__ == "__main__":
     # Questo blocco gestisce il caso in cui lo script venga eseguito direttamente
@@ -172,6 +406,12 @@ if __name__ == "__main__":
         sys.path.append(script_dir)
         print(f"DEBUG: Aggiunto al sys.path: {script_dir}")
 
+    # Opzioni della pipeline: dentro Blender seguono '--' nella riga di comando
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser(description="Pipeline di Blender TAC 2 AR.")
+    parser.add_argument("--resume-from", default=None, help="Fase da cui riprendere (chiavi di config.RESUME_PHASES).")
+    args, _ = parser.parse_known_args(argv)
+
     # Discrimina l'ambiente
     try:
         import bpy
@@ -181,37 +421,37 @@ if __name__ == "__main__":
 
     # --- Logica di Esecuzione ---
     if is_inside_blender:
-        execute_blender_pipeline()
+        # codice di uscita != 0 se la pipeline si interrompe (export falliti, checkpoint mancante...): main.py lo rileva
+        sys.exit(0 if execute_blender_pipeline(resume_from=args.resume_from) else 1)
     else:
         print("--- Esecuzione Stand-Alone Rilevata ---")
 
         # Importa i moduli necessari per la preparazione
         import config
         import utils
+        import shader_registry
 
         # --- 1. Preparazione dell'Ambiente ---
         print("1. Preparazione dell'ambiente e delle directory...")
         try:
-            # La pipeline di Blender ha bisogno che la directory di sessione in Tmp
-            # esista per il file JSON, e la directory di Output per i suoi risultati.
-            tmp_session_dir = os.path.dirname(config.BLENDER_SHADER_REGISTRY_TMP)
-            os.makedirs(tmp_session_dir, exist_ok=True)
+            # La pipeline di Blender ha bisogno che la directory Tmp esista per l'indice
+            # del registro shader, e la directory di Output per i suoi risultati.
+            os.makedirs(config.TMP_DIR, exist_ok=True)
             os.makedirs(config.OUTPUT_DIR, exist_ok=True)
-            print(f"  Directory assicurata: {tmp_session_dir}")
+            print(f"  Directory assicurata: {config.TMP_DIR}")
             print(f"  Directory assicurata: {config.OUTPUT_DIR}")
         except Exception as e:
             print(f"ERRORE CRITICO: Impossibile creare le directory necessarie. Dettagli: {e}")
             sys.exit(1)
 
-        # --- 2. Conversione del Registro Shader in JSON ---
-        print("2. Conversione del registro shader in formato JSON...")
+        # --- 2. Compilazione del Registro Shader ---
+        print("2. Compilazione e validazione del registro shader...")
         try:
-            utils.yaml_to_json(
-                config.BLENDER_SHADER_REGISTRY_FILE,
-                config.BLENDER_SHADER_REGISTRY_TMP
-            )
+            if shader_registry.load_compiled_shader_registry() is None:
+                print("ERRORE CRITICO: Registro shader non valido. Interruzione.")
+                sys.exit(1)
         except Exception as e:
-            print(f"ERRORE CRITICO: Impossibile creare il file di registro JSON. Interruzione. Dettagli: {e}")
+            print(f"ERRORE CRITICO: Impossibile compilare il registro shader. Interruzione. Dettagli: {e}")
             sys.exit(1)
 
         # --- 3. Lancio del Sottoprocesso Blender ---
@@ -224,6 +464,8 @@ if __name__ == "__main__":
             "--background",
             "--python", blender_pipeline_script_path
         ]
+        if args.resume_from:
+            command += ["--", "--resume-from", args.resume_from]
 
         try:
             result = subprocess.run(
@@ -0,0 +1,145 @@
+# coding: utf-8
+# blender_service.py
+# Servizio Blender persistente: un solo processo Blender esegue la pipeline per piu' casi di seguito,
+# tenendo in memoria la libreria shader (materiali template) tra un caso e l'altro.
+# Avvio: blender --factory-startup --background --python blender_service.py -- [--jobs-dir <dir>]
+# I job sono file JSON in <jobs-dir>/pending (scritti da main.py con PIPELINE_ORCHESTRATOR = 'SERVICE');
+# il risultato di ogni job viene scritto in <jobs-dir>/done, il log in <jobs-dir>/logs.
+# Per fermare il servizio: creare il file <jobs-dir>/stop.
+import os
+import sys
+import time
+import argparse
+import importlib
+import traceback
+import contextlib
+
+def claim_next_job(jobs_dir):
+    """
+    Prende in carico il job piu' vecchio di pending/ spostandolo in running/ (os.replace e' atomico:
+    un job non viene mai eseguito due volte). Restituisce il percorso del job preso, o None.
+    """
+    pending_dir = os.path.join(jobs_dir, "pending")
+    job_files = sorted((entry for entry in os.scandir(pending_dir) if entry.name.endswith(".json")), key=lambda entry: entry.stat().st_mtime)
+    for entry in job_files:
+        running_path = os.path.join(jobs_dir, "running", entry.name)
+        try:
+            os.replace(entry.path, running_path)
+        except FileNotFoundError:
+            continue # preso nel frattempo da un altro servizio
+        return running_path
+    return None
+
+def ensure_shader_library(loaded_sources):
+    """
+    Mantiene in memoria i materiali template del registro compilato. Se i sorgenti del registro
+    (YAML e Shaders/*.blend) sono cambiati dall'ultimo caricamento, i template vengono ricaricati.
+    Restituisce le impronte dei sorgenti caricati.
+    """
+    import bpy
+    import config
+    import utils
+    import blender_ops
+
+    index = utils.read_json(config.SHADER_REGISTRY_INDEX_FILE)
+    if loaded_sources is not None and index['sources'] != loaded_sources:
+        print("  Registro shader modificato: ricaricamento dei materiali template.")
+        for material in bpy.data.materials:
+            material.use_fake_user = False
+        blender_ops.reset_scene_state()
+    blender_ops.preload_shader_library(index['registry']) # salta i materiali gia' presenti
+    return index['sources']
+
+def run_job(job, log_path):
+    """
+    Esegue la pipeline di Blender per un job, con l'output rediretto nel log del job.
+    CLIENT_ID e PROJECT_SESSION_ID del job vengono passati a config tramite le variabili d'ambiente.
+    Restituisce True se la pipeline arriva in fondo.
+    """
+    import config
+    import blender_ops
+    import blender_pipeline
+
+    os.environ["TAC2AR_CLIENT_ID"] = job['client_id']
+    os.environ["TAC2AR_SESSION_ID"] = job['session_id']
+    importlib.reload(config) # i moduli leggono config.X a ogni uso: i percorsi derivati seguono il nuovo caso
+
+    with open(log_path, 'w', encoding=config.FILE_ENCODING) as log_file, contextlib.redirect_stdout(log_file):
+        print(f"--- Servizio Blender: job '{job['job_id']}' ({job['client_id']}, {job['session_id']}) ---")
+        try:
+            blender_ops.reset_scene_state()
+            return bool(blender_pipeline.execute_blender_pipeline(resume_from=job.get('resume_from')))
+        except Exception as e:
+            print(f"ERRORE CRITICO nella pipeline del job: {e}")
+            traceback.print_exc(file=log_file)
+            return False
+
+def list_job_artifacts(output_dir):
+    """Restituisce i file prodotti dal job nella directory di output del caso (percorsi assoluti)."""
+    if not os.path.isdir(output_dir):
+        return []
+    return sorted(entry.path for entry in os.scandir(output_dir) if entry.is_file())
+
+def serve(jobs_dir):
+    """Ciclo principale del servizio: attende i job in pending/ e li esegue uno alla volta fino al file 'stop'."""
+    import config
+    import utils
+
+    for sub_dir in ("pending", "running", "done", "logs"):
+        os.makedirs(os.path.join(jobs_dir, sub_dir), exist_ok=True)
+    stop_path = os.path.join(jobs_dir, "stop")
+    print(f"--- Servizio Blender in ascolto su: {jobs_dir} (stop: {stop_path}) ---")
+
+    loaded_sources = None
+    while not os.path.exists(stop_path):
+        job_path = claim_next_job(jobs_dir)
+        if job_path is None:
+            time.sleep(config.BLENDER_SERVICE_POLL_SECONDS)
+            continue
+
+        job = utils.read_json(job_path)
+        log_path = os.path.join(jobs_dir, "logs", f"{job['job_id']}.log")
+        print(f"  Job '{job['job_id']}' avviato.")
+        start_time = time.perf_counter()
+        try:
+            loaded_sources = ensure_shader_library(loaded_sources)
+            success = run_job(job, log_path)
+            error = None if success else "pipeline non completata (vedi log)"
+        except Exception as e:
+            traceback.print_exc()
+            success, error = False, str(e)
+
+        result = {
+            'job_id': job['job_id'],
+            'status': 'done' if success else 'failed',
+            'error': error,
+            'output_dir': config.OUTPUT_DIR,
+            'artifacts': list_job_artifacts(config.OUTPUT_DIR),
+            'run_report': config.RUN_REPORT_FILE if os.path.exists(config.RUN_REPORT_FILE) else None,
+            'duration_seconds': round(time.perf_counter() - start_time, 1),
+            'log_file': log_path,
+        }
+        result_path = os.path.join(jobs_dir, "done", f"{job['job_id']}.json")
+        utils.write_json(result, f"{result_path}.tmp")
+        os.replace(f"{result_path}.tmp", result_path) # main.py vede solo risultati completi
+        os.remove(job_path)
+        print(f"  Job '{job['job_id']}' terminato: {result['status']} in {result['duration_seconds']} s.")
+
+    os.remove(stop_path)
+    print("--- Servizio Blender arrestato. ---")
+
+if __name__ == "__main__":
+    # Aggiungi la directory dello script al path di Python per trovare i moduli custom
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    if script_dir not in sys.path:
+        sys.path.append(script_dir)
+
+    import config
+
+    # Gli argomenti del servizio seguono '--' nella riga di comando di Blender
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Servizio Blender persistente della pipeline TAC 2 AR.")
+    parser.add_argument("--jobs-dir", default=config.BLENDER_SERVICE_JOBS_DIR)
+    args = parser.parse_args(argv)
+
+    serve(args.jobs_dir)
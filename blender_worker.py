@@ -0,0 +1,129 @@
+# coding: utf-8
+# blender_worker.py
+# Worker Blender headless per i task parallelizzabili della pipeline.
+# Avvio: blender --factory-startup --background <file.blend> --python blender_worker.py -- --task <bake|export> --task-file <task.json>
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+def launch_workers(blender_executable, blend_path, task, task_files, encoding='utf-8'):
+    """
+    Lancia un worker Blender headless per ogni file di task, tutti in parallelo, e attende la fine di tutti.
+    Ogni worker apre blend_path (un solo file per tutti, o una lista con un file per task) ed esegue 'task'
+    con i parametri del proprio file JSON.
+    Restituisce la lista dei codici di uscita (0 = successo) nello stesso ordine di task_files.
+    """
+    worker_script_path = os.path.abspath(__file__)
+    blend_paths = blend_path if isinstance(blend_path, (list, tuple)) else [blend_path] * len(task_files)
+    processes = []
+    for task_file, blend_path in zip(task_files, blend_paths):
+        command = [
+            blender_executable,
+            "--factory-startup",
+            "--background",
+            blend_path,
+            "--python", worker_script_path,
+            "--",
+            "--task", task,
+            "--task-file", task_file
+        ]
+        print(f"DEBUG: Avvio worker: {' '.join(command)}")
+        processes.append(subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding=encoding))
+
+    results = []
+    for task_file, process in zip(task_files, processes):
+        output, _ = process.communicate()
+        print(f"--- WORKER '{os.path.basename(task_file)}' STDOUT (catturato) ---")
+        print(output)
+        if process.returncode != 0:
+            print(f"ERRORE: Il worker '{os.path.basename(task_file)}' e' terminato con codice {process.returncode}.")
+        results.append(process.returncode)
+    return results
+
+def run_bake_task(task):
+    """
+    Bake di uno shard: applica i modificatori agli oggetti dello shard (la scena e' quella di _01_history.blend)
+    e bake delle texture in task['textures_dir'], con gli stessi nomi dei PNG del bake nel processo principale.
+    """
+    import bpy
+    import config
+    import blender_ops
+
+    blender_ops.setup_blender_environment()
+    if task.get('threads'):
+        bpy.context.scene.render.threads_mode = 'FIXED'
+        bpy.context.scene.render.threads = task['threads']
+        print(f"  Thread di render del worker: {task['threads']}")
+
+    shard_objects = [bpy.data.objects[name] for name in task['objects'] if name in bpy.data.objects]
+    missing = set(task['objects']) - {obj.name for obj in shard_objects}
+    if missing:
+        print(f"ERRORE: Oggetti dello shard non trovati nella scena: {sorted(missing)}")
+        return False
+
+    os.makedirs(task['textures_dir'], exist_ok=True)
+    blender_ops.apply_all_modifiers(shard_objects)
+    if task.get('bake_mode', 'PER_OBJECT').upper() == 'BATCHED':
+        blender_ops.bake_textures_batched(shard_objects, task['textures_dir'], task['texture_size'], config.BLENDER_DEVICE)
+    else:
+        blender_ops.bake_textures(shard_objects, task['textures_dir'], task['texture_size'], config.BLENDER_DEVICE)
+    blender_ops.report_bake_cache_stats()
+    blender_ops.report_image_memory_stats()
+    return True
+
+def run_export_task(task):
+    """
+    Export di un file finale dalla scena aperta (checkpoint 'baked_pbr' per i GLB, 'baked_urp' per l'FBX).
+    task: 'format' ('GLB' o 'FBX'), 'filepath', 'export_options' (GLB) e, per i profili di piattaforma,
+    'profile_name', 'texture_profile' e 'textures_dir'. Il post-processing dei GLB resta al processo principale.
+    """
+    import blender_ops
+
+    imported_meshes, scene_root, _ = blender_ops.restore_pipeline_state_from_scene()
+    if not scene_root:
+        print("ERRORE: Nessun Root trovato nella scena del worker.")
+        return False
+
+    if task['format'].upper() == 'FBX':
+        blender_ops.export_fbx(task['filepath'], [scene_root])
+    else:
+        export_options = dict(task.get('export_options') or {})
+        if task.get('texture_profile'):
+            # la scena del worker viene scartata: nessun ripristino delle immagini originali
+            blender_ops.prepare_texture_export_profile(imported_meshes, task['textures_dir'], task['profile_name'], task['texture_profile'])
+            export_options.update(blender_ops.get_texture_profile_export_options(task['texture_profile']))
+        blender_ops.export_glb(task['filepath'], scene_root, export_options)
+    return os.path.exists(task['filepath'])
+
+WORKER_TASKS = {
+    'bake': run_bake_task,
+    'export': run_export_task,
+}
+
+if __name__ == "__main__":
+    # Aggiungi la directory dello script al path di Python per trovare i moduli custom
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    if script_dir not in sys.path:
+        sys.path.append(script_dir)
+
+    # Gli argomenti del worker seguono '--' nella riga di comando di Blender
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Worker Blender headless della pipeline TAC 2 AR.")
+    parser.add_argument("--task", required=True, choices=sorted(WORKER_TASKS))
+    parser.add_argument("--task-file", required=True)
+    args = parser.parse_args(argv)
+
+    with open(args.task_file, 'r', encoding='utf-8') as f:
+        task_data = json.load(f)
+
+    print(f"--- Worker Blender: task '{args.task}' ({os.path.basename(args.task_file)}) ---")
+    try:
+        success = WORKER_TASKS[args.task](task_data)
+    except Exception as e:
+        import traceback
+        print(f"ERRORE CRITICO nel worker: {e}")
+        traceback.print_exc()
+        success = False
+    sys.exit(0 if success else 1)
@@ -6,15 +6,50 @@ import sys
 # --- IMPOSTAZIONI GENERALI DEL PROGETTO ---
 
 # ID del cliente corrente. Usato per la strutturazione delle directory e i nomi dei file.
-CLIENT_ID = "Client"
+# La variabile d'ambiente TAC2AR_CLIENT_ID, se presente, ha la precedenza (usata dal servizio Blender per ogni job).
+CLIENT_ID = os.environ.get("TAC2AR_CLIENT_ID", "Client")
 
 # ID della sessione del progetto corrente (es. ID scansione paziente). Usato per la strutturazione delle directory e i nomi dei file.
-PROJECT_SESSION_ID = "CASE_001_SCAN_01"
+# La variabile d'ambiente TAC2AR_SESSION_ID, se presente, ha la precedenza.
+PROJECT_SESSION_ID = os.environ.get("TAC2AR_SESSION_ID", "CASE_001_SCAN_01")
 
 # Se True, le directory Tmp e Output della sessione corrente verranno eliminate all'avvio.
 # Impostare a False per il debug o per riesecuzioni parziali senza dover ricopiare i file di input.
 CLEAN_SESSION_ON_START = True
 
+# Orchestratore della pipeline usato da main.py.
+# 'SUBPROCESS': segmentazione e Blender in due interpreti separati, handoff tramite STL e manifest JSON.
+# 'SINGLE_PROCESS': Blender caricato come modulo 'bpy' (pip install bpy, stessa versione di Python di Blender)
+# nello stesso processo della segmentazione; mesh e manifest passano in memoria senza file intermedi.
+# 'SERVICE': segmentazione come 'SUBPROCESS', poi il caso viene accodato a un servizio Blender persistente
+# (blender_service.py, avviato a parte) invece di lanciare un nuovo Blender: niente avvio, enumerazione dei
+# device CUDA e caricamento della libreria shader per ogni caso.
+PIPELINE_ORCHESTRATOR = 'SUBPROCESS'
+
+# Servizio Blender persistente (PIPELINE_ORCHESTRATOR = 'SERVICE'), job scambiati in BLENDER_SERVICE_JOBS_DIR.
+BLENDER_SERVICE_POLL_SECONDS = 1.0 # intervallo di controllo di nuovi job (servizio) e dei risultati (main.py)
+BLENDER_SERVICE_JOB_TIMEOUT_SECONDS = 6 * 3600 # attesa massima di main.py per un job
+
+# Checkpoint (.blend in OUTPUT_DIR) salvati dalla pipeline di Blender: nome -> suffisso del file dopo PROJECT_SESSION_ID.
+CHECKPOINT_FILES = {
+    'history': "_01_history",     # Fase 10: materiali applicati, prima dei modificatori e del bake
+    'baked_pbr': "_02_baked_PBR", # Fase 16: texture PBR collegate, prima dell'export GLB
+    'baked_urp': "_02_baked_URP", # Fase 21: nodi URP collegati, prima dell'export FBX
+}
+# Politica di salvataggio dei checkpoint.
+# 'FULL': .blend non compressi (comportamento storico). 'COMPRESSED': .blend compressi (piu' piccoli, salvataggio piu' lento).
+# 'OFF': nessun checkpoint (con BAKE_SHARDS > 1 'history' viene salvato comunque, serve ai worker).
+CHECKPOINT_POLICY = 'FULL'
+# Checkpoint da salvare (sottoinsieme di CHECKPOINT_FILES).
+CHECKPOINT_NAMES = ['history', 'baked_pbr', 'baked_urp']
+# Fasi da cui la pipeline puo' ripartire (main.py --resume-from <fase>) e checkpoint che riaprono.
+# 'bake': rifa' bake, collegamento texture, LOD ed export. 'export_glb': solo gli export. 'export_fbx': solo l'FBX.
+RESUME_PHASES = {
+    'bake': 'history',
+    'export_glb': 'baked_pbr',
+    'export_fbx': 'baked_urp',
+}
+
 # --- IMPOSTAZIONI SEGMENTATOR ---
 
 # Task/s di segmentazione da eseguire (es. ['total'], ['lung_vessels'], ['tissue_types'], etc.)
@@ -26,19 +61,215 @@ TOTAL_SEGMENTATOR_DEVICE = "gpu"
 
 # --- IMPOSTAZIONI DEL MODELLO E DEL BAKING ---
 
+# Modalita' di importazione delle mesh intermedie in Blender.
+# 'OPERATOR': un bpy.ops.wm.stl_import per file (comportamento storico, predefinito).
+# 'BULK': parsing degli STL in NumPy e creazione diretta dei mesh con foreach_set (un solo link finale).
+MESH_IMPORT_MODE = 'OPERATOR'
+
+# Se True, l'importazione BULK assegna normali custom (media pesata per area delle facce adiacenti).
+MESH_IMPORT_CUSTOM_NORMALS = True
+
 # Distanza massima per la fusione dei vertici (Merge by Distance e dissolve_degenerate).
 MERGE_DISTANCE = 0.0001 # Per merge_vertices_by_distance
 DISSOLVE_DEGENERATE_THRESHOLD = 0.00015 # Per delete_small_features
 
+# Passaggio di pulizia geometrica (Fase 7).
+# 'OPERATOR': catena storica di operatori in edit mode (merge, normali, decimazione, dissolve, smoothing), predefinita.
+# 'BMESH': stessi passi e stesso ordine degli operatori (weld e normali prima della decimazione, dissolve degenerate
+# e normali pesate dopo) in passaggi bmesh per oggetto, senza cambi di modalita'.
+GEOMETRY_PASS_MODE = 'OPERATOR'
+
 # Limite massimo di facce per mesh dopo la decimazione.
 MAX_FACES_PER_MESH = 100000
 
+# Budget globale di triangoli per l'intera scena (limite del dispositivo AR).
+# Se impostato (es. 500000) sostituisce il limite fisso MAX_FACES_PER_MESH: il budget viene distribuito tra gli oggetti
+# e tutte le decimazioni vengono valutate in parallelo dal depsgraph. None = limite fisso per mesh.
+TRIANGLE_BUDGET_TOTAL = None
+# Criterio di distribuzione del budget: 'AREA' (superficie), 'CURVATURE' (superficie pesata per la curvatura), 'PRIORITY' (solo priorita').
+TRIANGLE_BUDGET_STRATEGY = 'AREA'
+# Numero minimo di triangoli garantito a ogni oggetto.
+TRIANGLE_BUDGET_MIN_FACES = 500
+# Moltiplicatore del peso per biological_category (default 1.0 per le categorie non elencate).
+TRIANGLE_BUDGET_CATEGORY_PRIORITY = {
+    'Tumor1': 3.0,
+    'Tumor2': 3.0,
+    'Artery': 1.5,
+    'Vein': 1.5,
+}
+
 # Metodo di smoothing delle normali ('WEIGHTED' o 'AVERAGE').
 NORMAL_SMOOTHING_METHOD = 'WEIGHTED'
 
+# Catene di LOD (livelli di dettaglio), generate dopo il bake: i LOD condividono UV e texture del LOD0.
+# Rapporti di decimazione rispetto al LOD0 per i livelli aggiuntivi: da 1 a 3 valori (2-4 livelli in totale).
+# Tupla vuota = LOD disattivati. Nel GLB le catene vengono scritte con l'estensione MSFT_lod.
+LOD_RATIOS = ()
+# Soglie di copertura dello schermo (MSFT_screencoverage), un valore per livello a partire dal LOD0.
+LOD_SCREEN_COVERAGE = (0.5, 0.25, 0.1, 0.02)
+
+# --- IMPOSTAZIONI ESPORTAZIONE GLB ---
+
+# Profilo di compressione della geometria applicato all'esportazione GLB (chiave di GLB_COMPRESSION_PROFILES).
+# 'NONE' (default) mantiene il GLB storico: non tutti i viewer dei clienti decodificano Draco o meshopt.
+GLB_COMPRESSION_PROFILE = 'NONE'
+# Profili di compressione. 'exporter': parametri passati a bpy.ops.export_scene.gltf (export_draco_*).
+# 'gltfpack': se True il GLB viene riprocessato con gltfpack (KHR_mesh_quantization, riordino vertex-cache/fetch,
+# 'gltfpack_args' aggiuntivi, es. '-cc' per la compressione meshopt EXT_meshopt_compression).
+# gltfpack non legge GLB compressi con Draco: nei profili gltfpack Draco va lasciato disattivato.
+GLB_COMPRESSION_PROFILES = {
+    'NONE': {
+        'exporter': {},
+        'gltfpack': False,
+    },
+    'DRACO': {
+        'exporter': {
+            'export_draco_mesh_compression_enable': True,
+            'export_draco_mesh_compression_level': 6, # 0-10: velocita' di codifica/decodifica vs dimensione
+            'export_draco_position_quantization': 14, # bit
+            'export_draco_normal_quantization': 10,
+            'export_draco_texcoord_quantization': 12,
+            'export_draco_color_quantization': 10,
+            'export_draco_generic_quantization': 12,
+        },
+        'gltfpack': False,
+    },
+    'QUANTIZED': {
+        'exporter': {},
+        'gltfpack': True,
+        'gltfpack_args': [],
+    },
+    'MESHOPT': {
+        'exporter': {},
+        'gltfpack': True,
+        'gltfpack_args': ['-cc'],
+    },
+}
+
+# Throughput di decodifica stimato sul dispositivo di destinazione (MB/s di dati compressi) per la stima dei tempi
+# riportata a fine esportazione. Valori indicativi per un tablet di fascia media: da tarare con misure reali.
+GLB_DECODE_THROUGHPUT_MB_S = {
+    'KHR_draco_mesh_compression': 25.0,
+    'EXT_meshopt_compression': 400.0,
+}
+
+# Profili texture per piattaforma: dallo stesso bake vengono esportati GLB aggiuntivi '{sessione}_processed_{profilo}.glb'.
+# 'max_size': lato massimo delle texture (ridimensionate solo se piu' grandi).
+# 'color_format': formato delle mappe colore sRGB (diffuse): 'JPEG', 'WEBP' (EXT_texture_webp) o 'PNG'.
+# Le mappe dati (normal, roughness, metallic) restano sempre PNG senza perdita.
+# 'quality': qualita' di compressione JPEG/WEBP (0-100). 'webp_fallback': aggiunge una copia PNG per i client senza WebP.
+TEXTURE_EXPORT_PROFILES = {
+    'tablet': {'max_size': 1024, 'color_format': 'JPEG', 'quality': 85},
+    'headset': {'max_size': 2048, 'color_format': 'WEBP', 'quality': 90, 'webp_fallback': False},
+    'desktop': {'max_size': 4096, 'color_format': 'PNG', 'quality': 100},
+}
+# Profili da esportare a ogni esecuzione (lista vuota = solo il GLB standard, default), es. ['tablet', 'headset'].
+TEXTURE_EXPORT_PROFILE_NAMES = []
+
+# Esecuzione degli export finali (GLB, GLB per profilo di piattaforma, FBX).
+# 'SEQUENTIAL': nel processo della pipeline, uno dopo l'altro (comportamento storico).
+# 'PARALLEL': nella Fase 22, un worker Blender headless per export, tutti in contemporanea; i GLB riaprono il
+# checkpoint 'baked_pbr', l'FBX 'baked_urp' (salvati comunque, indipendentemente da CHECKPOINT_POLICY).
+EXPORT_MODE = 'SEQUENTIAL'
+
+# Caricamento dei materiali template dagli shader .blend (Fase 9).
+# 'APPEND': un bpy.ops.wm.append per materiale (comportamento storico, predefinito; porta in scena anche i proiettori).
+# 'LIBRARIES': bpy.data.libraries.load, ogni file aperto una sola volta per tutti i suoi materiali, solo i materiali.
+# 'CONSOLIDATED': come 'LIBRARIES', ma da un'unica libreria generata dal registro (SHADER_LIBRARY_FILE), ricostruita se obsoleta.
+MATERIAL_LOADER = 'APPEND'
+
+# Validazione del registro shader contro i materiali effettivamente presenti in Shaders/*.blend (shader_registry.py).
+# L'indice compilato (SHADER_REGISTRY_INDEX_FILE) viene riusato finche' registro e file .blend non cambiano.
+# True: un errore di validazione (file o materiale mancante, categoria senza shader_ref) interrompe la pipeline
+# prima della segmentazione. False: gli errori vengono solo segnalati.
+SHADER_REGISTRY_STRICT = True
+
+# Motore di unwrapping UV (Fase 8).
+# 'SMART_PROJECT': bpy.ops.uv.smart_project in edit mode, un oggetto alla volta (comportamento storico).
+# 'BOX_CHARTS': proiezione box con crescita delle chart e packing a scaffali su array NumPy, in un pool di processi.
+# Produce poche isole grandi (meno vertici duplicati sulle cuciture all'export).
+UV_UNWRAP_ENGINE = 'SMART_PROJECT'
+# Margine tra le isole UV per 'BOX_CHARTS' (frazione dello spazio UV).
+UV_ISLAND_MARGIN = 0.02
+# Numero di processi per l'unwrapping (None = numero di CPU).
+UV_UNWRAP_WORKERS = None
+
+# Criterio per la risoluzione delle texture per oggetto.
+# 'FIXED': tutte le texture a TEXTURE_SIZE.
+# 'TEXEL_DENSITY': lato = potenza di due piu' vicina a TEXELS_PER_MM * sqrt(superficie_mm2 / copertura_UV),
+# limitata a [MIN_SIZE, MAX_SIZE]; la dimensione scelta viene registrata nel manifest arricchito.
+TEXTURE_SIZE_MODE = 'FIXED'
+TEXEL_DENSITY_TEXELS_PER_MM = 2.0
+TEXEL_DENSITY_MIN_SIZE = 256
+TEXEL_DENSITY_MAX_SIZE = 4096
+
+# Modalita' texture: 'PER_OBJECT' (un materiale e un set di texture per oggetto) o 'ATLAS'.
+# 'ATLAS': le isole UV degli oggetti con lo stesso shader vengono impacchettate in atlanti condivisi prima del bake,
+# ogni atlante viene bakato una sola volta per canale e gli oggetti esportati con un unico materiale (meno draw call e texture).
+TEXTURE_ATLAS_MODE = 'PER_OBJECT'
+# Numero massimo di oggetti per atlante (oltre, il gruppo viene diviso in piu' atlanti).
+ATLAS_MAX_OBJECTS = 16
+# Dimensione delle texture di atlante (larghezza e altezza in pixel).
+ATLAS_TEXTURE_SIZE = 2048
+# Margine tra le isole UV nell'atlante (frazione dello spazio UV).
+ATLAS_ISLAND_MARGIN = 0.004
+
+# Motore di channel packing per le mappe metallic (PBR) e MetallicSmoothness (URP), generate insieme in un solo passaggio.
+# 'NUMPY': buffer float32 letti/scritti con foreach_get/foreach_set dentro Blender.
+# 'POOL': PNG elaborati con Pillow in un pool di processi (Pillow deve essere installato nel Python di Blender).
+CHANNEL_PACKING_ENGINE = 'NUMPY'
+# Numero di processi del pool (None = numero di CPU).
+CHANNEL_PACKING_WORKERS = None
+
 # Dimensione delle texture generate (larghezza e altezza in pixel).
 TEXTURE_SIZE = 1024
 
+# Modalita' di bake per oggetto (con TEXTURE_ATLAS_MODE = 'PER_OBJECT').
+# 'PER_OBJECT': un bake per oggetto e per canale (comportamento storico, predefinito).
+# 'BATCHED': tutti gli oggetti selezionati insieme, un solo bake per canale con dati di render persistenti
+# (una sola sincronizzazione della scena Cycles per canale). Stessi nodi, immagini e PNG per oggetto di 'PER_OBJECT'.
+BAKE_MODE = 'PER_OBJECT'
+
+# Numero di worker Blender headless per il bake (1 = bake nel processo della pipeline).
+# Con valori > 1 gli oggetti vengono divisi in shard bilanciati per numero di facce; ogni worker riapre
+# _01_history.blend, applica i modificatori e bake il proprio shard in TEXTURES_DIR (utile sui nodi solo CPU).
+BAKE_SHARDS = 1
+# Thread Cycles per worker (None = CPU disponibili divise per il numero di shard).
+BAKE_WORKER_THREADS = None
+
+# Modalita' della pipeline di Blender.
+# 'TEXTURED': UV, bake delle texture PBR, GLB e FBX (comportamento standard).
+# 'VERTEX_COLOR': revisione anatomica rapida. Il Base Color di ogni materiale (color_override compreso) diventa
+# un colore per vertice, roughness e metallic restano fattori costanti. Niente UV (Fase 8), bake e texture
+# (Fasi 12-19) ne' FBX: solo il GLB, in una frazione del tempo.
+BLENDER_PIPELINE_MODE = 'TEXTURED'
+VERTEX_COLOR_ROUGHNESS = 0.6 # usata se la roughness del materiale non e' costante
+VERTEX_COLOR_METALLIC = 0.0
+
+# Profilo di qualita' del bake: campioni Cycles, campionamento adattivo e margine di dilatazione.
+# 'legacy': impostazioni di fabbrica di Cycles (4096 campioni), comportamento storico e predefinito.
+# 'draft': anteprime veloci. 'standard': consegne ordinarie. 'final': massima qualita'.
+# Passare a un altro profilo solo dopo aver confrontato le texture con quelle di 'legacy'.
+BAKE_PROFILE = 'legacy'
+BAKE_PROFILES = {
+    'legacy':   {'samples': 4096, 'use_adaptive_sampling': True,  'adaptive_threshold': 0.01, 'margin': 8},
+    'draft':    {'samples': 4,    'use_adaptive_sampling': False, 'adaptive_threshold': 0.1,  'margin': 4},
+    'standard': {'samples': 64,   'use_adaptive_sampling': True,  'adaptive_threshold': 0.05, 'margin': 8},
+    'final':    {'samples': 512,  'use_adaptive_sampling': True,  'adaptive_threshold': 0.01, 'margin': 16},
+}
+
+# Canali cotti con la scorciatoia Emission: l'ingresso del Principled BSDF viene collegato temporaneamente
+# a uno shader Emission e cotto come EMIT con 1 campione (pura valutazione dello shader, niente path tracing).
+# I materiali senza Principled BSDF usano il bake normale. Lista vuota = sempre bake normale (predefinito).
+# Esempio: ['diffuse', 'roughness'].
+BAKE_EMISSION_CHANNELS = []
+
+# Analisi dei nodi prima del bake: i canali costanti (Base Color o Roughness non collegati o da nodi RGB/Value,
+# Normal non collegata) non vengono cotti ma esportati come fattori del materiale glTF/FBX, senza le mappe
+# di metalness derivate. I canali saltati sono registrati nel manifest arricchito ('constant_channels').
+# Predefinito False (tutti i canali cotti, comportamento storico): attivare dopo aver confrontato gli export.
+BAKE_SKIP_CONSTANT_CHANNELS = False
+
 # Device da usare per il bake ('gpu' o 'cpu').
 BLENDER_DEVICE="gpu"
 
@@ -63,8 +294,9 @@ TEXTURES_DIR_NAME = "Textures"
 OUTPUT_DIR_NAME = "Output"
 SEGMENT_MAPPINGS_FILE_NAME = "segmentMappings.yaml"
 BLENDER_SHADER_REGISTRY_FILE_NAME = "blender_shader_registry.yaml" # assegnazione dei materiali
-BLENDER_SHADER_REGISTRY_TMP_NAME = "blender_shader_registry.json" # file intermedio per non chiamare readYaml dalla blender_pipeline
+SHADER_REGISTRY_INDEX_FILE_NAME = "shader_registry_index.json" # registro shader compilato e validato, letto dalla blender_pipeline
 SEGMENTS_DATA_FILE_NAME = "segments_data_manifest.json"
+RUN_REPORT_FILE_NAME = "run_report.json" # esiti e dimensioni degli export della run
 OUTPUT_SUFFIX = "_processed"
 EXTENSION_PBR = "glb"
 EXTENSION_URP = "fbx"
@@ -80,6 +312,8 @@ NII_RAW_DIR = os.path.join(TMP_DIR, CLIENT_ID, PROJECT_SESSION_ID, NII_RAW_DIR_N
 NII_SEGMENTED_DIR = os.path.join(TMP_DIR, CLIENT_ID, PROJECT_SESSION_ID, NII_SEGMENTED_DIR_NAME)
 INPUT_MESH_DIR = os.path.join(TMP_DIR, CLIENT_ID, PROJECT_SESSION_ID, INPUT_MESH_DIR_NAME)
 SHADERS_DIR = os.path.join(PROJECT_ROOT_DIR, SHADERS_DIR_NAME)
+SHADER_LIBRARY_FILE = os.path.join(TMP_DIR, "shader_library.blend") # libreria consolidata (MATERIAL_LOADER = 'CONSOLIDATED')
+BLENDER_SERVICE_JOBS_DIR = os.path.join(TMP_DIR, "blender_service") # pending/ running/ done/ logs/ del servizio Blender
 
 # Make OUTPUT_DIR and TEXTURES_DIR absolute paths
 OUTPUT_BASE_DIR = os.path.join(PROJECT_ROOT_DIR, OUTPUT_DIR_NAME) # New base for output
@@ -87,8 +321,9 @@ OUTPUT_DIR = os.path.join(PROJECT_ROOT_DIR, OUTPUT_DIR_NAME, CLIENT_ID, PROJECT_
 TEXTURES_DIR = os.path.join(OUTPUT_DIR, TEXTURES_DIR_NAME)
 SEGMENT_MAPPINGS_FILE = os.path.join(PROJECT_ROOT_DIR, SEGMENT_MAPPINGS_FILE_NAME)
 BLENDER_SHADER_REGISTRY_FILE = os.path.join(PROJECT_ROOT_DIR, BLENDER_SHADER_REGISTRY_FILE_NAME)
-BLENDER_SHADER_REGISTRY_TMP = os.path.join(TMP_DIR, CLIENT_ID, PROJECT_SESSION_ID, BLENDER_SHADER_REGISTRY_TMP_NAME)
+SHADER_REGISTRY_INDEX_FILE = os.path.join(TMP_DIR, SHADER_REGISTRY_INDEX_FILE_NAME) # condiviso tra le sessioni
 SEGMENTS_DATA_MANIFEST_FILE = os.path.join(OUTPUT_DIR, SEGMENTS_DATA_FILE_NAME)
+RUN_REPORT_FILE = os.path.join(OUTPUT_DIR, RUN_REPORT_FILE_NAME)
 # Nomi dei file di output finali
 PBR_FILENAME = f"{PROJECT_SESSION_ID}{OUTPUT_SUFFIX}.{EXTENSION_PBR}" # Esempio: CASE_001_SCAN_01_processed.glb
 URP_FILENAME = f"{PROJECT_SESSION_ID}{OUTPUT_SUFFIX}.{EXTENSION_URP}" # Esempio: CASE_001_SCAN_01_processed.fbx
@@ -100,6 +335,31 @@ BLENDER_EXECUTABLE = os.path.join(BLENDER_INSTALL_ROOT, "blender.exe")
 BLENDER_PYTHON_DIR = "4.5\\python\\bin"
 BLENDER_DEVICE = "GPU" # Device for baking ('CPU', 'CUDA', 'OPTIX')
 
+# --- PERCORSI STRUMENTI ESTERNI ---
+
+# Eseguibile di gltfpack (meshoptimizer), usato dai profili di compressione con 'gltfpack': True.
+# Se non presente il passaggio viene saltato con un avviso e resta il GLB esportato da Blender.
+GLTFPACK_EXECUTABLE = os.path.join(PROJECT_ROOT_DIR, "Tools", "gltfpack.exe")
+
+# --- CACHE DEI BAKE ---
+
+# Cache dei PNG bakati, indicizzata per hash di geometria, UV, materiale sorgente, color_override, canale,
+# dimensione e impostazioni di bake: le riesecuzioni copiano i PNG invece di rilanciare Cycles.
+BAKE_CACHE_ENABLED = True
+BAKE_CACHE_DIR = os.path.join(PROJECT_ROOT_DIR, "BakeCache")
+# Dimensione massima della cache: oltre, vengono eliminati i PNG usati meno di recente (LRU).
+BAKE_CACHE_MAX_BYTES = 4 * 1024 * 1024 * 1024
+
+# --- MEMORIA DELLE IMMAGINI ---
+
+# Le immagini cotte e le mappe derivate liberano i buffer dei pixel appena salvate e vengono ricaricate dal PNG
+# solo quando servono. Tetto in MB dei pixel residenti: il bake BATCHED viene diviso in piu' chiamate in modo che
+# le immagini create da ciascuna restino sotto il tetto (l'atlante crea una sola immagine per canale e non viene
+# diviso); oltre il tetto vengono liberati anche i buffer delle altre immagini salvate, dalle piu' grandi.
+# None = nessun tetto (un solo bake per canale, comportamento storico e predefinito). Il picco viene riportato
+# nel log e nel report della run. Esempio: 2048.
+IMAGE_MEMORY_CAP_MB = None
+
 # --- PERCORSI TOTAL SEGMENTATOR ---
 
 TOTAL_SEGMENTATOR_INSTALL_DIR = os.path.join(os.path.dirname(sys.executable), "..", "Lib", "site-packages", "totalsegmentator") # Se installato tramite pip
@@ -0,0 +1,186 @@
+# coding: utf-8
+# glb_ops.py
+# Operazioni sui file .glb esportati, senza dipendenze da Blender (solo libreria standard).
+
+import json
+import os
+import struct
+import subprocess
+
+GLB_MAGIC = 0x46546C67 # 'glTF'
+GLB_CHUNK_JSON = 0x4E4F534A # 'JSON'
+GLB_CHUNK_BIN = 0x004E4942 # 'BIN\0'
+
+def read_glb(filepath):
+    """
+    Reads a binary glTF container.
+    Returns (gltf_json, bin_chunk): the parsed JSON dictionary and the raw BIN chunk bytes (or None).
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read()
+
+    magic, version, length = struct.unpack_from('<III', data, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise ValueError(f"'{filepath}' is not a glTF 2.0 binary file.")
+
+    gltf_json = None
+    bin_chunk = None
+    offset = 12
+    while offset < min(length, len(data)):
+        chunk_length, chunk_type = struct.unpack_from('<II', data, offset)
+        chunk_data = data[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == GLB_CHUNK_JSON:
+            gltf_json = json.loads(chunk_data.decode('utf-8'))
+        elif chunk_type == GLB_CHUNK_BIN:
+            bin_chunk = chunk_data
+        offset += 8 + chunk_length
+
+    if gltf_json is None:
+        raise ValueError(f"'{filepath}' has no JSON chunk.")
+    return gltf_json, bin_chunk
+
+def write_glb(filepath, gltf_json, bin_chunk=None):
+    """Writes a binary glTF container, padding chunks to 4 bytes as required by the spec."""
+    json_bytes = json.dumps(gltf_json, separators=(',', ':')).encode('utf-8')
+    json_bytes += b' ' * (-len(json_bytes) % 4)
+    chunks = [struct.pack('<II', len(json_bytes), GLB_CHUNK_JSON) + json_bytes]
+    if bin_chunk:
+        bin_bytes = bin_chunk + b'\0' * (-len(bin_chunk) % 4)
+        chunks.append(struct.pack('<II', len(bin_bytes), GLB_CHUNK_BIN) + bin_bytes)
+
+    body = b''.join(chunks)
+    with open(filepath, 'wb') as f:
+        f.write(struct.pack('<III', GLB_MAGIC, 2, 12 + len(body)))
+        f.write(body)
+
+def apply_msft_lod_extension(filepath):
+    """
+    Converts the LOD node convention written by blender_ops.generate_lod_chains into the MSFT_lod extension.
+    Nodes carrying the extras 'lod_group'/'lod_level' are grouped; the LOD0 node gets
+    extensions.MSFT_lod.ids (LOD1..n) and extras.MSFT_screencoverage, and the LOD1..n nodes are
+    detached from the scene hierarchy so that clients without MSFT_lod only render LOD0.
+    Returns the number of LOD chains written.
+    """
+    gltf_json, bin_chunk = read_glb(filepath)
+    nodes = gltf_json.get('nodes', [])
+
+    groups = {}
+    for index, node in enumerate(nodes):
+        extras = node.get('extras') or {}
+        if 'lod_group' in extras and 'lod_level' in extras:
+            groups.setdefault(extras['lod_group'], {})[int(extras['lod_level'])] = index
+
+    detached = set()
+    chain_count = 0
+    for levels in groups.values():
+        if 0 not in levels or len(levels) < 2:
+            continue
+        ordered = [levels[level] for level in sorted(levels)]
+        base_node = nodes[ordered[0]]
+        base_node.setdefault('extensions', {})['MSFT_lod'] = {'ids': ordered[1:]}
+        coverage = [(nodes[i].get('extras') or {}).get('lod_screen_coverage') for i in ordered]
+        if all(value is not None for value in coverage):
+            base_node.setdefault('extras', {})['MSFT_screencoverage'] = coverage
+        detached.update(ordered[1:])
+        chain_count += 1
+
+    if not chain_count:
+        return 0
+
+    for node in nodes:
+        if 'children' in node:
+            node['children'] = [child for child in node['children'] if child not in detached]
+            if not node['children']:
+                del node['children']
+    for scene in gltf_json.get('scenes', []):
+        if 'nodes' in scene:
+            scene['nodes'] = [n for n in scene['nodes'] if n not in detached]
+
+    extensions_used = gltf_json.setdefault('extensionsUsed', [])
+    if 'MSFT_lod' not in extensions_used:
+        extensions_used.append('MSFT_lod')
+
+    write_glb(filepath, gltf_json, bin_chunk)
+    return chain_count
+
+def run_gltfpack(filepath, gltfpack_executable, extra_args=None):
+    """
+    Re-packs a GLB in place with gltfpack: KHR_mesh_quantization plus vertex-cache and vertex-fetch reordering,
+    keeping node names, materials and extras (needed by the MSFT_lod step). extra_args are appended as-is
+    (e.g. ['-cc'] for EXT_meshopt_compression).
+    Returns True on success; a missing executable is reported and the original file is left untouched.
+    """
+    if not gltfpack_executable or not os.path.exists(gltfpack_executable):
+        print(f"  WARNING: gltfpack not found at '{gltfpack_executable}'. Skipping quantization/reordering.")
+        return False
+
+    packed_path = f"{os.path.splitext(filepath)[0]}.gltfpack.glb"
+    command = [gltfpack_executable, "-i", filepath, "-o", packed_path, "-kn", "-km", "-ke"] + list(extra_args or [])
+    print(f"  Running gltfpack: {' '.join(command)}")
+    try:
+        subprocess.run(command, check=True, text=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        print(f"  ERROR: gltfpack failed with exit code {e.returncode}: {e.stderr}")
+        if os.path.exists(packed_path):
+            os.remove(packed_path)
+        return False
+
+    os.replace(packed_path, filepath)
+    return True
+
+def summarize_glb(filepath, decode_throughput_mb_s=None):
+    """
+    Size report of an exported GLB: file, JSON and BIN sizes, triangle count, compressed geometry bytes per
+    extension and an estimated decode time (compressed bytes / decode_throughput_mb_s[extension]).
+    estimated_decode_ms is None when the GLB has no compressed geometry with a known throughput.
+    """
+    gltf_json, bin_chunk = read_glb(filepath)
+    accessors = gltf_json.get('accessors', [])
+    buffer_views = gltf_json.get('bufferViews', [])
+    decode_throughput_mb_s = decode_throughput_mb_s or {}
+
+    triangles = 0
+    compressed_bytes = {}
+    for mesh in gltf_json.get('meshes', []):
+        for primitive in mesh.get('primitives', []):
+            if primitive.get('mode', 4) != 4:
+                continue
+            if 'indices' in primitive:
+                triangles += accessors[primitive['indices']]['count'] // 3
+            elif 'POSITION' in primitive.get('attributes', {}):
+                triangles += accessors[primitive['attributes']['POSITION']]['count'] // 3
+            draco = primitive.get('extensions', {}).get('KHR_draco_mesh_compression')
+            if draco:
+                view = buffer_views[draco['bufferView']]
+                compressed_bytes['KHR_draco_mesh_compression'] = compressed_bytes.get('KHR_draco_mesh_compression', 0) + view['byteLength']
+    for view in buffer_views:
+        meshopt = view.get('extensions', {}).get('EXT_meshopt_compression')
+        if meshopt:
+            compressed_bytes['EXT_meshopt_compression'] = compressed_bytes.get('EXT_meshopt_compression', 0) + meshopt['byteLength']
+
+    decode_ms = None
+    for extension, byte_count in compressed_bytes.items():
+        throughput = decode_throughput_mb_s.get(extension)
+        if throughput:
+            decode_ms = (decode_ms or 0.0) + byte_count / (throughput * 1024 * 1024) * 1000.0
+
+    return {
+        'file_bytes': os.path.getsize(filepath),
+        'bin_bytes': len(bin_chunk) if bin_chunk else 0,
+        'triangles': triangles,
+        'extensions_used': gltf_json.get('extensionsUsed', []),
+        'compressed_bytes': compressed_bytes,
+        'estimated_decode_ms': round(decode_ms, 1) if decode_ms is not None else None,
+    }
+
+def postprocess_glb(filepath, compression_profile, gltfpack_executable=None, apply_lod=False, decode_throughput_mb_s=None):
+    """
+    Post-export steps shared by every GLB variant: optional gltfpack re-pack (profile 'gltfpack'),
+    MSFT_lod patch when the scene has LOD chains, then the size/decode report (see summarize_glb).
+    """
+    if compression_profile.get('gltfpack'):
+        run_gltfpack(filepath, gltfpack_executable, compression_profile.get('gltfpack_args'))
+    if apply_lod:
+        lod_chain_count = apply_msft_lod_extension(filepath)
+        print(f"  MSFT_lod extension written for {lod_chain_count} LOD chains.")
+    return summarize_glb(filepath, decode_throughput_mb_s)
@@ -2,19 +2,181 @@
 # main.py
 import os
 import sys
+import time
+import argparse
 import subprocess
+import traceback
 import config
 import utils
+import shader_registry
 
 print("DEBUG: main.py avviato (prima del logging).")
 
+def run_segmentation_subprocess(script_dir):
+    """Lancia segmentator_pipeline.py nell'interprete della VENV. Esce con codice 1 in caso di errore."""
+    print("--- FASE 1: Avvio Pipeline di Segmentazione ---")
+    segmentation_script_path = os.path.join(script_dir, "segmentator_pipeline.py")
+    python_executable = os.path.join(sys.prefix, 'Scripts', 'python.exe')
+    if not os.path.exists(python_executable):
+        print(f"Errore: Eseguibile Python (della VENV) non trovato in '{python_executable}'.")
+        sys.exit(1)
+
+    try:
+        print(f"DEBUG: Esecuzione di {python_executable} {segmentation_script_path}")
+        result = subprocess.run(
+            [python_executable, segmentation_script_path],
+            check=True,
+            text=True,
+            capture_output=True,
+            encoding=config.FILE_ENCODING
+            )
+        print("Pipeline di segmentazione completata con successo.\n")
+        print("--- SEGMENTATION STDOUT (catturato) ---")
+        print(result.stdout)
+        if result.stderr:
+            print("--- SEGMENTATION STDERR (catturato) ---")
+            print(result.stderr)
+    except subprocess.CalledProcessError as e:
+        print(f"ERRORE CRITICO durante la pipeline di segmentazione. Codice di uscita: {e.returncode}")
+        print(f"--- SEGMENTATION STDOUT (catturato) ---")
+        print(e.stdout)
+        if e.stderr:
+            print(f"--- SEGMENTATION STDERR (catturato) ---")
+            print(e.stderr)
+        sys.exit(1)
+    except FileNotFoundError:
+        print(f"ERRORE: Lo script di segmentazione non e' stato trovato in '{segmentation_script_path}'.")
+        sys.exit(1)
+    except Exception as e:
+        print(f"ERRORE INATTESO durante il lancio della segmentazione: {e}")
+        traceback.print_exc()
+        sys.exit(1)
+
+def compile_shader_registry():
+    """Compila e valida il registro shader prima di ogni altra fase. Esce con codice 1 se il registro non e' valido."""
+    print("--- PREPARAZIONE: Compilazione e validazione del registro shader ---")
+    try:
+        blender_shader_registry = shader_registry.load_compiled_shader_registry()
+    except Exception as e:
+        print(f"ERRORE CRITICO durante la compilazione del registro shader: {e}")
+        sys.exit(1)
+    if blender_shader_registry is None:
+        print(f"ERRORE CRITICO: Registro shader non valido. Correggi '{config.BLENDER_SHADER_REGISTRY_FILE}' (o imposta SHADER_REGISTRY_STRICT = False).")
+        sys.exit(1)
+
+def run_blender_subprocess(script_dir, resume_from=None):
+    """
+    Lancia blender_pipeline.py in Blender headless. Esce con codice 1 in caso di errore.
+    resume_from (chiave di config.RESUME_PHASES) fa ripartire la pipeline dal checkpoint corrispondente.
+    """
+    print("\n--- FASE 2: Avvio della Pipeline di Blender ---")
+    blender_pipeline_script_path = os.path.join(script_dir, "blender_pipeline.py")
+    blender_executable = config.BLENDER_EXECUTABLE
+    if not os.path.exists(blender_pipeline_script_path):
+        print(f"ERRORE: Script Blender Pipeline non trovato in: '{blender_pipeline_script_path}'.")
+        sys.exit(1)
+    if not os.path.exists(blender_executable):
+        print(f"Errore: Eseguibile di Blender non trovato in '{blender_executable}'.")
+        sys.exit(1)
+
+    # Comando esecuzione Blender con --background e --factory-startup
+    command = [
+        blender_executable,
+        "--factory-startup",
+        "--background",
+        "--python", blender_pipeline_script_path
+        ]
+    if resume_from:
+        command += ["--", "--resume-from", resume_from]
+    try:
+        print(f"DEBUG: Esecuzione di: {' '.join(command)}")
+        result = subprocess.run(
+            command,
+            check=True,
+            text=True,
+            capture_output=True,
+            encoding=config.FILE_ENCODING
+            )
+
+        print("--- BLENDER STDOUT (catturato) ---")
+        print (result.stdout)
+        if result.stderr:
+            print("\n--- OUTPUT PIPELINE BLENDER (stderr catturato) ---")
+            print(result.stderr)
+
+        print("\n--- FASE 2: Pipeline Blender COMPLETATA con successo. ---")
+
+    except subprocess.CalledProcessError as e: # Cattura il fallimento di Blender
+        print(f"ERRORE CRITICO durante la pipeline di Blender. Codice di uscita: {e.returncode}")
+        print(f"--- BLENDER STDOUT (catturato) ---")
+        print(e.stdout)
+        if e.stderr:
+            print(f"--- BLENDER STDERR (catturato) ---")
+            print(e.stderr)
+        sys.exit(1)
+    except FileNotFoundError: # Aggiunto per un controllo piu' specifico se lo script non e' trovato
+        print(f"ERRORE: L'eseguibile di Blender o lo script della pipeline non sono stati trovati.")
+        sys.exit(1)
+    except Exception as e:
+        print(f"ERRORE INATTESO durante il lancio di Blender: {e}")
+        traceback.print_exc()
+        sys.exit(1)
+
+def run_blender_service_job(resume_from=None):
+    """
+    Accoda il caso al servizio Blender persistente (blender_service.py) invece di lanciare Blender,
+    attende il risultato e ne riporta il log. Esce con codice 1 in caso di errore o timeout.
+    """
+    print("\n--- FASE 2: Pipeline di Blender sul servizio persistente ---")
+    job_id = f"{config.CLIENT_ID}_{config.PROJECT_SESSION_ID}_{time.strftime('%Y%m%d_%H%M%S')}"
+    pending_dir = os.path.join(config.BLENDER_SERVICE_JOBS_DIR, "pending")
+    result_path = os.path.join(config.BLENDER_SERVICE_JOBS_DIR, "done", f"{job_id}.json")
+    os.makedirs(pending_dir, exist_ok=True)
+
+    job = {'job_id': job_id, 'client_id': config.CLIENT_ID, 'session_id': config.PROJECT_SESSION_ID, 'resume_from': resume_from}
+    job_path = os.path.join(pending_dir, f"{job_id}.json")
+    utils.write_json(job, f"{job_path}.tmp")
+    os.replace(f"{job_path}.tmp", job_path) # il servizio vede solo job completi
+    print(f"  Job '{job_id}' accodato in: {pending_dir}")
+
+    deadline = time.time() + config.BLENDER_SERVICE_JOB_TIMEOUT_SECONDS
+    while not os.path.exists(result_path):
+        if time.time() > deadline:
+            print(f"ERRORE CRITICO: Nessun risultato dal servizio Blender per il job '{job_id}' entro {config.BLENDER_SERVICE_JOB_TIMEOUT_SECONDS} s. Il servizio e' avviato?")
+            sys.exit(1)
+        time.sleep(config.BLENDER_SERVICE_POLL_SECONDS)
+
+    result = utils.read_json(result_path)
+    if result.get('log_file') and os.path.exists(result['log_file']):
+        print("--- BLENDER SERVICE STDOUT (job) ---")
+        with open(result['log_file'], 'r', encoding=config.FILE_ENCODING) as f:
+            print(f.read())
+    if result.get('status') != 'done':
+        print(f"ERRORE CRITICO durante la pipeline di Blender sul servizio: {result.get('error', 'pipeline non completata')}")
+        sys.exit(1)
+    print(f"  Artefatti del job ({result['duration_seconds']} s): {result['artifacts']}")
+    print("\n--- FASE 2: Pipeline Blender COMPLETATA con successo (servizio). ---")
+
+def run_single_process(resume_from=None):
+    """Esegue segmentazione e Blender (bpy come modulo) nello stesso processo. Esce con codice 1 in caso di errore."""
+    print("--- Orchestratore SINGLE_PROCESS: segmentazione e Blender nello stesso interprete ---")
+    import single_process_pipeline
+    if not single_process_pipeline.execute_single_process_pipeline(resume_from):
+        print("ERRORE CRITICO durante la pipeline single-process.")
+        sys.exit(1)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline TAC 2 AR: segmentazione e pipeline di Blender.")
+    parser.add_argument("--resume-from", choices=sorted(config.RESUME_PHASES), default=None,
+                        help="Salta la segmentazione e riprende la pipeline di Blender dal checkpoint della fase indicata.")
+    args = parser.parse_args()
+
     script_dir = os.path.dirname(os.path.abspath(__file__))
     log_file_path = os.path.join(script_dir, 'pipeline.log')
     # Salva i riferimenti a stdout e stderr originali prima di qualsiasi reindirizzamento
     original_stdout = sys.stdout
     original_stderr = sys.stderr
-    
+
     # Stampa un messaggio sulla console originale prima di reindirizzare
     print(f"L'output completo verra salvato in: {log_file_path}")
 
@@ -27,107 +189,20 @@ if __name__ == "__main__":
             print(f"DEBUG: Logging reindirizzato al file {log_file_path}")
 
             print("\n--- Avvio Pipeline ---\n")
-            # --- 1. ESEGUI LA PIPELINE DI SEGMENTAZIONE ---
-            print("--- FASE 1: Avvio Pipeline di Segmentazione ---")
-            segmentation_script_path = os.path.join(script_dir, "segmentator_pipeline.py")
-            python_executable = os.path.join(sys.prefix, 'Scripts', 'python.exe')
-            if not os.path.exists(python_executable):
-                print(f"Errore: Eseguibile Python (della VENV) non trovato in '{python_executable}'.")
-                sys.exit(1)
-            
-            try:
-                print(f"DEBUG: Esecuzione di {python_executable} {segmentation_script_path}")
-                result = subprocess.run(
-                    [python_executable, segmentation_script_path],
-                    check=True,
-                    text=True,
-                    capture_output=True,
-                    encoding=config.FILE_ENCODING
-                    )
-                print("Pipeline di segmentazione completata con successo.\n")
-                print("--- SEGMENTATION STDOUT (catturato) ---")
-                print(result.stdout)
-                if result.stderr:
-                    print("--- SEGMENTATION STDERR (catturato) ---")
-                    print(result.stderr)
-            except subprocess.CalledProcessError as e:
-                print(f"ERRORE CRITICO durante la pipeline di segmentazione. Codice di uscita: {e.returncode}")
-                print(f"--- SEGMENTATION STDOUT (catturato) ---")
-                print(e.stdout)
-                if e.stderr:
-                    print(f"--- SEGMENTATION STDERR (catturato) ---")
-                    print(e.stderr)
-                sys.exit(1)
-            except FileNotFoundError:
-                print(f"ERRORE: Lo script di segmentazione non e' stato trovato in '{segmentation_script_path}'.")
-                sys.exit(1)
-            except Exception as e:
-                print(f"ERRORE INATTESO durante il lancio della segmentazione: {e}")
-                import traceback
-                traceback.print_exc()
-                sys.exit(1)
-
-            print("\n--- PREPARAZIONE PER BLENDER: Conversione del registro shader in formato JSON ---")
-            try:
-                utils.yaml_to_json(config.BLENDER_SHADER_REGISTRY_FILE, config.BLENDER_SHADER_REGISTRY_TMP)
-            except Exception as e:
-                print(f"ERRORE CRITICO durante la conversione del registro shader: {e}")
-                sys.exit(1)
-
-
-            # --- 2. ESEGUI LA PIPELINE DI BLENDER ---
-            print("\n--- FASE 2: Avvio della Pipeline di Blender ---")
-            blender_pipeline_script_path = os.path.join(script_dir, "blender_pipeline.py")
-            blender_executable = config.BLENDER_EXECUTABLE
-            if not os.path.exists(blender_pipeline_script_path):
-                print(f"ERRORE: Script Blender Pipeline non trovato in: '{blender_pipeline_script_path}'.")
-                sys.exit(1)
-            if not os.path.exists(blender_executable):
-                print(f"Errore: Eseguibile di Blender non trovato in '{blender_executable}'.")
-                sys.exit(1)
-
-            # Comando esecuzione Blender con --background e --factory-startup
-            command = [
-                blender_executable,
-                "--factory-startup",
-                "--background",
-                "--python", blender_pipeline_script_path
-                # TODO -- rebake
-                ]
-            try:
-                print(f"DEBUG: Esecuzione di: {' '.join(command)}")
-                result = subprocess.run(
-                    command,
-                    check=True,
-                    text=True,
-                    capture_output=True,
-                    encoding=config.FILE_ENCODING
-                    )
-
-                print("--- BLENDER STDOUT (catturato) ---")
-                print (result.stdout)
-                if result.stderr:
-                    print("\n--- OUTPUT PIPELINE BLENDER (stderr catturato) ---")
-                    print(result.stderr)
-                
-                print("\n--- FASE 2: Pipeline Blender COMPLETATA con successo. ---")
-
-            except subprocess.CalledProcessError as e: # Cattura il fallimento di Blender
-                print(f"ERRORE CRITICO durante la pipeline di Blender. Codice di uscita: {e.returncode}")
-                print(f"--- BLENDER STDOUT (catturato) ---")
-                print(e.stdout)
-                if e.stderr:
-                    print(f"--- BLENDER STDERR (catturato) ---")
-                    print(e.stderr)
-                sys.exit(1)
-            except FileNotFoundError: # Aggiunto per un controllo piu' specifico se lo script non e' trovato
-                print(f"ERRORE: L'eseguibile di Blender o lo script della pipeline non sono stati trovati.")
-                sys.exit(1)
-            except Exception as e:
-                print(f"ERRORE INATTESO durante il lancio di Blender: {e}")
-                import traceback
-                traceback.print_exc()
-                sys.exit(1)
+            compile_shader_registry()
+            if config.PIPELINE_ORCHESTRATOR.upper() == 'SINGLE_PROCESS':
+                run_single_process(args.resume_from)
+            else:
+                # --- 1. ESEGUI LA PIPELINE DI SEGMENTAZIONE --- (non serve se si riprende da un checkpoint)
+                if args.resume_from:
+                    print(f"--- FASE 1: Segmentazione saltata, ripresa dalla fase '{args.resume_from}' ---")
+                else:
+                    run_segmentation_subprocess(script_dir)
+                # --- 2. ESEGUI LA PIPELINE DI BLENDER ---
+                if config.PIPELINE_ORCHESTRATOR.upper() == 'SERVICE':
+                    run_blender_service_job(args.resume_from)
+                else:
+                    run_blender_subprocess(script_dir, args.resume_from)
 
             print("\n--- Pipeline TAC 2 AR Terminata con Successo ---")
 
@@ -137,7 +212,7 @@ if __name__ == "__main__":
         # Stampa l'errore sulla console originale e poi tenta di scriverlo nel log se possibile.
         print(f"ERRORE FATALE in main.py: {main_e}", file=original_stderr)
         traceback.print_exc(file=original_stderr)
-        
+
         # Se il log_file e' aperto, prova a scrivere anche li'
         if 'log_file' in locals() and not log_file.closed:
             print(f"ERRORE FATALE in main.py: {main_e}", file=log_file)
@@ -217,10 +217,12 @@ def get_nifti_fdata(nifti_filepath):
     else:
         return None
 
-def export_stl_from_multilabel_nii(nii_filepath, all_segment_data, combined_mesh_rules, output_dir):
+def export_stl_from_multilabel_nii(nii_filepath, all_segment_data, combined_mesh_rules, output_dir, mesh_sink=None):
     """
     Esporta i file STL da un singolo file NIfTI multi-etichetta, implementando
     una logica di override per i mesh combinati.
+    Se viene passato un dizionario 'mesh_sink', i mesh non vengono scritti su disco ma
+    raccolti in memoria come {nome: (vertices, faces)} (array NumPy).
     """
     print("\n--- Fase: Esportazione Mesh STL dal NIfTI Multi-Etichetta (con logica di override) ---")
     if not os.path.exists(nii_filepath):
@@ -281,8 +283,11 @@ def export_stl_from_multilabel_nii(nii_filepath, all_segment_data, combined_mesh
                 
                 # Esporta il volume combinato
                 if combined_volume is not None and np.sum(combined_volume) > 0:
-                    output_stl_path = os.path.join(output_dir, f"{group_name}.stl")
-                    convert_nii_to_stl(combined_volume.astype(np.uint8), output_stl_path, spacing=voxel_spacing)
+                    if mesh_sink is not None:
+                        mesh_sink[group_name] = convert_nii_to_mesh_arrays(combined_volume.astype(np.uint8), spacing=voxel_spacing)
+                    else:
+                        output_stl_path = os.path.join(output_dir, f"{group_name}.stl")
+                        convert_nii_to_stl(combined_volume.astype(np.uint8), output_stl_path, spacing=voxel_spacing)
                     
                     # Aggiungi una voce per il gruppo combinato al dizionario principale
                     all_segment_data[group_name] = {
@@ -315,22 +320,21 @@ def export_stl_from_multilabel_nii(nii_filepath, all_segment_data, combined_mesh
             print(f"  Processando segmento individuale: '{seg_name}' (ID: {segment_id})")
             
             volume_mask = (nii_data == segment_id)
-            output_stl_path = os.path.join(output_dir, f"{seg_name}.stl")
-            convert_nii_to_stl(volume_mask, output_stl_path, spacing=voxel_spacing)
+            if mesh_sink is not None:
+                mesh_sink[seg_name] = convert_nii_to_mesh_arrays(volume_mask, spacing=voxel_spacing)
+            else:
+                output_stl_path = os.path.join(output_dir, f"{seg_name}.stl")
+                convert_nii_to_stl(volume_mask, output_stl_path, spacing=voxel_spacing)
         else:
              print(f"  Segmento '{seg_name}' contrassegnato per non essere esportato individualmente.")
 
     print("\n--- Esportazione Mesh STL Completata ---")
 
-def convert_nii_to_stl(volume, output_stl_path, spacing=(1.0, 1.0, 1.0)):
+def build_surface_mesh(volume, spacing=(1.0, 1.0, 1.0)):
     """
-    Converte un volume numpy in un file STL usando marching cubes e PyVista.
-    Applica trasformazioni per orientamento, scala e spaziatura voxel.
+    Estrae la superficie smussata di un volume numpy con marching cubes e PyVista.
+    Restituisce un pv.PolyData di soli triangoli.
     """
-    if np.sum(volume) == 0:
-        print(f"Attenzione: il volume per '{os.path.basename(output_stl_path)}' e' vuoto. Salto la creazione del mesh.")
-        return
-
     # Estrai la superficie usando marching_cubes, tenendo conto della spaziatura
     vertices, faces, _, _ = marching_cubes(volume, level=0.5, spacing=spacing)
 
@@ -343,11 +347,38 @@ def convert_nii_to_stl(volume, output_stl_path, spacing=(1.0, 1.0, 1.0)):
 
     # Applica smoothing
     mesh = mesh.smooth(n_iter=80, relaxation_factor=0.2)
-    
+    return mesh
+
+def convert_nii_to_stl(volume, output_stl_path, spacing=(1.0, 1.0, 1.0)):
+    """
+    Converte un volume numpy in un file STL usando marching cubes e PyVista.
+    Applica trasformazioni per orientamento, scala e spaziatura voxel.
+    """
+    if np.sum(volume) == 0:
+        print(f"Attenzione: il volume per '{os.path.basename(output_stl_path)}' e' vuoto. Salto la creazione del mesh.")
+        return
+
+    mesh = build_surface_mesh(volume, spacing)
+
     # Salva il file STL
     mesh.save(output_stl_path)
     print(f"Mesh salvato in: {output_stl_path}")
 
+def convert_nii_to_mesh_arrays(volume, spacing=(1.0, 1.0, 1.0)):
+    """
+    Come convert_nii_to_stl, ma restituisce il mesh in memoria come (vertices, faces):
+    array float32 (N, 3) e int32 (M, 3), pronti per blender_ops.link_mesh_arrays_into_blender_scene.
+    """
+    if np.sum(volume) == 0:
+        print("Attenzione: volume vuoto. Salto la creazione del mesh.")
+        return np.zeros((0, 3), dtype=np.float32), np.zeros((0, 3), dtype=np.int32)
+
+    mesh = build_surface_mesh(volume, spacing)
+    vertices = np.asarray(mesh.points, dtype=np.float32)
+    faces = np.asarray(mesh.faces).reshape(-1, 4)[:, 1:].astype(np.int32) # [3, a, b, c] -> [a, b, c]
+    print(f"Mesh generato in memoria: {len(vertices)} vertici, {len(faces)} facce.")
+    return vertices, faces
+
 def populate_custom_details_for_segments(all_segment_data, segment_rules, combined_mesh_rules):
     """
     Popola i parametri custom per i dati dei segmenti usando una logica di matching euristico.
@@ -370,6 +401,7 @@ def populate_custom_details_for_segments(all_segment_data, segment_rules, combin
                 print(f"  Match trovato per '{seg_name}' (via candidato '{candidate}') -> Categoria: {rule.get('biological_category', 'N/A')}")
                 custom_params['display_name'] = rule.get('display_name', seg_name.replace("_", " ").title())
                 custom_params['export'] = rule.get('export', True)
+                custom_params['export_as_individual_mesh'] = rule.get('export_as_individual_mesh', False)
                 custom_params['biological_category'] = rule.get('biological_category', 'Other')
                 custom_params['color_override'] = rule.get('color_override', None)
                 rule_found = True
@@ -381,6 +413,7 @@ def populate_custom_details_for_segments(all_segment_data, segment_rules, combin
             snomed_type = segment_data['snomed_details'].get('type')
             custom_params['display_name'] = snomed_type if snomed_type else seg_name.replace("_", " ").title()
             custom_params['export'] = True  # Default per i non mappati
+            custom_params['export_as_individual_mesh'] = False
             snomed_category = segment_data['snomed_details'].get('category')
             custom_params['biological_category'] = snomed_category if snomed_category else "Other"
             print(f"  AVVISO: Nessuna regola trovata per '{seg_name}' o i suoi candidati. Applicati valori di default (Categoria Fallback: {custom_params['biological_category']}).")
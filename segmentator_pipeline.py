@@ -19,12 +19,14 @@ except Exception as e:
     traceback.print_exc()
     sys.exit(1)
 
-def execute_segmentator_pipeline():
+def execute_segmentator_pipeline(in_memory=False):
     print("DEBUG: segmentator_pipeline.py in esecuzione .")
     try:
         """
         Orchestra l'intera pipeline di segmentazione, dalla lettura dell'input
         all'esportazione dei file STL e del manifest.
+        Con in_memory=True non scrive STL ne' manifest: restituisce (all_segment_data, mesh_arrays)
+        per l'handoff diretto alla pipeline di Blender nello stesso processo.
         """
         print(f"--- Avvio Pipeline di Segmentazione per: {config.CLIENT_ID}, CASO: {config.PROJECT_SESSION_ID} ---")
 
@@ -135,13 +137,19 @@ def execute_segmentator_pipeline():
 
             # --- Fase di Esportazione STL ---
             print(f"\n--- Esportazione STL ---")
+            mesh_arrays = {} if in_memory else None
             segmentator_ops.export_stl_from_multilabel_nii(
                 nii_filepath=segmented_nii_path,
                 all_segment_data=all_segment_data,
                 combined_mesh_rules=combined_mesh_rules,
-                output_dir=config.INPUT_MESH_DIR
+                output_dir=config.INPUT_MESH_DIR,
+                mesh_sink=mesh_arrays
             )
 
+            if in_memory:
+                print(f"\n--- Handoff in memoria: {len(mesh_arrays)} mesh e manifest passati direttamente a Blender ---")
+                return all_segment_data, mesh_arrays
+
             # --- Fase di Scrittura del Manifest ---
             print(f"\nDEBUG:--- Scrittura del Manifest dei Segmenti ---")
             # Assicurati che la directory di output esista prima di scrivere il file
@@ -0,0 +1,304 @@
+# coding: utf-8
+# shader_registry.py
+# Compilatore del registro shader: legge i materiali presenti nei file .blend (senza Blender, parser SDNA)
+# e valida blender_shader_registry.yaml, producendo un indice JSON in cache.
+import os
+import re
+import gzip
+import struct
+import config
+import utils
+
+SHADER_INDEX_VERSION = 1
+
+def read_blend_material_names(blend_path):
+    """
+    Lists the material names stored in a .blend file without Blender.
+    Parses the file-block headers and the SDNA catalog to find the offset of ID.name, then reads the name
+    of every 'MA' block. Supports uncompressed and gzip files (pre-3.0 compression); zstd-compressed
+    files (Blender 3.0+ 'Compress' option) raise ValueError.
+    """
+    with open(blend_path, 'rb') as f:
+        data = f.read()
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    elif data[:4] == b'\x28\xb5\x2f\xfd':
+        raise ValueError("zstd-compressed .blend files are not supported, save the file without compression")
+    if data[:7] != b'BLENDER':
+        raise ValueError("not a .blend file")
+
+    pointer_size = 8 if data[7:8] == b'-' else 4
+    endian = '<' if data[8:9] == b'v' else '>'
+    block_header = struct.Struct(f"{endian}4si{'Q' if pointer_size == 8 else 'I'}ii")
+
+    material_blocks = []
+    dna_block = None
+    offset = 12
+    while offset + block_header.size <= len(data):
+        code, size, _, _, _ = block_header.unpack_from(data, offset)
+        block_start = offset + block_header.size
+        if code == b'ENDB':
+            break
+        if code == b'MA\x00\x00':
+            material_blocks.append(block_start)
+        elif code == b'DNA1':
+            dna_block = data[block_start:block_start + size]
+        offset = block_start + size
+
+    if dna_block is None:
+        raise ValueError("SDNA block not found")
+    id_name_offset, id_name_length = find_struct_field(dna_block, endian, pointer_size, 'ID', 'name')
+
+    names = []
+    for block_start in material_blocks:
+        raw_name = data[block_start + id_name_offset:block_start + id_name_offset + id_name_length]
+        name = raw_name.split(b'\x00', 1)[0].decode('utf-8', errors='replace')
+        if name.startswith('MA'):
+            names.append(name[2:])
+    return names
+
+def find_struct_field(dna_block, endian, pointer_size, struct_name, field_name):
+    """Returns (offset, size) of a field of an SDNA struct, computed from the file's own type catalog."""
+    def align4(position):
+        return (position + 3) & ~3
+
+    position = 4 # 'SDNA'
+    if dna_block[position:position + 4] != b'NAME':
+        raise ValueError("malformed SDNA block")
+    name_count = struct.unpack_from(f"{endian}i", dna_block, position + 4)[0]
+    position += 8
+    field_names = []
+    for _ in range(name_count):
+        end = dna_block.index(b'\x00', position)
+        field_names.append(dna_block[position:end].decode('ascii'))
+        position = end + 1
+
+    position = align4(position) + 4 # 'TYPE'
+    type_count = struct.unpack_from(f"{endian}i", dna_block, position)[0]
+    position += 4
+    type_names = []
+    for _ in range(type_count):
+        end = dna_block.index(b'\x00', position)
+        type_names.append(dna_block[position:end].decode('ascii'))
+        position = end + 1
+
+    position = align4(position) + 4 # 'TLEN'
+    type_lengths = struct.unpack_from(f"{endian}{type_count}h", dna_block, position)
+    position = align4(position + 2 * type_count) + 4 # 'STRC'
+    struct_count = struct.unpack_from(f"{endian}i", dna_block, position)[0]
+    position += 4
+
+    for _ in range(struct_count):
+        type_index, field_count = struct.unpack_from(f"{endian}hh", dna_block, position)
+        position += 4
+        fields = struct.unpack_from(f"{endian}{field_count * 2}h", dna_block, position)
+        position += 4 * field_count
+        if type_names[type_index] != struct_name:
+            continue
+        field_offset = 0
+        for field_type, field_name_index in zip(fields[0::2], fields[1::2]):
+            raw_name = field_names[field_name_index]
+            array_length = 1
+            for dimension in re.findall(r'\[(\d+)\]', raw_name):
+                array_length *= int(dimension)
+            is_pointer = raw_name.startswith('*') or raw_name.startswith('(*')
+            field_size = (pointer_size if is_pointer else type_lengths[field_type]) * array_length
+            if re.sub(r'\[.*', '', raw_name) == field_name:
+                return field_offset, field_size
+            field_offset += field_size
+        raise ValueError(f"field '{field_name}' not found in struct '{struct_name}'")
+    raise ValueError(f"struct '{struct_name}' not found in SDNA")
+
+def get_file_fingerprint(file_path, previous=None):
+    """mtime, size and sha256 of a file; the hash is reused from previous when mtime and size did not change."""
+    stat = os.stat(file_path)
+    if previous and previous.get('mtime_ns') == stat.st_mtime_ns and previous.get('size') == stat.st_size:
+        return previous
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': utils.file_sha256(file_path)}
+
+def validate_shader_registry(registry, blend_materials):
+    """
+    Checks every shader_ref against the materials actually present in Shaders/*.blend and every
+    biological category against the shader_ref keys. Returns (errors, warnings) as lists of strings.
+    """
+    errors = []
+    warnings = []
+    shader_refs = registry.get('shader_ref') or {}
+    for shader_ref, shader_data in shader_refs.items():
+        shader_data = shader_data or {}
+        blend_file = shader_data.get('blend_file')
+        mat_name = shader_data.get('blend_material')
+        if not blend_file or not mat_name:
+            errors.append(f"shader_ref '{shader_ref}': blend_file o blend_material mancante.")
+            continue
+        if blend_file not in blend_materials:
+            errors.append(f"shader_ref '{shader_ref}': file '{blend_file}' non trovato in Shaders/.")
+        elif blend_materials[blend_file] is None:
+            warnings.append(f"shader_ref '{shader_ref}': materiali di '{blend_file}' non leggibili, validazione saltata.")
+        elif mat_name not in blend_materials[blend_file]:
+            errors.append(f"shader_ref '{shader_ref}': materiale '{mat_name}' assente in '{blend_file}' "
+                          f"(presenti: {', '.join(blend_materials[blend_file]) or 'nessuno'}).")
+        color_override = shader_data.get('color_override')
+        if color_override and not re.fullmatch(r'#?[0-9A-Fa-f]{6}', str(color_override)):
+            errors.append(f"shader_ref '{shader_ref}': color_override '{color_override}' non e' un colore esadecimale.")
+
+    for category, shader_ref in (registry.get('biological_categories') or {}).items():
+        if shader_ref not in shader_refs:
+            errors.append(f"biological_category '{category}': shader_ref '{shader_ref}' non definito.")
+    if 'default_shader' not in shader_refs:
+        errors.append("shader_ref 'default_shader' (fallback finale) non definito.")
+    return errors, warnings
+
+def compile_shader_registry(registry_path, shaders_dir, index_path):
+    """
+    Compiles the shader registry into a validated index (JSON) cached in index_path.
+    The index is reused as long as the registry and the Shaders/*.blend files are unchanged (mtime and size,
+    then sha256); only changed .blend files are re-parsed. Returns the index dictionary:
+    {'version', 'sources', 'blend_materials', 'registry', 'errors', 'warnings'}.
+    """
+    previous_index = {}
+    if os.path.exists(index_path):
+        try:
+            previous_index = utils.read_json(index_path)
+        except (OSError, ValueError):
+            previous_index = {}
+    if previous_index.get('version') != SHADER_INDEX_VERSION:
+        previous_index = {}
+    previous_sources = previous_index.get('sources', {})
+
+    sources = {registry_path: get_file_fingerprint(registry_path, previous_sources.get(registry_path))}
+    blend_paths = sorted(
+        os.path.join(shaders_dir, name) for name in os.listdir(shaders_dir) if name.lower().endswith('.blend')
+    )
+    for blend_path in blend_paths:
+        sources[blend_path] = get_file_fingerprint(blend_path, previous_sources.get(blend_path))
+
+    if previous_index and sources == previous_sources:
+        print(f"  Indice del registro shader invariato, caricato dalla cache: {index_path}")
+        return previous_index
+
+    previous_materials = previous_index.get('blend_materials', {})
+    blend_materials = {}
+    warnings = []
+    for blend_path in blend_paths:
+        blend_file = os.path.basename(blend_path)
+        if previous_sources.get(blend_path, {}).get('sha256') == sources[blend_path]['sha256'] and blend_file in previous_materials:
+            blend_materials[blend_file] = previous_materials[blend_file]
+            continue
+        try:
+            blend_materials[blend_file] = read_blend_material_names(blend_path)
+        except (OSError, ValueError, struct.error) as e:
+            blend_materials[blend_file] = None
+            warnings.append(f"'{blend_file}': impossibile leggere i materiali ({e}).")
+
+    registry = utils.read_yaml(registry_path) or {}
+    errors, validation_warnings = validate_shader_registry(registry, blend_materials)
+    index = {
+        'version': SHADER_INDEX_VERSION,
+        'sources': sources,
+        'blend_materials': blend_materials,
+        'registry': registry,
+        'errors': errors,
+        'warnings': warnings + validation_warnings,
+    }
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    utils.write_json(index, index_path)
+    print(f"  Indice del registro shader compilato ({len(blend_paths)} file .blend): {index_path}")
+    return index
+
+def load_compiled_shader_registry():
+    """
+    Compiles (or loads from cache) the shader registry index using the paths in config and reports problems.
+    Returns the registry dictionary, or None if validation failed and SHADER_REGISTRY_STRICT is set.
+    """
+    index = compile_shader_registry(config.BLENDER_SHADER_REGISTRY_FILE, config.SHADERS_DIR, config.SHADER_REGISTRY_INDEX_FILE)
+    for warning in index['warnings']:
+        print(f"  ATTENZIONE registro shader: {warning}")
+    for error in index['errors']:
+        print(f"  ERRORE registro shader: {error}")
+    if index['errors'] and config.SHADER_REGISTRY_STRICT:
+        return None
+    return index['registry']
+
+def get_match_tokens(name):
+    """Lower-case '_'-separated tokens of a segment or shader_ref name, without the '_shader' suffix."""
+    name = name.lower()
+    if name.endswith('_shader'):
+        name = name[:-len('_shader')]
+    return [token for token in name.split('_') if token]
+
+def is_significant_token(token):
+    """Tokens that can select a shader on their own: words of 3+ letters (not '1', 'l1', 'left' counts)."""
+    return token.isalpha() and len(token) >= 3
+
+def build_shader_token_index(shader_ref_map):
+    """Inverted index token -> sorted list of shader_ref keys containing that token."""
+    token_index = {}
+    for shader_ref in sorted(shader_ref_map):
+        for token in set(get_match_tokens(shader_ref)):
+            token_index.setdefault(token, []).append(shader_ref)
+    return token_index
+
+def rank_shader_refs_by_tokens(seg_name, token_index):
+    """
+    Scores the shader_refs sharing tokens with seg_name through the inverted index.
+    A candidate needs at least one significant shared token; ranking is deterministic:
+    most shared tokens, then highest coverage of the shader_ref tokens, then alphabetical order.
+    Returns a list of (shader_ref, shared_tokens, coverage), best first.
+    """
+    seg_tokens = set(get_match_tokens(seg_name))
+    shared = {}
+    for token in seg_tokens:
+        for shader_ref in token_index.get(token, ()):
+            shared.setdefault(shader_ref, set()).add(token)
+
+    ranking = []
+    for shader_ref, tokens in shared.items():
+        if not any(is_significant_token(token) for token in tokens):
+            continue
+        coverage = len(tokens) / len(set(get_match_tokens(shader_ref)))
+        ranking.append((shader_ref, sorted(tokens), round(coverage, 3)))
+    ranking.sort(key=lambda item: (-len(item[1]), -item[2], item[0]))
+    return ranking
+
+def resolve_shader_refs(segments_manifest, registry, default_shader_ref="default_shader"):
+    """
+    Resolves the shader_ref of every segment in one pass over a token index built once per manifest.
+    Rule order: direct ('{segment}_shader'), token match, SNOMED type ('{type}_shader'), biological category, default.
+    Returns {seg_name: explanation}, where explanation has 'shader_ref', 'rule' and, for token matches,
+    'matched_tokens', 'coverage' and the runner-up 'candidates'.
+    """
+    shader_ref_map = registry.get('shader_ref') or {}
+    category_shader_map = registry.get('biological_categories') or {}
+    token_index = build_shader_token_index(shader_ref_map)
+
+    matches = {}
+    for seg_name, seg_data in segments_manifest.items():
+        biological_category_type = (seg_data.get('custom_parameters') or {}).get('biological_category')
+        snomed_type = (seg_data.get('snomed_details') or {}).get('type')
+
+        direct_match = f"{seg_name.lower()}_shader"
+        if direct_match in shader_ref_map:
+            matches[seg_name] = {'shader_ref': direct_match, 'rule': 'direct'}
+            continue
+
+        ranking = rank_shader_refs_by_tokens(seg_name, token_index)
+        if ranking:
+            shader_ref, matched_tokens, coverage = ranking[0]
+            matches[seg_name] = {
+                'shader_ref': shader_ref,
+                'rule': 'token',
+                'matched_tokens': matched_tokens,
+                'coverage': coverage,
+                'candidates': [candidate[0] for candidate in ranking[1:4]],
+            }
+            continue
+
+        if snomed_type and f"{snomed_type.lower()}_shader" in shader_ref_map:
+            matches[seg_name] = {'shader_ref': f"{snomed_type.lower()}_shader", 'rule': 'snomed_type', 'snomed_type': snomed_type}
+        elif biological_category_type and biological_category_type in category_shader_map:
+            matches[seg_name] = {'shader_ref': category_shader_map[biological_category_type], 'rule': 'biological_category',
+                                 'biological_category': biological_category_type}
+        else:
+            matches[seg_name] = {'shader_ref': default_shader_ref, 'rule': 'default'}
+    return matches
@@ -0,0 +1,63 @@
+# coding: utf-8
+# single_process_pipeline.py
+import sys
+import traceback
+
+def execute_single_process_pipeline(resume_from=None):
+    """
+    Esegue segmentazione e pipeline di Blender nello stesso interprete Python.
+    Blender viene caricato come modulo importabile (pacchetto pip 'bpy', stessa versione di Python
+    richiesta dalla release di Blender). Mesh (array NumPy), manifest e registro shader passano
+    direttamente in memoria: niente STL intermedi, niente manifest/registro JSON di appoggio.
+    Con resume_from la segmentazione viene saltata e la pipeline di Blender riparte dal checkpoint indicato.
+    Restituisce True se entrambe le fasi vanno a buon fine.
+    """
+    try:
+        import bpy
+        import config
+        import shader_registry
+        import segmentator_pipeline
+        import blender_pipeline
+        print(f"DEBUG: bpy {bpy.app.version_string} caricato come modulo nel processo corrente.")
+    except ImportError as e:
+        print(f"ERRORE CRITICO: Modalita' single-process non disponibile. Installa il modulo 'bpy' nell'ambiente della pipeline. Dettagli: {e}")
+        return False
+
+    # --- 0. Registro shader compilato e validato (prima della segmentazione) ---
+    blender_shader_registry = shader_registry.load_compiled_shader_registry()
+    if not blender_shader_registry:
+        print(f"ERRORE: Registro shader non valido o non caricato da '{config.BLENDER_SHADER_REGISTRY_FILE}'.")
+        return False
+
+    if resume_from:
+        print(f"--- FASE 1: Segmentazione saltata, ripresa dalla fase '{resume_from}' ---")
+        try:
+            return bool(blender_pipeline.execute_blender_pipeline(resume_from=resume_from))
+        except Exception as e:
+            print(f"ERRORE CRITICO durante la ripresa della pipeline di Blender in-process: {e}")
+            traceback.print_exc()
+            return False
+
+    # --- 1. Segmentazione con handoff in memoria ---
+    print("--- FASE 1: Pipeline di Segmentazione (in memoria) ---")
+    result = segmentator_pipeline.execute_segmentator_pipeline(in_memory=True)
+    if not result:
+        print("ERRORE: La segmentazione non ha prodotto mesh da passare a Blender.")
+        return False
+    segments_manifest, mesh_arrays = result
+
+    # --- 2. Pipeline di Blender sullo stesso processo ---
+    print("\n--- FASE 2: Pipeline di Blender (bpy in-process) ---")
+    try:
+        return bool(blender_pipeline.execute_blender_pipeline(
+            segments_manifest=segments_manifest,
+            blender_shader_registry=blender_shader_registry,
+            mesh_arrays=mesh_arrays
+        ))
+    except Exception as e:
+        print(f"ERRORE CRITICO durante la pipeline di Blender in-process: {e}")
+        traceback.print_exc()
+        return False
+
+if __name__ == "__main__":
+    sys.exit(0 if execute_single_process_pipeline() else 1)
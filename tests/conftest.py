@@ -0,0 +1,9 @@
+# coding: utf-8
+# conftest.py
+# I moduli del progetto sono nella directory principale: la aggiunge al path per i test.
+import os
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
@@ -0,0 +1,87 @@
+# coding: utf-8
+# test_blender_ops.py
+# Funzioni di blender_ops senza dati di scena: richiedono comunque il modulo bpy (Python di Blender o pip install bpy).
+import numpy as np
+import pytest
+
+pytest.importorskip("bpy")
+import blender_ops
+
+
+def test_weld_triangle_corners_shares_vertices():
+    # two triangles of a unit square, written as separate corners
+    corners = np.array([
+        [0, 0, 0], [1, 0, 0], [1, 1, 0],
+        [0, 0, 0], [1, 1, 0], [0, 1, 0],
+    ], dtype=np.float32)
+    vertices, faces = blender_ops.weld_triangle_corners(corners)
+
+    assert len(vertices) == 4
+    assert faces.shape == (2, 3)
+    assert np.array_equal(vertices[faces].reshape(-1, 3), corners)
+
+
+def test_weld_triangle_corners_merges_negative_zero():
+    corners = np.array([
+        [0, 0, 0], [1, 0, 0], [0, 1, 0],
+        [-0.0, 0, 0], [0, 1, 0], [-1, 0, 0],
+    ], dtype=np.float32)
+    vertices, faces = blender_ops.weld_triangle_corners(corners)
+
+    assert len(vertices) == 4
+    assert faces[0, 0] == faces[1, 0]
+
+
+def test_weld_triangle_corners_drops_collapsed_triangles():
+    corners = np.array([
+        [0, 0, 0], [1, 0, 0], [0, 1, 0],
+        [0, 0, 0], [0, 0, 0], [1, 0, 0], # degenerate: two identical corners
+    ], dtype=np.float32)
+    vertices, faces = blender_ops.weld_triangle_corners(corners)
+
+    assert faces.shape == (1, 3)
+    assert len(set(faces[0])) == 3
+
+
+def check_budget(face_counts, weights, total_budget, min_faces):
+    targets = blender_ops.allocate_triangle_budget(face_counts, weights, total_budget, min_faces)
+    assert set(targets) == set(face_counts)
+    for name, count in face_counts.items():
+        assert min(min_faces, count) <= targets[name] <= count
+    return targets
+
+
+def test_allocate_triangle_budget_hits_total_exactly():
+    rng = np.random.default_rng(7)
+    for _ in range(200):
+        object_count = int(rng.integers(1, 12))
+        face_counts = {f"obj_{i}": int(rng.integers(1, 20000)) for i in range(object_count)}
+        weights = {name: float(rng.random()) for name in face_counts}
+        min_faces = int(rng.integers(0, 800))
+        lowest = sum(min(min_faces, count) for count in face_counts.values())
+        total_budget = int(rng.integers(lowest, sum(face_counts.values()) + 1))
+
+        targets = check_budget(face_counts, weights, total_budget, min_faces)
+        assert sum(targets.values()) == total_budget
+
+
+def test_allocate_triangle_budget_respects_min_faces():
+    face_counts = {'liver': 100000, 'vessel': 5000, 'nodule': 300}
+    weights = {'liver': 1000.0, 'vessel': 1.0, 'nodule': 0.01}
+    targets = check_budget(face_counts, weights, 20000, 500)
+
+    assert targets['vessel'] == 500
+    assert targets['nodule'] == 300 # already below min_faces: kept whole
+    assert sum(targets.values()) == 20000
+
+
+def test_allocate_triangle_budget_caps_at_face_count():
+    face_counts = {'a': 1000, 'b': 50000}
+    targets = check_budget(face_counts, {'a': 10.0, 'b': 1.0}, 30000, 100)
+
+    assert targets == {'a': 1000, 'b': 29000}
+
+
+def test_allocate_triangle_budget_keeps_everything_above_total():
+    face_counts = {'a': 1000, 'b': 2000, 'empty': 0}
+    assert check_budget(face_counts, {'a': 1.0, 'b': 1.0}, 10000, 100) == face_counts
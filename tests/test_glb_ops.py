@@ -0,0 +1,61 @@
+# coding: utf-8
+# test_glb_ops.py
+import glb_ops
+
+
+def make_lod_scene():
+    """Root with one LOD chain (3 levels) and a plain mesh, as exported from generate_lod_chains."""
+    def lod_node(name, level, coverage):
+        return {'name': name, 'mesh': level, 'extras': {'lod_group': 'liver', 'lod_level': level, 'lod_screen_coverage': coverage}}
+    nodes = [
+        {'name': 'Root', 'children': [1, 2, 3, 4]},
+        lod_node('liver', 0, 0.5),
+        lod_node('liver_LOD1', 1, 0.2),
+        lod_node('liver_LOD2', 2, 0.05),
+        {'name': 'spleen', 'mesh': 3},
+    ]
+    return {'asset': {'version': '2.0'}, 'scene': 0, 'scenes': [{'nodes': [0, 2]}], 'nodes': nodes}
+
+
+def test_write_read_glb_round_trip_is_byte_stable(tmp_path):
+    gltf_json = make_lod_scene()
+    bin_chunk = bytes(range(7)) # not a multiple of 4: padded on write
+    first_path = tmp_path / "first.glb"
+    second_path = tmp_path / "second.glb"
+
+    glb_ops.write_glb(first_path, gltf_json, bin_chunk)
+    read_json, read_bin = glb_ops.read_glb(first_path)
+    glb_ops.write_glb(second_path, read_json, read_bin)
+
+    assert read_json == gltf_json
+    assert read_bin[:len(bin_chunk)] == bin_chunk and len(read_bin) % 4 == 0
+    assert first_path.read_bytes() == second_path.read_bytes()
+    assert len(first_path.read_bytes()) % 4 == 0
+
+
+def test_apply_msft_lod_extension_detaches_lower_levels(tmp_path):
+    glb_path = tmp_path / "model.glb"
+    glb_ops.write_glb(glb_path, make_lod_scene(), b'\0' * 8)
+
+    assert glb_ops.apply_msft_lod_extension(glb_path) == 1
+    gltf_json, bin_chunk = glb_ops.read_glb(glb_path)
+    nodes = gltf_json['nodes']
+
+    assert nodes[1]['extensions']['MSFT_lod'] == {'ids': [2, 3]}
+    assert nodes[1]['extras']['MSFT_screencoverage'] == [0.5, 0.2, 0.05]
+    assert nodes[0]['children'] == [1, 4]
+    assert gltf_json['scenes'][0]['nodes'] == [0]
+    assert gltf_json['extensionsUsed'] == ['MSFT_lod']
+    assert bin_chunk == b'\0' * 8
+
+
+def test_apply_msft_lod_extension_leaves_files_without_chains(tmp_path):
+    gltf_json = make_lod_scene()
+    for node in gltf_json['nodes']:
+        node.pop('extras', None)
+    glb_path = tmp_path / "model.glb"
+    glb_ops.write_glb(glb_path, gltf_json)
+    original_bytes = glb_path.read_bytes()
+
+    assert glb_ops.apply_msft_lod_extension(glb_path) == 0
+    assert glb_path.read_bytes() == original_bytes
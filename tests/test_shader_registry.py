@@ -0,0 +1,113 @@
+# coding: utf-8
+# test_shader_registry.py
+import glob
+import gzip
+import os
+
+import pytest
+
+import config
+import shader_registry
+import utils
+
+BLEND_PATHS = sorted(glob.glob(os.path.join(config.SHADERS_DIR, "*.blend")))
+
+
+@pytest.mark.parametrize("blend_path", BLEND_PATHS, ids=os.path.basename)
+def test_read_blend_material_names(blend_path):
+    names = shader_registry.read_blend_material_names(blend_path)
+
+    assert names
+    assert all(isinstance(name, str) and name and '\x00' not in name for name in names)
+    assert len(set(names)) == len(names)
+
+
+def test_read_blend_material_names_gzip(tmp_path):
+    blend_path = BLEND_PATHS[0]
+    gzip_path = tmp_path / "compressed.blend"
+    with open(blend_path, 'rb') as f:
+        gzip_path.write_bytes(gzip.compress(f.read()))
+
+    assert shader_registry.read_blend_material_names(gzip_path) == shader_registry.read_blend_material_names(blend_path)
+
+
+def test_read_blend_material_names_rejects_other_files(tmp_path):
+    zstd_path = tmp_path / "zstd.blend"
+    zstd_path.write_bytes(b'\x28\xb5\x2f\xfd' + b'\0' * 16)
+    text_path = tmp_path / "text.blend"
+    text_path.write_bytes(b'not a blend file')
+
+    with pytest.raises(ValueError):
+        shader_registry.read_blend_material_names(zstd_path)
+    with pytest.raises(ValueError):
+        shader_registry.read_blend_material_names(text_path)
+
+
+def test_shipped_registry_validates():
+    blend_materials = {os.path.basename(path): shader_registry.read_blend_material_names(path) for path in BLEND_PATHS}
+    registry = utils.read_yaml(config.BLENDER_SHADER_REGISTRY_FILE)
+
+    errors, warnings = shader_registry.validate_shader_registry(registry, blend_materials)
+    assert errors == []
+    assert warnings == []
+
+
+def test_validate_shader_registry_reports_missing_material():
+    registry = {
+        'shader_ref': {
+            'default_shader': {'blend_file': 'default.blend', 'blend_material': 'Default'},
+            'liver_shader': {'blend_file': 'organ.blend', 'blend_material': 'Liver', 'color_override': 'red'},
+        },
+        'biological_categories': {'organ': 'organ_shader'},
+    }
+    errors, _ = shader_registry.validate_shader_registry(registry, {'default.blend': ['Default'], 'organ.blend': ['Organ']})
+
+    assert len(errors) == 3 # missing material, bad color_override, undefined category shader_ref
+    assert any("'Liver'" in error for error in errors)
+
+
+SHADER_REFS = {
+    'default_shader': {}, 'kidney_shader': {}, 'kidney_cyst_shader': {}, 'lung_shader': {},
+    'lung_upper_lobe_shader': {}, 'vertebrae_shader': {}, 'organ_shader': {},
+}
+
+
+def test_rank_shader_refs_by_tokens():
+    token_index = shader_registry.build_shader_token_index(SHADER_REFS)
+
+    ranking = shader_registry.rank_shader_refs_by_tokens('kidney_cyst_left', token_index)
+    assert [shader_ref for shader_ref, _, _ in ranking] == ['kidney_cyst_shader', 'kidney_shader']
+    assert ranking[0][1:] == (['cyst', 'kidney'], 1.0)
+
+    # most shared tokens first, then coverage of the shader_ref tokens, then name
+    ranking = shader_registry.rank_shader_refs_by_tokens('lung_upper_lobe_left', token_index)
+    assert ranking[0] == ('lung_upper_lobe_shader', ['lobe', 'lung', 'upper'], 1.0)
+    assert ranking[1] == ('lung_shader', ['lung'], 1.0)
+
+
+def test_rank_shader_refs_by_tokens_needs_a_significant_token():
+    token_index = shader_registry.build_shader_token_index(SHADER_REFS)
+
+    lung_index = shader_registry.build_shader_token_index({'lung_l1_shader': {}})
+    assert shader_registry.rank_shader_refs_by_tokens('vertebrae_l1', lung_index) == [] # 'l1' alone is not enough
+    assert shader_registry.rank_shader_refs_by_tokens('vertebrae_l1', token_index)[0][0] == 'vertebrae_shader'
+    assert shader_registry.rank_shader_refs_by_tokens('rib_1', token_index) == []
+
+
+def test_resolve_shader_refs_rule_order():
+    registry = {'shader_ref': SHADER_REFS, 'biological_categories': {'organ': 'organ_shader'}}
+    manifest = {
+        'kidney': {},
+        'kidney_cyst_right': {},
+        'spleen': {'snomed_details': {'type': 'organ'}},
+        'duodenum': {'custom_parameters': {'biological_category': 'organ'}},
+        'rib_1': {},
+    }
+    matches = shader_registry.resolve_shader_refs(manifest, registry)
+
+    assert matches['kidney'] == {'shader_ref': 'kidney_shader', 'rule': 'direct'}
+    assert matches['kidney_cyst_right']['shader_ref'] == 'kidney_cyst_shader'
+    assert matches['kidney_cyst_right']['rule'] == 'token'
+    assert matches['spleen'] == {'shader_ref': 'organ_shader', 'rule': 'snomed_type', 'snomed_type': 'organ'}
+    assert matches['duodenum']['rule'] == 'biological_category'
+    assert matches['rib_1'] == {'shader_ref': 'default_shader', 'rule': 'default'}
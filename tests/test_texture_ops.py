@@ -0,0 +1,55 @@
+# coding: utf-8
+# test_texture_ops.py
+import numpy as np
+import pytest
+
+import texture_ops
+
+
+def pack_metalness_per_pixel(roughness_rgba, one=1.0):
+    """Reference: the per-pixel layout of the former create_base_metalness_map / create_metallic_smoothness_map."""
+    height, width, _ = roughness_rgba.shape
+    metallic = np.zeros_like(roughness_rgba)
+    metallic_smoothness = np.zeros_like(roughness_rgba)
+    for y in range(height):
+        for x in range(width):
+            green = roughness_rgba[y, x, 1]
+            metallic[y, x] = (green, green, green, one)
+            metallic_smoothness[y, x] = (green, 0, 0, one - green)
+    return metallic, metallic_smoothness
+
+
+def make_roughness(dtype):
+    rng = np.random.default_rng(34)
+    if dtype == np.uint8:
+        return rng.integers(0, 256, size=(16, 24, 4), dtype=np.uint8)
+    return rng.random((16, 24, 4), dtype=np.float32)
+
+
+def test_pack_metalness_channels_matches_per_pixel_loop():
+    roughness = make_roughness(np.float32)
+    metallic, metallic_smoothness = texture_ops.pack_metalness_channels(roughness)
+    expected_metallic, expected_metallic_smoothness = pack_metalness_per_pixel(roughness)
+
+    assert metallic.dtype == np.float32 and metallic.shape == roughness.shape
+    assert np.array_equal(metallic, expected_metallic)
+    assert np.array_equal(metallic_smoothness, expected_metallic_smoothness)
+
+
+def test_pack_metalness_files_matches_per_pixel_loop(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    roughness = make_roughness(np.uint8)
+    roughness_path = tmp_path / "liver_roughness.png"
+    metallic_path = tmp_path / "liver_metallic.png"
+    metallic_smoothness_path = tmp_path / "liver_MetallicSmoothness.png"
+    Image.fromarray(roughness, 'RGBA').save(roughness_path)
+
+    size = texture_ops.pack_metalness_files(roughness_path, metallic_path, metallic_smoothness_path)
+    expected_metallic, expected_metallic_smoothness = pack_metalness_per_pixel(roughness.astype(np.int32), one=255)
+
+    assert size == (24, 16)
+    with Image.open(metallic_path) as metallic_img:
+        assert metallic_img.mode == 'RGB'
+        assert np.array_equal(np.asarray(metallic_img), expected_metallic[..., :3])
+    with Image.open(metallic_smoothness_path) as metallic_smoothness_img:
+        assert np.array_equal(np.asarray(metallic_smoothness_img), expected_metallic_smoothness)
@@ -0,0 +1,154 @@
+# coding: utf-8
+# test_uv_ops.py
+import numpy as np
+
+import uv_ops
+
+
+def make_mesh_arrays(vertices, faces):
+    """Mesh data as uv_map_box_charts reads it: loop vertex/edge indices, loop totals and face normals."""
+    vertices = np.asarray(vertices, dtype=np.float64)
+    loop_vertices = np.concatenate([np.asarray(face) for face in faces])
+    loop_totals = np.array([len(face) for face in faces])
+    edge_ids = {}
+    loop_edges = []
+    for face in faces:
+        for a, b in zip(face, np.roll(face, -1)):
+            loop_edges.append(edge_ids.setdefault((min(a, b), max(a, b)), len(edge_ids)))
+    face_normals = []
+    for face in faces: # Newell normal
+        points = vertices[list(face)]
+        normal = np.cross(points, np.roll(points, -1, axis=0)).sum(axis=0)
+        face_normals.append(normal / np.linalg.norm(normal))
+    return vertices, loop_vertices, np.array(loop_edges), loop_totals, np.array(face_normals)
+
+
+def make_cube(subdivisions=1):
+    """Axis-aligned cube with outward, counter-clockwise faces, each side split into subdivisions^2 quads."""
+    vertices, faces, index = [], [], {}
+    steps = np.linspace(-1.0, 1.0, subdivisions + 1)
+    for axis in range(3):
+        for sign in (1.0, -1.0):
+            u_axis, v_axis = [a for a in range(3) if a != axis]
+            if sign < 0:
+                u_axis, v_axis = v_axis, u_axis
+            if axis == 1:
+                u_axis, v_axis = v_axis, u_axis
+            def vertex(i, j):
+                point = [0.0, 0.0, 0.0]
+                point[axis], point[u_axis], point[v_axis] = sign, steps[i], steps[j]
+                key = tuple(point)
+                if key not in index:
+                    index[key] = len(vertices)
+                    vertices.append(point)
+                return index[key]
+            for i in range(subdivisions):
+                for j in range(subdivisions):
+                    faces.append([vertex(i, j), vertex(i + 1, j), vertex(i + 1, j + 1), vertex(i, j + 1)])
+    return make_mesh_arrays(vertices, faces)
+
+
+def make_uv_sphere(segments=32, rings=16):
+    """UV sphere with outward, counter-clockwise quads and triangle fans at the poles."""
+    vertices = [[0.0, 0.0, 1.0]]
+    for ring in range(1, rings):
+        theta = np.pi * ring / rings
+        for segment in range(segments):
+            phi = 2.0 * np.pi * segment / segments
+            vertices.append([np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)])
+    vertices.append([0.0, 0.0, -1.0])
+    bottom = len(vertices) - 1
+
+    def ring_vertex(ring, segment):
+        return 1 + (ring - 1) * segments + segment % segments
+    faces = []
+    for segment in range(segments):
+        faces.append([0, ring_vertex(1, segment), ring_vertex(1, segment + 1)])
+        for ring in range(1, rings - 1):
+            faces.append([ring_vertex(ring, segment), ring_vertex(ring + 1, segment),
+                          ring_vertex(ring + 1, segment + 1), ring_vertex(ring, segment + 1)])
+        faces.append([ring_vertex(rings - 1, segment), bottom, ring_vertex(rings - 1, segment + 1)])
+    return make_mesh_arrays(vertices, faces)
+
+
+def unwrap(mesh_arrays):
+    vertices, loop_vertices, loop_edges, loop_totals, face_normals = mesh_arrays
+    uvs = uv_ops.unwrap_box_charts(vertices, loop_vertices, loop_edges, loop_totals, face_normals)
+    loop_faces = np.repeat(np.arange(len(loop_totals)), loop_totals)
+    _, face_charts = uv_ops.grow_box_charts(face_normals, loop_faces, loop_edges)
+    return uvs, loop_faces, face_charts
+
+
+def face_uv_areas(uvs, loop_faces, face_count):
+    """Signed UV area of every face (shoelace): positive when the winding is kept."""
+    next_loop = np.arange(len(uvs)) + 1
+    face_starts = np.searchsorted(loop_faces, np.arange(face_count))
+    face_ends = np.append(face_starts[1:], len(uvs))
+    next_loop[face_ends - 1] = face_starts
+    cross = uvs[:, 0] * uvs[next_loop, 1] - uvs[next_loop, 0] * uvs[:, 1]
+    return np.bincount(loop_faces, weights=cross, minlength=face_count) / 2.0
+
+
+def assert_valid_unwrap(mesh_arrays):
+    uvs, loop_faces, face_charts = unwrap(mesh_arrays)
+    face_count = len(mesh_arrays[3])
+
+    assert uvs.shape == (len(loop_faces), 2)
+    assert uvs.min() >= 0.0 and uvs.max() <= 1.0 + 1e-6
+    assert np.all(face_uv_areas(uvs.astype(np.float64), loop_faces, face_count) > 0.0)
+
+    # chart bounding boxes after shelf packing must not overlap
+    loop_charts = face_charts[loop_faces]
+    boxes = [(uvs[loop_charts == chart].min(axis=0), uvs[loop_charts == chart].max(axis=0))
+             for chart in range(face_charts.max() + 1)]
+    for i, (min_a, max_a) in enumerate(boxes):
+        for min_b, max_b in boxes[i + 1:]:
+            overlap = np.minimum(max_a, max_b) - np.maximum(min_a, min_b)
+            assert np.any(overlap <= 1e-6)
+    return face_charts
+
+
+def test_label_connected_faces():
+    pairs = np.array([[0, 1], [1, 2], [4, 5], [6, 5]])
+    labels = uv_ops.label_connected_faces(7, pairs)
+
+    assert labels[0] == labels[1] == labels[2]
+    assert labels[4] == labels[5] == labels[6]
+    assert len(set(labels)) == 3
+    assert list(uv_ops.label_connected_faces(3, np.empty((0, 2), dtype=int))) == [0, 1, 2]
+
+
+def test_pack_charts_in_shelves_fits_without_overlap():
+    rng = np.random.default_rng(39)
+    chart_sizes = rng.random((40, 2)) + 0.05
+    offsets, scale = uv_ops.pack_charts_in_shelves(chart_sizes, 0.01)
+
+    minimum, maximum = offsets * scale, (offsets + chart_sizes) * scale
+    assert minimum.min() >= 0.0 and maximum.max() <= 1.0 + 1e-9
+    for i in range(len(chart_sizes)):
+        for j in range(i + 1, len(chart_sizes)):
+            assert np.any(np.minimum(maximum[i], maximum[j]) - np.maximum(minimum[i], minimum[j]) <= 1e-9)
+
+
+def test_unwrap_cube_has_one_chart_per_side():
+    for subdivisions in (1, 4):
+        face_charts = assert_valid_unwrap(make_cube(subdivisions))
+        assert face_charts.max() + 1 == 6
+
+
+def test_unwrap_uv_sphere():
+    face_charts = assert_valid_unwrap(make_uv_sphere())
+    assert face_charts.max() + 1 <= 12
+
+
+def test_small_charts_merge_into_neighbours():
+    # noisy sphere: jittered normals must not leave a crowd of tiny charts
+    vertices, loop_vertices, loop_edges, loop_totals, face_normals = make_uv_sphere(64, 32)
+    rng = np.random.default_rng(3)
+    noisy_normals = face_normals + rng.normal(scale=0.25, size=face_normals.shape)
+    noisy_normals /= np.linalg.norm(noisy_normals, axis=1, keepdims=True)
+    loop_faces = np.repeat(np.arange(len(loop_totals)), loop_totals)
+
+    _, raw_charts = uv_ops.grow_box_charts(noisy_normals, loop_faces, loop_edges, smoothing_iterations=0, min_chart_faces=1)
+    _, face_charts = uv_ops.grow_box_charts(noisy_normals, loop_faces, loop_edges)
+    assert face_charts.max() + 1 < (raw_charts.max() + 1) / 4
@@ -0,0 +1,43 @@
+# coding: utf-8
+# texture_ops.py
+# Operazioni sulle texture bakate senza dipendenze da Blender (NumPy, Pillow opzionale).
+import numpy as np
+
+def pack_metalness_channels(roughness_rgba):
+    """
+    Builds both metalness maps from one float32 (H, W, 4) roughness buffer, fully vectorized.
+    - PBR metallic (RGBA): roughness G replicated on R, G, B; alpha 1.0.
+    - URP MetallicSmoothness (RGBA): R = roughness G (metalness), G = 0.0 (occlusion),
+      B = 0.0 (detail mask), A = 1 - roughness G (smoothness).
+    Returns (metallic_rgba, metallic_smoothness_rgba), both float32 with the input shape.
+    """
+    green = roughness_rgba[..., 1]
+
+    metallic = np.empty_like(roughness_rgba, dtype=np.float32)
+    metallic[..., 0] = green
+    metallic[..., 1] = green
+    metallic[..., 2] = green
+    metallic[..., 3] = 1.0
+
+    metallic_smoothness = np.zeros_like(roughness_rgba, dtype=np.float32)
+    metallic_smoothness[..., 0] = green
+    metallic_smoothness[..., 3] = 1.0 - green
+    return metallic, metallic_smoothness
+
+def pack_metalness_files(roughness_path, metallic_path, metallic_smoothness_path):
+    """
+    Pillow counterpart of pack_metalness_channels, meant to run in a worker process outside Blender:
+    reads the roughness PNG once and writes the metallic and MetallicSmoothness PNGs.
+    Works on 8 bit values, so no float conversion is needed. Returns the roughness image size.
+    """
+    from PIL import Image
+
+    with Image.open(roughness_path) as roughness_img:
+        green = np.asarray(roughness_img.convert('RGBA'))[..., 1]
+
+    height, width = green.shape
+    zeros = np.zeros((height, width), dtype=np.uint8)
+
+    Image.fromarray(np.dstack((green, green, green)), 'RGB').save(metallic_path)
+    Image.fromarray(np.dstack((green, zeros, zeros, 255 - green)), 'RGBA').save(metallic_smoothness_path)
+    return width, height
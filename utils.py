@@ -7,6 +7,8 @@ import json
 import re
 import csv
 import shutil
+import hashlib
+import functools
 import config
 
 def read_yaml(file):
@@ -33,6 +35,13 @@ def read_json(file_path):
     with open(file_path, 'r', encoding=config.FILE_ENCODING) as f:
         return json.load(f)
 
+def update_run_report(report_path, section, data):
+    """Scrive una sezione del report JSON della run (creandolo se serve), lasciando invariate le altre sezioni."""
+    report = read_json(report_path) if os.path.exists(report_path) else {}
+    report[section] = data
+    write_json(report, report_path)
+    return report
+
 def yaml_to_json(yaml_file_path, json_file_path):
     """
     Converte un file YAML in un file JSON.
@@ -300,4 +309,115 @@ def clean_session_directories():
             except OSError as e:
                 print(f"ERRORE: Impossibile pulire la directory {dir_path}. Dettagli: {e}")
         else:
-            print(f"  La directory da pulire non esiste (OK): {dir_path}")
\ No newline at end of file
+            print(f"  La directory da pulire non esiste (OK): {dir_path}")
+
+
+def map_in_process_pool(func, args_list, max_workers=None):
+    """
+    Esegue func(*args) per ogni tupla di args_list in un pool di processi e restituisce i risultati nello stesso ordine.
+    func deve essere una funzione di modulo (serializzabile con pickle). Con un solo elemento, o max_workers=1,
+    esegue tutto nel processo corrente evitando il costo di avvio del pool.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if len(args_list) <= 1 or max_workers == 1:
+        return [func(*args) for args in args_list]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(func, *args) for args in args_list]
+        return [future.result() for future in futures]
+
+@functools.lru_cache(maxsize=None)
+def hash_file_contents(file_path, mtime_ns, size):
+    """SHA-256 del contenuto di un file, memorizzato per (percorso, mtime, dimensione). Usare file_sha256."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_sha256(file_path):
+    """SHA-256 del file, ricalcolato solo se il file cambia (mtime o dimensione). None se il file non esiste."""
+    if not file_path or not os.path.exists(file_path):
+        return None
+    stat = os.stat(file_path)
+    return hash_file_contents(os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+def bake_cache_fetch(cache_dir, cache_key, destination_path):
+    """
+    Copia in destination_path il PNG in cache per cache_key, se presente, aggiornandone l'mtime (ordine LRU).
+    Restituisce True in caso di hit.
+    """
+    cached_path = os.path.join(cache_dir, cache_key[:2], f"{cache_key}.png")
+    if not os.path.exists(cached_path):
+        return False
+    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    try:
+        shutil.copyfile(cached_path, destination_path)
+        os.utime(cached_path)
+    except FileNotFoundError:
+        return False # eliminato nel frattempo da un altro worker: miss
+    return True
+
+# Dimensione stimata di ogni directory di cache in questo processo: la directory viene scandita
+# solo alla prima scrittura e quando la stima supera il limite (i worker paralleli scrivono nella stessa cache).
+BAKE_CACHE_SIZES = {}
+
+def bake_cache_store(cache_dir, cache_key, source_path, max_bytes):
+    """Salva in cache una copia di source_path sotto cache_key, poi riporta la cache entro max_bytes (LRU)."""
+    cached_path = os.path.join(cache_dir, cache_key[:2], f"{cache_key}.png")
+    tmp_path = f"{cached_path}.{os.getpid()}.tmp" # un file temporaneo per processo: i worker possono scrivere la stessa chiave
+    os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+    shutil.copyfile(source_path, tmp_path)
+    os.replace(tmp_path, cached_path)
+
+    if cache_dir not in BAKE_CACHE_SIZES:
+        BAKE_CACHE_SIZES[cache_dir] = get_directory_size(cache_dir)
+    else:
+        BAKE_CACHE_SIZES[cache_dir] += os.path.getsize(cached_path)
+    if BAKE_CACHE_SIZES[cache_dir] > max_bytes:
+        evict_lru_files(cache_dir, max_bytes)
+        BAKE_CACHE_SIZES[cache_dir] = get_directory_size(cache_dir)
+
+def list_cache_files(directory):
+    """
+    Restituisce (mtime, dimensione, percorso) dei file della directory, esclusi i .tmp in scrittura.
+    I file rimossi nel frattempo da un altro processo vengono ignorati.
+    """
+    entries = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+def get_directory_size(directory):
+    """Dimensione totale in byte dei file della directory (vedi list_cache_files)."""
+    return sum(entry[1] for entry in list_cache_files(directory))
+
+def evict_lru_files(directory, max_bytes):
+    """
+    Elimina i file meno recentemente usati (mtime piu' vecchio) finche' la dimensione totale della directory
+    non rientra in max_bytes. Sicura con piu' processi sulla stessa directory: i file gia' eliminati
+    da un altro processo vengono saltati. Restituisce il numero di file eliminati.
+    """
+    entries = list_cache_files(directory)
+    total_bytes = sum(entry[1] for entry in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass # gia' eliminato da un altro worker
+        total_bytes -= size
+    if removed:
+        print(f"  Bake cache: rimossi {removed} file meno usati (dimensione attuale {total_bytes / (1024 * 1024):.1f} MB).")
+    return removed
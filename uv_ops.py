@@ -0,0 +1,182 @@
+# coding: utf-8
+# uv_ops.py
+# Unwrapping UV su array NumPy, senza dipendenze da Blender (eseguibile in un pool di processi).
+import numpy as np
+
+# Base (u, v) di proiezione per ciascuno dei 6 assi del box (+X, -X, +Y, -Y, +Z, -Z), destrorse per non specchiare le isole.
+BOX_PROJECTION_AXES = np.array([
+    [[0, 1, 0], [0, 0, 1]],   # +X
+    [[0, -1, 0], [0, 0, 1]],  # -X
+    [[-1, 0, 0], [0, 0, 1]],  # +Y
+    [[1, 0, 0], [0, 0, 1]],   # -Y
+    [[1, 0, 0], [0, 1, 0]],   # +Z
+    [[1, 0, 0], [0, -1, 0]],  # -Z
+], dtype=np.float64)
+# Direzione di ciascun asse del box, nello stesso ordine (face_axes = asse dominante * 2 + negativo).
+BOX_AXIS_DIRECTIONS = np.array([[1, 0, 0], [-1, 0, 0], [0, 1, 0], [0, -1, 0], [0, 0, 1], [0, 0, -1]], dtype=np.float64)
+# Coseno minimo tra la normale media di un chart piccolo e l'asse del vicino in cui confluisce (60 gradi):
+# oltre, la proiezione sul piano del vicino schiaccerebbe o ribalterebbe le facce.
+MERGE_MIN_AXIS_COSINE = 0.5
+
+def label_connected_faces(face_count, adjacent_pairs):
+    """
+    Connected components of the face graph via vectorized label propagation (min-label hooking plus
+    pointer jumping, union-find style). adjacent_pairs is an (E, 2) array of face indices.
+    Returns an int array of component ids in 0..K-1.
+    """
+    labels = np.arange(face_count)
+    if len(adjacent_pairs):
+        face_a, face_b = adjacent_pairs[:, 0], adjacent_pairs[:, 1]
+        while True:
+            lowest = np.minimum(labels[face_a], labels[face_b])
+            updated = labels.copy()
+            np.minimum.at(updated, labels[face_a], lowest)
+            np.minimum.at(updated, labels[face_b], lowest)
+            np.minimum.at(updated, face_a, lowest)
+            np.minimum.at(updated, face_b, lowest)
+            while True: # pointer jumping: every face points to the root of its tree
+                jumped = updated[updated]
+                if np.array_equal(jumped, updated):
+                    break
+                updated = jumped
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+    return np.unique(labels, return_inverse=True)[1]
+
+def smooth_face_normals(face_normals, adjacent_pairs, iterations):
+    """
+    Averages every face normal with its edge-adjacent faces (1-ring), iterations times, so the noisy normals
+    of marching-cubes surfaces do not flip the dominant box axis face by face.
+    """
+    smoothed = face_normals
+    for _ in range(iterations):
+        accumulated = smoothed.copy()
+        np.add.at(accumulated, adjacent_pairs[:, 0], smoothed[adjacent_pairs[:, 1]])
+        np.add.at(accumulated, adjacent_pairs[:, 1], smoothed[adjacent_pairs[:, 0]])
+        smoothed = accumulated / np.maximum(np.linalg.norm(accumulated, axis=1, keepdims=True), 1e-12)
+    return smoothed
+
+def merge_small_charts(face_axes, face_charts, adjacent_pairs, min_chart_faces, face_normals):
+    """
+    Charts with fewer than min_chart_faces faces take the box axis of their largest neighbouring chart,
+    so they join it when the charts are labelled again. Only neighbours whose axis is within 60 degrees of
+    the small chart's mean normal (MERGE_MIN_AXIS_COSINE) are candidates, so merged faces keep a positive UV
+    area; e.g. the single-face sides of a low-poly cube stay separate. Returns the updated face_axes.
+    """
+    chart_sizes = np.bincount(face_charts)
+    chart_axes = np.zeros(len(chart_sizes), dtype=face_axes.dtype)
+    chart_axes[face_charts] = face_axes
+    chart_normals = np.zeros((len(chart_sizes), 3))
+    np.add.at(chart_normals, face_charts, face_normals)
+    chart_normals /= np.maximum(np.linalg.norm(chart_normals, axis=1, keepdims=True), 1e-12)
+
+    chart_a, chart_b = face_charts[adjacent_pairs[:, 0]], face_charts[adjacent_pairs[:, 1]]
+    crossing = chart_a != chart_b
+    # both directions: (small chart, neighbour chart)
+    small = np.concatenate((chart_a[crossing], chart_b[crossing]))
+    neighbour = np.concatenate((chart_b[crossing], chart_a[crossing]))
+    alignment = np.einsum('ij,ij->i', chart_normals[small], BOX_AXIS_DIRECTIONS[chart_axes[neighbour]])
+    keep = (chart_sizes[small] < min_chart_faces) & (alignment >= MERGE_MIN_AXIS_COSINE)
+    small, neighbour = small[keep], neighbour[keep]
+    if not len(small):
+        return face_axes
+
+    # largest neighbour per small chart: sort by (small chart, neighbour size) and take the last entry
+    order = np.lexsort((chart_sizes[neighbour], small))
+    small, neighbour = small[order], neighbour[order]
+    last = np.append(small[1:] != small[:-1], True)
+    target_axes = chart_axes.copy()
+    target_axes[small[last]] = chart_axes[neighbour[last]]
+    return target_axes[face_charts]
+
+def grow_box_charts(face_normals, loop_faces, loop_edges, smoothing_iterations=2, min_chart_faces=16):
+    """
+    Chart growing for box projection: every face takes the box axis closest to its normal, smoothed over the
+    1-ring (smooth_face_normals), and edge-adjacent faces with the same axis are merged into one chart.
+    Charts smaller than min_chart_faces are folded into their largest compatible neighbour (merge_small_charts).
+    Returns (face_axes, face_charts).
+    """
+    # faces sharing an edge: consecutive entries after sorting loops by edge index
+    order = np.argsort(loop_edges, kind='stable')
+    sorted_edges = loop_edges[order]
+    sorted_faces = loop_faces[order]
+    shared = sorted_edges[1:] == sorted_edges[:-1]
+    all_pairs = np.stack((sorted_faces[:-1][shared], sorted_faces[1:][shared]), axis=1)
+
+    normals = smooth_face_normals(face_normals, all_pairs, smoothing_iterations)
+    dominant = np.argmax(np.abs(normals), axis=1)
+    negative = normals[np.arange(len(normals)), dominant] < 0
+    face_axes = dominant * 2 + negative
+
+    pairs = all_pairs[face_axes[all_pairs[:, 0]] == face_axes[all_pairs[:, 1]]]
+    face_charts = label_connected_faces(len(face_normals), pairs)
+    for _ in range(3 if min_chart_faces > 1 and len(all_pairs) else 0): # small charts may first merge into each other
+        merged_axes = merge_small_charts(face_axes, face_charts, all_pairs, min_chart_faces, normals)
+        if np.array_equal(merged_axes, face_axes):
+            break
+        face_axes = merged_axes
+        pairs = all_pairs[face_axes[all_pairs[:, 0]] == face_axes[all_pairs[:, 1]]]
+        face_charts = label_connected_faces(len(face_normals), pairs)
+    return face_axes, face_charts
+
+def pack_charts_in_shelves(chart_sizes, margin):
+    """
+    Shelf packing of chart bounding boxes (tallest first) into a square-ish area.
+    chart_sizes is (K, 2) in any unit; margin is the gap between charts as a fraction of the final UV square.
+    Returns (offsets, scale): chart k goes to offsets[k] and all charts are scaled by scale to fit 0-1.
+    """
+    chart_count = len(chart_sizes)
+    offsets = np.zeros((chart_count, 2), dtype=np.float64)
+    if not chart_count:
+        return offsets, 1.0
+
+    total_area = float(np.sum(chart_sizes[:, 0] * chart_sizes[:, 1]))
+    shelf_width = max(np.sqrt(total_area) * 1.15, float(chart_sizes[:, 0].max()))
+    padding = margin * shelf_width
+
+    cursor_x, cursor_y, shelf_height, used_width = 0.0, 0.0, 0.0, 0.0
+    for k in np.argsort(-chart_sizes[:, 1], kind='stable'):
+        width, height = chart_sizes[k]
+        if cursor_x > 0 and cursor_x + width > shelf_width:
+            cursor_x = 0.0
+            cursor_y += shelf_height + padding
+            shelf_height = 0.0
+        offsets[k] = (cursor_x, cursor_y)
+        cursor_x += width + padding
+        shelf_height = max(shelf_height, height)
+        used_width = max(used_width, cursor_x - padding)
+
+    used_height = cursor_y + shelf_height
+    scale = 1.0 / max(used_width, used_height, 1e-12)
+    return offsets, scale
+
+def unwrap_box_charts(vertices, loop_vertices, loop_edges, loop_totals, face_normals, margin=0.02):
+    """
+    Fast unwrap: box-projection chart growing plus shelf packing, on plain arrays
+    (vertex 'co', loop 'vertex_index' and 'edge_index', polygon 'loop_total' and 'normal').
+    Returns per-loop UVs as a float32 (L, 2) array in the 0-1 square.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    face_normals = np.asarray(face_normals, dtype=np.float64).reshape(-1, 3)
+    loop_faces = np.repeat(np.arange(len(loop_totals)), loop_totals)
+
+    face_axes, face_charts = grow_box_charts(face_normals, loop_faces, np.asarray(loop_edges))
+
+    # project every loop on the plane of its face's box axis
+    basis = BOX_PROJECTION_AXES[face_axes[loop_faces]] # (L, 2, 3)
+    positions = vertices[np.asarray(loop_vertices)]
+    uvs = np.einsum('lij,lj->li', basis, positions)
+
+    # per-chart bounding boxes, moved to the origin
+    loop_charts = face_charts[loop_faces]
+    chart_count = int(face_charts.max()) + 1 if len(face_charts) else 0
+    chart_min = np.full((chart_count, 2), np.inf)
+    chart_max = np.full((chart_count, 2), -np.inf)
+    np.minimum.at(chart_min, loop_charts, uvs)
+    np.maximum.at(chart_max, loop_charts, uvs)
+    uvs -= chart_min[loop_charts]
+
+    offsets, scale = pack_charts_in_shelves(chart_max - chart_min, margin)
+    uvs = (uvs + offsets[loop_charts]) * scale
+    return uvs.astype(np.float32)